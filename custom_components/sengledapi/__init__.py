@@ -1,18 +1,38 @@
 """Sengled Bulb Integration."""
 
+import asyncio
+import json
 import logging
+import time
 
 import homeassistant.helpers.config_validation as cv
 import voluptuous as vol
 from homeassistant.const import (CONF_DEVICES, CONF_PASSWORD, CONF_TIMEOUT,
-                                 CONF_USERNAME)
+                                 CONF_USERNAME, EVENT_HOMEASSISTANT_STOP)
 from homeassistant.helpers import discovery
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.storage import Store
 
-from .const import CONF_COUNTRY, CONF_TYPE, DOMAIN
-from .sengledapi.sengledapi import SengledApi
+from .const import (CONF_CAPTURE_FILE, CONF_COUNTRY, CONF_MQTT_QOS,
+                    CONF_MQTT_WINDOW, CONF_OFFLINE_COMMANDS, CONF_TRACE_FILE,
+                    CONF_TYPE, CONF_WIFI_HTTP_FALLBACK, DISCOVERY_INTERVAL,
+                    DOMAIN, SIGNAL_ADD_BULBS, SIGNAL_REMOVE_DEVICES,
+                    STORAGE_DELAY, STORAGE_KEY, STORAGE_VERSION)
+from .sengledapi import log, profiling
+from .sengledapi.publisher import MQTT_WINDOW
+from .sengledapi.sengledapi import OFFLINE_POLICIES, OFFLINE_REPLAY, SengledApi
 
 _LOGGER = logging.getLogger(__name__)
 
+MQTT_QOS_LEVEL = vol.All(vol.Coerce(int), vol.In((0, 1, 2)))
+MQTT_QOS_SCHEMA = vol.Schema(
+    {
+        vol.Optional(command): MQTT_QOS_LEVEL
+        for command in ("default", "state", "brightness", "color_temperature", "color")
+    }
+)
+
 CONFIG_SCHEMA = vol.Schema(
     {
         DOMAIN: vol.Schema(
@@ -21,12 +41,46 @@ CONFIG_SCHEMA = vol.Schema(
                 vol.Required(CONF_PASSWORD): cv.string,
                 vol.Required(CONF_COUNTRY): cv.string,
                 vol.Optional(CONF_TYPE, default=False): cv.boolean,
+                vol.Optional(CONF_OFFLINE_COMMANDS, default=OFFLINE_REPLAY): vol.In(
+                    OFFLINE_POLICIES
+                ),
+                vol.Optional(CONF_TRACE_FILE): cv.string,
+                vol.Optional(CONF_CAPTURE_FILE): cv.string,
+                vol.Optional(CONF_MQTT_QOS, default={}): MQTT_QOS_SCHEMA,
+                vol.Optional(CONF_MQTT_WINDOW, default=MQTT_WINDOW): vol.All(
+                    vol.Coerce(int), vol.Range(min=1, max=100)
+                ),
+                vol.Optional(CONF_WIFI_HTTP_FALLBACK, default=False): cv.boolean,
             }
         )
     },
     extra=vol.ALLOW_EXTRA,
 )
 
+SERVICE_SET_VERBOSE = "set_verbose"
+SET_VERBOSE_SCHEMA = vol.Schema({vol.Required("enabled"): cv.boolean})
+
+SERVICE_DUMP_DIAGNOSTICS = "dump_diagnostics"
+# Never written to the diagnostics dump.
+DIAGNOSTICS_REDACT = (CONF_USERNAME, CONF_PASSWORD)
+
+SERVICE_PROFILE = "profile"
+PROFILE_CPROFILE = "cprofile"
+PROFILE_SAMPLING = "sampling"
+PROFILE_SCHEMA = vol.Schema(
+    {
+        vol.Optional("duration", default=60): vol.All(
+            vol.Coerce(float), vol.Range(min=1, max=3600)
+        ),
+        vol.Optional("mode", default=PROFILE_CPROFILE): vol.In(
+            (PROFILE_CPROFILE, PROFILE_SAMPLING)
+        ),
+        vol.Optional("top", default=profiling.TOP): vol.All(
+            vol.Coerce(int), vol.Range(min=1, max=200)
+        ),
+    }
+)
+
 
 async def async_setup(hass, config):
     conf = config.get(DOMAIN)
@@ -45,45 +99,178 @@ async def async_setup(hass, config):
         )
         _LOGGER.info("""Creating new SengledApi component""")
 
+        capture = {}
+        if conf.get(CONF_CAPTURE_FILE):
+            from .sengledapi.capture import Recorder
+
+            recorder = Recorder(hass.config.path(conf[CONF_CAPTURE_FILE]))
+            capture = {"transport": recorder, "mqtt_factory": recorder.mqtt_factory}
+
         sengledapi_account = SengledApi(
             config[DOMAIN].get(CONF_USERNAME),
             config[DOMAIN].get(CONF_PASSWORD),
             config[DOMAIN].get(CONF_COUNTRY),
             config[DOMAIN].get(CONF_TYPE),
+            config[DOMAIN].get(CONF_OFFLINE_COMMANDS),
+            mqtt_qos=conf[CONF_MQTT_QOS],
+            mqtt_window=conf[CONF_MQTT_WINDOW],
+            wifi_http_fallback=conf[CONF_WIFI_HTTP_FALLBACK],
+            **capture,
         )
-        await sengledapi_account.async_init()
 
-        if not sengledapi_account.is_valid_login():
-            _LOGGER.error(
-                "SengledApi Not connected to Sengled account. Unable to add devices. Check your configuration."
-            )
-            return False
+        if conf.get(CONF_TRACE_FILE):
+            sengledapi_account.tracer.path = hass.config.path(conf[CONF_TRACE_FILE])
 
-        _LOGGER.info("SengledApi Connected to Sengled account")
+        # Store the account object for the platforms to use.
+        hass.data[DOMAIN] = {"sengledapi_account": sengledapi_account}
 
-        sengledapi_devices = await sengledapi_account.async_get_devices()
-        sengledapiwifi_devices = await sengledapi_account.async_get_wifi_devices()
+        async def async_shutdown(event):
+            """Drain in-flight control requests when Home Assistant stops."""
+            await sengledapi_account.async_shutdown()
 
-        # Store the logged in account object for the platforms to use.
-        _LOGGER.info(
-            "SengledApi Store the logged in account object for the platforms to use"
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_shutdown)
+
+        async def async_set_verbose(call):
+            """Toggle the per-request and per-message debug trace."""
+            log.set_verbose(call.data["enabled"], logging.getLogger(__package__))
+
+        hass.services.async_register(
+            DOMAIN, SERVICE_SET_VERBOSE, async_set_verbose, schema=SET_VERBOSE_SCHEMA
+        )
+
+        async def async_profile(call):
+            """Profile the integration for a while without blocking the caller."""
+            if hass.data[DOMAIN].get("profiler") is not None:
+                _LOGGER.warning("SengledApi: A profile is already running")
+                return
+            if call.data["mode"] == PROFILE_SAMPLING:
+                profiler = profiling.SamplingProfiler()
+            else:
+                profiler = profiling.CallProfiler()
+            try:
+                profiler.start()
+            except ValueError as e:
+                _LOGGER.error("SengledApi: Could not start profiling: %s", e)
+                return
+            hass.data[DOMAIN]["profiler"] = profiler
+            hass.async_create_background_task(
+                async_run_profile(hass, profiler, call.data), "sengledapi profile"
+            )
+
+        hass.services.async_register(
+            DOMAIN, SERVICE_PROFILE, async_profile, schema=PROFILE_SCHEMA
         )
-        hass.data[DOMAIN] = {"sengledapi_account": sengledapi_account}
 
-        _LOGGER.info("SengledApi Start up lights, switch and binary sensor components")
-        # Start up lights and switch components
-        if sengledapi_devices:
-            await discovery.async_load_platform(hass, "light", DOMAIN, {}, config)
-        elif sengledapiwifi_devices:
-            await discovery.async_load_platform(hass, "light", DOMAIN, {}, config)
-        else:
-            _LOGGER.error(
-                "SengledApi: SengledApi authenticated but could not find any devices."
+        async def async_dump_diagnostics(call):
+            """Write the account's statistics to the config directory."""
+            data = {
+                "config": {
+                    key: value
+                    for key, value in conf.items()
+                    if key not in DIAGNOSTICS_REDACT
+                },
+                **sengledapi_account.diagnostics(),
+            }
+            path = hass.config.path(
+                "sengledapi_diagnostics_{}.json".format(time.strftime("%Y%m%d_%H%M%S"))
             )
+            await hass.async_add_executor_job(write_json, path, data)
+            _LOGGER.warning("SengledApi: Diagnostics written to %s", path)
+
+        hass.services.async_register(
+            DOMAIN, SERVICE_DUMP_DIAGNOSTICS, async_dump_diagnostics
+        )
+
+        # Login and discovery talk to the Sengled cloud; don't hold up bootstrap.
+        hass.async_create_background_task(
+            async_discover(hass, config, sengledapi_account), "sengledapi discovery"
+        )
 
     return True
 
 
+def write_json(path, data):
+    with open(path, "w") as file:
+        json.dump(data, file, indent=2, default=str)
+
+
+async def async_run_profile(hass, profiler, options):
+    """Stop the profiler after the duration and report the hottest paths."""
+    try:
+        await asyncio.sleep(options["duration"])
+    finally:
+        profiler.stop()
+        hass.data[DOMAIN]["profiler"] = None
+    path = hass.config.path(
+        "sengledapi_profile_{}.{}".format(
+            time.strftime("%Y%m%d_%H%M%S"), profiler.extension
+        )
+    )
+    summary = await hass.async_add_executor_job(profiler.write, path, options["top"])
+    _LOGGER.warning("SengledApi: Profile written to %s\n%s", path, summary)
+
+
+async def async_discover(hass, config, sengledapi_account):
+    """Log in, fetch the device lists and load the platforms."""
+    store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+    # Lights from the last run's inventory come up with their restored state
+    # right away; their commands are queued until the cloud answers.
+    restored = sengledapi_account.restore_devices(await store.async_load() or [])
+    if restored:
+        await discovery.async_load_platform(hass, "light", DOMAIN, {}, config)
+
+    # Retries until the cloud answers; only rejected credentials end it.
+    if not await sengledapi_account.async_start():
+        _LOGGER.error(
+            "SengledApi Not connected to Sengled account. Unable to add devices. Check your configuration."
+        )
+        return
+
+    _LOGGER.info("SengledApi Connected to Sengled account")
+
+    sengledapi_devices, sengledapiwifi_devices = await asyncio.gather(
+        sengledapi_account.async_get_devices(),
+        sengledapi_account.async_get_wifi_devices(),
+    )
+
+    if not sengledapi_devices and not sengledapiwifi_devices:
+        _LOGGER.warning(
+            "SengledApi: SengledApi authenticated but could not find any devices."
+        )
+
+    _LOGGER.info("SengledApi Start up lights, switch and binary sensor components")
+    # Start up lights and switch components. The light platform is loaded even
+    # without devices so that rediscovery can add them later.
+    if not restored:
+        await discovery.async_load_platform(hass, "light", DOMAIN, {}, config)
+    await discovery.async_load_platform(hass, "switch", DOMAIN, {}, config)
+    await discovery.async_load_platform(hass, "sensor", DOMAIN, {}, config)
+    await discovery.async_load_platform(hass, "binary_sensor", DOMAIN, {}, config)
+
+    async def async_rediscover(now):
+        """
+        Add entities for new devices. Removed ones go unavailable, and their
+        entities are removed once the device has been gone for a while.
+        """
+        try:
+            added, removed, dropped = await sengledapi_account.async_rediscover()
+        except Exception as e:
+            _LOGGER.warning("SengledApi: Rediscovery failed: %s", e)
+            return
+        if added:
+            async_dispatcher_send(hass, SIGNAL_ADD_BULBS, added)
+        if dropped:
+            async_dispatcher_send(hass, SIGNAL_REMOVE_DEVICES, dropped)
+        store.async_delay_save(sengledapi_account.device_snapshot, STORAGE_DELAY)
+
+    if restored:
+        # Add devices that joined the account since the inventory was stored.
+        await async_rediscover(None)
+    else:
+        store.async_delay_save(sengledapi_account.device_snapshot, STORAGE_DELAY)
+    async_track_time_interval(hass, async_rediscover, DISCOVERY_INTERVAL)
+
+
 async def async_setup_entry(hass, entry):
     """Set up Sengled platform."""
     username = entry.data[CONF_USERNAME]
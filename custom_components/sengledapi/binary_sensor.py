@@ -0,0 +1,61 @@
+#!/usr/bin/python3
+
+"""Platform for Sengled device health binary sensors."""
+
+import logging
+
+from homeassistant.components.binary_sensor import (BinarySensorDeviceClass,
+                                                    BinarySensorEntity)
+from homeassistant.const import EntityCategory
+
+from .const import DOMAIN
+from .entity import SengledFleetEntity, setup_fleet_entities
+from .sengledapi import fleet
+
+_LOGGER = logging.getLogger(__name__)
+
+# key, name, device class, entity category, value from a BulbProperty
+DEVICE_BINARY_SENSORS = (
+    (
+        "online",
+        "Online",
+        BinarySensorDeviceClass.CONNECTIVITY,
+        EntityCategory.DIAGNOSTIC,
+        fleet.online,
+    ),
+    ("alarm", "Motion", BinarySensorDeviceClass.MOTION, None, fleet.alarm),
+)
+
+
+async def async_setup_platform(hass, config, add_entities, discovery_info=None):
+    """Set up the Sengled binary sensor platform."""
+    _LOGGER.debug("Creating new Sengled binary sensor component")
+    setup_fleet_entities(
+        hass,
+        hass.data[DOMAIN]["sengledapi_account"],
+        add_entities,
+        DEVICE_BINARY_SENSORS,
+        SengledDeviceBinarySensor,
+    )
+
+
+class SengledDeviceBinarySensor(SengledFleetEntity, BinarySensorEntity):
+    """Binary sensor for one device's health, from the shared fetch."""
+
+    def __init__(self, api, device, key, name, device_class, category, value_fn):
+        """Initialize a Sengled device binary sensor."""
+        super().__init__(api, device, key, name, value_fn)
+        self._device_class = device_class
+        self._category = category
+
+    @property
+    def entity_category(self):
+        return self._category
+
+    @property
+    def device_class(self):
+        return self._device_class
+
+    @property
+    def is_on(self):
+        return self._value
@@ -1,6 +1,26 @@
 """Constants for the Sengled Integration."""
 
+from datetime import timedelta
+
 DOMAIN = "sengledapi"
 CONF_COUNTRY = "country"
 CONF_TYPE = "wifi"
+CONF_OFFLINE_COMMANDS = "offline_commands"
+CONF_TRACE_FILE = "trace_file"
+CONF_CAPTURE_FILE = "capture_file"
+CONF_MQTT_QOS = "mqtt_qos"
+CONF_MQTT_WINDOW = "mqtt_window"
+CONF_WIFI_HTTP_FALLBACK = "wifi_http_fallback"
 ATTRIBUTION = "Data provided by Sengled"
+
+# How often the device inventory is checked for added or removed devices.
+DISCOVERY_INTERVAL = timedelta(minutes=5)
+SIGNAL_ADD_BULBS = "sengledapi_add_bulbs"
+# Sent with the uuids of devices gone long enough to remove their entities.
+SIGNAL_REMOVE_DEVICES = "sengledapi_remove_devices"
+
+# The last fetched device inventory, to create lights before login.
+STORAGE_KEY = "sengledapi.devices"
+STORAGE_VERSION = 1
+# Seconds to batch inventory writes.
+STORAGE_DELAY = 10
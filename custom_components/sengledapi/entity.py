@@ -0,0 +1,123 @@
+"""Per-device entities fed by the shared Sengled device fetch."""
+
+import logging
+
+from homeassistant.const import ATTR_ATTRIBUTION
+from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+
+from .const import ATTRIBUTION, DOMAIN, SIGNAL_REMOVE_DEVICES
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def setup_fleet_entities(hass, api, add_entities, descriptions, entity_class):
+    """
+    Add an entity for every description a device reports a value for, for
+    every device in the shared fetch and for devices that show up later.
+    Nothing is fetched for these entities; they follow the light polls.
+    """
+    known = set()
+
+    @callback
+    def async_add_new_devices():
+        entities = []
+        for uuid, (device, wifi) in api.inventory().items():
+            if uuid in known:
+                continue
+            known.add(uuid)
+            entities.extend(
+                entity_class(api, device, *description)
+                for description in descriptions
+                if description[-1](device) is not None
+            )
+        if entities:
+            _LOGGER.debug("SengledApi: Adding %s fleet entities", len(entities))
+            add_entities(entities, False)
+
+    @callback
+    def async_forget_devices(uuids):
+        """Let devices that were removed for good get entities if they return."""
+        known.difference_update(uuids)
+
+    async_add_new_devices()
+    api.add_listener(async_add_new_devices)
+    async_dispatcher_connect(hass, SIGNAL_REMOVE_DEVICES, async_forget_devices)
+
+
+class SengledFleetEntity:
+    """Mixin for an entity showing one health value of one device."""
+
+    def __init__(self, api, device, key, name, value_fn):
+        self._api = api
+        self._uuid = device.uuid
+        self._device_name = device.name
+        self._device_model = device.typeCode
+        self._key = key
+        self._name = name
+        self._value_fn = value_fn
+        self._value = value_fn(device)
+        self._present = True
+        self._online = device.isOnline
+
+    async def async_added_to_hass(self):
+        """Follow the shared device fetches."""
+        await super().async_added_to_hass()
+        self.async_on_remove(self._api.add_listener(self._handle_refresh))
+        self.async_on_remove(
+            async_dispatcher_connect(
+                self.hass, SIGNAL_REMOVE_DEVICES, self._async_handle_removed
+            )
+        )
+
+    async def _async_handle_removed(self, uuids):
+        """Remove this entity once its device has been gone for good."""
+        if self._uuid in uuids:
+            await self.async_remove()
+
+    @callback
+    def _handle_refresh(self):
+        """Write the state when a shared fetch changed it."""
+        entry = self._api.device(self._uuid)
+        if entry is None:
+            state = (False, self._online, self._value)
+        else:
+            device = entry[0]
+            self._device_name = device.name
+            state = (True, device.isOnline, self._value_fn(device))
+        if state == (self._present, self._online, self._value):
+            return
+        self._present, self._online, self._value = state
+        self.async_write_ha_state()
+
+    @property
+    def should_poll(self):
+        return False
+
+    @property
+    def name(self):
+        """Return the display name of this entity."""
+        return "{} {}".format(self._device_name, self._name)
+
+    @property
+    def unique_id(self):
+        return "{}_{}".format(self._uuid, self._key)
+
+    @property
+    def available(self):
+        """Values of offline devices are stale; only connectivity isn't."""
+        return self._present and (self._online or self._key == "online")
+
+    @property
+    def extra_state_attributes(self):
+        return {ATTR_ATTRIBUTION: ATTRIBUTION}
+
+    @property
+    def device_info(self):
+        """Return the device info."""
+        return {
+            "name": self._device_name,
+            "identifiers": {(DOMAIN, self._uuid)},
+            "model": self._device_model,
+            "manufacturer": "Sengled",
+        }
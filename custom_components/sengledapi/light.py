@@ -9,18 +9,27 @@ from datetime import timedelta
 from homeassistant.components.light import (
     ATTR_BRIGHTNESS,
     ATTR_COLOR_TEMP_KELVIN,
+    ATTR_EFFECT,
     ATTR_HS_COLOR,
+    ATTR_RGB_COLOR,
+    ATTR_TRANSITION,
     DEFAULT_MAX_KELVIN,
     DEFAULT_MIN_KELVIN,
     PLATFORM_SCHEMA,
     ColorMode,
     LightEntity,
+    LightEntityFeature,
 )
-from homeassistant.const import ATTR_ATTRIBUTION
+from homeassistant.const import ATTR_ATTRIBUTION, STATE_OFF, STATE_ON
+from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.helpers.restore_state import RestoreEntity
 from homeassistant.util import color as colorutil
+from homeassistant.util import dt as dt_util
 
-from .const import ATTRIBUTION, DOMAIN
+from .const import ATTRIBUTION, DOMAIN, SIGNAL_ADD_BULBS, SIGNAL_REMOVE_DEVICES
 from .sengledapi.sengledapi import SengledApi
+from .sengledapi.transitions import EFFECTS
 
 # Add to support quicker update time. Is this to Fast?
 SCAN_INTERVAL = timedelta(seconds=10)
@@ -33,19 +42,24 @@ _LOGGER = logging.getLogger(__name__)
 async def async_setup_platform(hass, config, add_entities, discovery_info=None):
     """Set up the Sengled Light platform."""
     _LOGGER.debug("Creating new Sengled light component")
-    # Add devices
-    add_entities(
-        [
-            SengledBulb(light)
-            for light in await hass.data[DOMAIN][
-                "sengledapi_account"
-            ].discover_devices()
-        ],
-        True,
-    )
-
-
-class SengledBulb(LightEntity):
+    api = hass.data[DOMAIN]["sengledapi_account"]
+    # Bulbs are seeded from the discovery fetch, so no update before adding.
+    # Before login these are the bulbs restored from the stored inventory.
+    if api.started:
+        bulbs = await api.discover_devices()
+    else:
+        bulbs = api.known_bulbs()
+    add_entities([SengledBulb(light) for light in bulbs], False)
+
+    @callback
+    def async_add_bulbs(bulbs):
+        """Add entities for bulbs found by rediscovery."""
+        add_entities([SengledBulb(light) for light in bulbs], False)
+
+    async_dispatcher_connect(hass, SIGNAL_ADD_BULBS, async_add_bulbs)
+
+
+class SengledBulb(LightEntity, RestoreEntity):
     """Representation of a Sengled Bulb."""
 
     def __init__(self, light):
@@ -73,21 +87,48 @@ class SengledBulb(LightEntity):
         if self._support_brightness and self._brightness is None:
             self._brightness = 255
 
+    async def async_added_to_hass(self):
+        """Restore the last known state until the cloud reports in."""
+        await super().async_added_to_hass()
+        self._light.set_attribute_update_callback(self._handle_push)
+        self.async_on_remove(
+            lambda: self._light.set_attribute_update_callback(None)
+        )
+        self.async_on_remove(
+            async_dispatcher_connect(
+                self.hass, SIGNAL_REMOVE_DEVICES, self._async_handle_removed
+            )
+        )
+        last_state = await self.async_get_last_state()
+        if last_state is None:
+            return
+        attributes = last_state.attributes
+        self._light.restore_state(
+            {STATE_ON: True, STATE_OFF: False}.get(last_state.state),
+            attributes.get(ATTR_BRIGHTNESS),
+            attributes.get(ATTR_COLOR_TEMP_KELVIN),
+            attributes.get(ATTR_RGB_COLOR),
+            attributes.get("rssi"),
+        )
+        self._copy_light_state()
+
+    async def _async_handle_removed(self, uuids):
+        """Remove this entity once its bulb has been gone for good."""
+        if self._device_mac in uuids:
+            await self.async_remove()
+
     @property
     def name(self):
         """Return the display name of this light."""
-        _LOGGER.debug("Light.py Name %s", self._name)
         return self._name
 
     @property
     def unique_id(self):
-        _LOGGER.debug("Light.py unique_id %s", self._device_mac)
         return self._device_mac
 
     @property
     def available(self):
         """Return the connection status of this light."""
-        _LOGGER.debug("Light.py _available %s", self._available)
         return self._available
 
     @property
@@ -106,13 +147,20 @@ class SengledBulb(LightEntity):
             "color r": self._rgb_color_r,
             "color g": self._rgb_color_g,
             "color b": self._rgb_color_b,
+            "pending commands": self._light.pending_commands,
+            "command failed": self._light._command_failed,
+            "stale": self._light.stale,
+            "last updated": (
+                dt_util.utc_from_timestamp(self._light._last_updated).isoformat()
+                if self._light._last_updated
+                else None
+            ),
         }
         return attributes
 
     @property
     def color_temp_kelvin(self):
         """Return the color temperature in Kelvin."""
-        _LOGGER.debug("Light.py color_temp_kelvin %s", self._color_temperature)
         if self._color_temperature is None:
             return 2000
         else:
@@ -131,7 +179,6 @@ class SengledBulb(LightEntity):
     @property
     def hs_color(self):
         """Return the hs_color of the light."""
-        _LOGGER.debug("Light.py hs_color %s", self._color)
         if self._wifi_device:
             a, b, c = self._color.split(":")
             return colorutil.color_RGB_to_hs(int(a), int(b), int(c))
@@ -143,15 +190,31 @@ class SengledBulb(LightEntity):
     @property
     def brightness(self):
         """Return the brightness of the light."""
-        _LOGGER.debug("Light.py brightness %s", self._brightness)
         return self._brightness
 
     @property
     def is_on(self):
         """Return true if light is on."""
-        _LOGGER.debug("Light.py is_on %s", self._state)
         return self._state
 
+    @property
+    def supported_features(self):
+        """Transitions for dimmable bulbs, effects for color bulbs."""
+        features = LightEntityFeature(0)
+        if self._support_brightness or self._support_color or self._support_color_temp:
+            features |= LightEntityFeature.TRANSITION
+        if self._support_color:
+            features |= LightEntityFeature.EFFECT
+        return features
+
+    @property
+    def effect_list(self):
+        return list(EFFECTS) if self._support_color else None
+
+    @property
+    def effect(self):
+        return self._light.effect
+
     @property
     def supported_color_modes(self):
         """Return the supported color modes for the light."""
@@ -181,6 +244,21 @@ class SengledBulb(LightEntity):
 
     async def async_turn_on(self, **kwargs):
         """Turn on or control the light."""
+        if ATTR_EFFECT in kwargs:
+            await self._light.async_set_effect(kwargs[ATTR_EFFECT])
+            return
+        if kwargs.get(ATTR_TRANSITION):
+            color = None
+            if ATTR_HS_COLOR in kwargs:
+                hs = kwargs[ATTR_HS_COLOR]
+                color = colorutil.color_hs_to_RGB(hs[0], hs[1])
+            await self._light.async_transition(
+                kwargs[ATTR_TRANSITION],
+                brightness=kwargs.get(ATTR_BRIGHTNESS),
+                color=color,
+                color_temperature=kwargs.get(ATTR_COLOR_TEMP_KELVIN),
+            )
+            return
         if not any(
             key in kwargs for key in (ATTR_BRIGHTNESS, ATTR_HS_COLOR, ATTR_COLOR_TEMP_KELVIN)
         ):
@@ -197,6 +275,9 @@ class SengledBulb(LightEntity):
 
     async def async_turn_off(self, **kwargs):
         """Instruct the light to turn off."""
+        if kwargs.get(ATTR_TRANSITION):
+            await self._light.async_fade_out(kwargs[ATTR_TRANSITION])
+            return
         await self._light.async_toggle(OFF)
 
     async def async_update(self):
@@ -204,7 +285,15 @@ class SengledBulb(LightEntity):
         This is the only method that should fetch new data for Home Assistant.
         """
         await self._light.async_update()
-        self._state = self._light.is_on()
+        self._copy_light_state()
+
+    @callback
+    def _handle_push(self):
+        """Write the state an MQTT push brought in."""
+        self._copy_light_state()
+        self.async_write_ha_state()
+
+    def _copy_light_state(self):
         self._available = self._light._available
         self._state = self._light._state
         self._brightness = self._light._brightness
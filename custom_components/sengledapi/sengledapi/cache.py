@@ -0,0 +1,75 @@
+"""Sengled Bulb Integration."""
+import asyncio
+import logging
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class TtlCache:
+    """
+    Caches the results of cloud calls that rarely change, each key with its
+    own time to live. Concurrent callers of a key that is being filled wait
+    for that fill instead of starting their own. None results and errors are
+    not cached.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._filling = {}
+        # Bumped by invalidate so fills already in flight aren't stored.
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    async def async_get(self, key, fill, ttl):
+        """
+        Return the cached value for key, or await fill() to produce it.
+        fill -- coroutine function returning the value, None for no value
+        ttl -- seconds the value stays fresh
+        """
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() < entry[0]:
+            self.hits += 1
+            return entry[1]
+        filling = self._filling.get(key)
+        if filling is not None:
+            self.hits += 1
+            return await asyncio.shield(filling)
+        self.misses += 1
+        generation = self._generation
+        filling = asyncio.ensure_future(fill())
+        self._filling[key] = filling
+        try:
+            value = await asyncio.shield(filling)
+        finally:
+            if self._filling.get(key) is filling:
+                del self._filling[key]
+        if value is not None and generation == self._generation:
+            self._entries[key] = (time.monotonic() + ttl, value)
+        return value
+
+    def invalidate(self, *keys):
+        """Drop the given keys, or everything when none are given."""
+        self._generation += 1
+        if not keys:
+            self._entries.clear()
+            self._filling.clear()
+            _LOGGER.debug("SengledApi: Cache cleared")
+            return
+        for key in keys:
+            self._entries.pop(key, None)
+            self._filling.pop(key, None)
+        _LOGGER.debug("SengledApi: Invalidated cached %s", ", ".join(keys))
+
+    def as_dict(self):
+        now = time.monotonic()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": {
+                key: round(expires - now, 1)
+                for key, (expires, _) in self._entries.items()
+                if expires > now
+            },
+        }
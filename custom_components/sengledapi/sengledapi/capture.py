@@ -0,0 +1,309 @@
+"""Sengled Bulb Integration."""
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from urllib.parse import urlsplit
+
+_LOGGER = logging.getLogger(__name__)
+
+REDACTED = "**REDACTED**"
+# Keys whose values never reach a capture file, at any depth.
+SECRET_KEYS = frozenset(
+    ("user", "pwd", "uuid", "jsessionId", "nickName", "email")
+)
+
+
+def redact(value):
+    """Copy of a decoded JSON value with the secret keys replaced."""
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if key in SECRET_KEYS else redact(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [redact(item) for item in value]
+    return value
+
+
+def decode(body):
+    """Decode a request or response body for the capture file."""
+    if isinstance(body, (bytes, bytearray)):
+        body = body.decode("utf-8", "replace")
+    try:
+        return json.loads(body)
+    except (TypeError, ValueError):
+        return body
+
+
+def encode(body):
+    if isinstance(body, str):
+        return body.encode()
+    return json.dumps(body).encode()
+
+
+class _BodyStream:
+    def __init__(self, body):
+        self._body = io.BytesIO(body)
+
+    async def read(self, n=-1):
+        return self._body.read(n)
+
+
+class BufferedResponse:
+    """A fully read HTTP response with the parts of aiohttp's that Request uses."""
+
+    def __init__(self, status, body):
+        self.status = status
+        self._body = body
+        self.content = _BodyStream(body)
+
+    async def read(self):
+        return self._body
+
+
+class CapturedMessage:
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+
+
+class Recorder:
+    """
+    Transport that passes requests through to the server and appends every
+    HTTP exchange and MQTT message to a JSONL capture file. Secrets are
+    redacted and cookies are never written.
+
+    transport -- the transport to record, HttpTransport by default
+    mqtt_factory -- the MQTT client factory to record, paho by default
+    """
+
+    def __init__(self, path, transport=None, mqtt_factory=None):
+        self.path = path
+        self._transport = transport
+        self._mqtt_factory = mqtt_factory
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+
+    def _write(self, kind, **record):
+        record = dict(t=round(time.monotonic() - self._start, 4), kind=kind, **record)
+        line = json.dumps(redact(record)) + "\n"
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # MQTT network thread.
+            self._append(line)
+        else:
+            # Keep file I/O off the event loop.
+            loop.run_in_executor(None, self._append, line)
+
+    def _append(self, line):
+        try:
+            with self._lock, open(self.path, "a", encoding="utf-8") as capture:
+                capture.write(line)
+        except OSError as e:
+            _LOGGER.warning(
+                "SengledApi: Could not write capture to %s: %s", self.path, e
+            )
+
+    @contextlib.asynccontextmanager
+    async def post(self, url, data, headers):
+        transport = self._transport
+        if transport is None:
+            from .devices.request import HTTP_TRANSPORT as transport
+
+        start = time.monotonic()
+        async with transport.post(url, data, headers) as response:
+            status = response.status
+            body = await response.read()
+        self._write(
+            "http",
+            url=url,
+            request=decode(data),
+            status=status,
+            elapsed=round(time.monotonic() - start, 4),
+            body=decode(body),
+        )
+        yield BufferedResponse(status, body)
+
+    def mqtt_factory(self, session, on_message):
+        create_client = self._mqtt_factory
+        if create_client is None:
+            from .mqtt import create_client
+
+        def on_recorded_message(client, userdata, msg):
+            self._write("mqtt_in", topic=msg.topic, payload=decode(msg.payload))
+            on_message(client, userdata, msg)
+
+        return RecordingMqttClient(create_client(session, on_recorded_message), self)
+
+
+class RecordingMqttClient:
+    """Wraps an MQTT client and records what it publishes."""
+
+    def __init__(self, client, recorder):
+        self._client = client
+        self._recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def __setattr__(self, name, value):
+        # Callbacks such as on_publish belong on the wrapped client.
+        if name.startswith("_"):
+            super().__setattr__(name, value)
+        else:
+            setattr(self._client, name, value)
+
+    def publish(self, topic, payload=None, *args, **kwargs):
+        self._recorder._write("mqtt_out", topic=topic, payload=decode(payload))
+        return self._client.publish(topic, payload, *args, **kwargs)
+
+
+class Replayer:
+    """
+    Transport that serves a capture file back without touching the cloud.
+    HTTP responses are handed out per endpoint in recorded order, repeating
+    the last one once they run out. Inbound MQTT messages are delivered on
+    their recorded schedule.
+
+    speed -- 1 for recorded speed, 10 for ten times faster, 0 for no waiting
+    """
+
+    def __init__(self, path, speed=1.0):
+        with open(path, encoding="utf-8") as capture:
+            records = [json.loads(line) for line in capture if line.strip()]
+        self.records = sorted(records, key=lambda record: record["t"])
+        self.speed = speed
+        self._responses = defaultdict(deque)
+        for record in self.records:
+            if record["kind"] == "http":
+                self._responses[urlsplit(record["url"]).path].append(record)
+        self._last = {}
+        self._origin = None
+        self.messages = [
+            record for record in self.records if record["kind"] == "mqtt_in"
+        ]
+        self.stats = Counter()
+
+    def scaled(self, seconds):
+        return seconds / self.speed if self.speed else 0
+
+    def due_in(self, t):
+        """Seconds until the record at capture time t is due."""
+        if self._origin is None:
+            self._origin = time.monotonic()
+        return self._origin + self.scaled(t) - time.monotonic()
+
+    @contextlib.asynccontextmanager
+    async def post(self, url, data, headers):
+        path = urlsplit(url).path
+        responses = self._responses.get(path)
+        if responses:
+            record = self._last[path] = responses.popleft()
+        else:
+            record = self._last.get(path)
+        if record is None:
+            self.stats["http_missing"] += 1
+            yield BufferedResponse(404, b"")
+            return
+        self.stats["http"] += 1
+        delay = self.scaled(record.get("elapsed", 0))
+        if delay:
+            await asyncio.sleep(delay)
+        yield BufferedResponse(record["status"], encode(record["body"]))
+
+    def mqtt_factory(self, session, on_message):
+        return ReplayMqttClient(self, on_message)
+
+
+class ReplayMqttClient:
+    """
+    Enough of paho's Client to replay a capture's inbound messages.
+    They are delivered from a worker thread, like paho's network loop, and
+    only for topics that have been subscribed by the time they are due.
+    """
+
+    def __init__(self, replayer, on_message):
+        self._replayer = replayer
+        self.on_message = on_message
+        self.on_publish = None
+        self._mid = 0
+        self._subscriptions = set()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def connect(self, host, port=443, keepalive=60):
+        return 0
+
+    def reconnect(self):
+        return 0
+
+    def disconnect(self):
+        return 0
+
+    def ws_set_options(self, path="/mqtt", headers=None):
+        pass
+
+    def is_connected(self):
+        return True
+
+    def subscribe(self, topic, qos=0):
+        self._subscriptions.add(topic)
+        return 0, 1
+
+    def unsubscribe(self, topic):
+        self._subscriptions.discard(topic)
+        return 0, 1
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        self._replayer.stats["mqtt_out"] += 1
+        self._mid += 1
+        if self.on_publish is not None:
+            self.on_publish(self, None, self._mid)
+        return _PublishedInfo(self._mid)
+
+    def loop_start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+            self._thread.start()
+
+    def loop_stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _loop(self):
+        replayer = self._replayer
+        for record in replayer.messages:
+            wait = replayer.due_in(record["t"])
+            if wait > 0 and self._stop.wait(wait):
+                return
+            if self._stop.is_set():
+                return
+            if record["topic"] not in self._subscriptions:
+                replayer.stats["mqtt_in_unsubscribed"] += 1
+                continue
+            replayer.stats["mqtt_in"] += 1
+            self.on_message(
+                self, None, CapturedMessage(record["topic"], encode(record["payload"]))
+            )
+
+
+class _PublishedInfo:
+    rc = 0
+
+    def __init__(self, mid):
+        self.mid = mid
+
+    def wait_for_publish(self, timeout=None):
+        pass
+
+    def is_published(self):
+        return True
@@ -0,0 +1,104 @@
+"""Sengled Bulb Integration."""
+import logging
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+MQTT = "mqtt"
+HTTP = "http"
+
+# Failed publishes in a row before a bulb falls back to HTTP.
+MQTT_FAILURES = 2
+# Smoothed seconds from publish to broker acknowledgement before falling back.
+MQTT_LATENCY_BUDGET = 2.0
+# Weight of the newest sample in the smoothed latency.
+LATENCY_SMOOTHING = 0.3
+# Seconds on HTTP before MQTT gets another try.
+FALLBACK_PERIOD = 60
+
+
+class MqttHealth:
+    def __init__(self):
+        self.latency = None
+        self.failures = 0
+        self.fallback_until = None
+
+    def as_dict(self):
+        return {
+            "latency_ms": (
+                None if self.latency is None else round(self.latency * 1000, 1)
+            ),
+            "failures": self.failures,
+            "fallback": self.fallback_until is not None,
+        }
+
+
+class ControlSelector:
+    """
+    Picks MQTT or HTTP for each Wi-Fi bulb's commands.
+    MQTT is preferred. With http_fallback, a bulb's commands go over HTTP
+    while the broker is not connected, and for FALLBACK_PERIOD after its
+    publishes kept failing or ran over the latency budget. After that MQTT is
+    tried again, and one more failure sends the bulb straight back to HTTP.
+    Without it, which is the default because the HTTP control endpoint is
+    not confirmed for every account, commands always go over MQTT.
+    """
+
+    def __init__(
+        self,
+        failures=MQTT_FAILURES,
+        latency_budget=MQTT_LATENCY_BUDGET,
+        fallback_period=FALLBACK_PERIOD,
+        http_fallback=False,
+    ):
+        self.http_fallback = http_fallback
+        self._failures = failures
+        self._latency_budget = latency_budget
+        self._fallback_period = fallback_period
+        self._health = {}
+
+    def choose(self, device, connected):
+        """Return MQTT or HTTP for the next command to device."""
+        if not self.http_fallback:
+            return MQTT
+        if not connected:
+            return HTTP
+        health = self._health.get(device)
+        if health is None or health.fallback_until is None:
+            return MQTT
+        if time.monotonic() < health.fallback_until:
+            return HTTP
+        # On probation: a success clears the record, a failure falls back again.
+        health.fallback_until = None
+        health.failures = self._failures - 1
+        health.latency = None
+        return MQTT
+
+    def record(self, device, seconds, published):
+        """Feed back how a publish to device went."""
+        health = self._health.get(device)
+        if health is None:
+            health = self._health[device] = MqttHealth()
+        if published:
+            health.failures = 0
+            if health.latency is None:
+                health.latency = seconds
+            else:
+                health.latency += LATENCY_SMOOTHING * (seconds - health.latency)
+        else:
+            health.failures += 1
+        slow = health.latency is not None and health.latency > self._latency_budget
+        if not self.http_fallback or (health.failures < self._failures and not slow):
+            return
+        if health.fallback_until is None:
+            _LOGGER.info(
+                "SengledApi: MQTT unhealthy for %s, sending its commands over HTTP",
+                device,
+            )
+        health.fallback_until = time.monotonic() + self._fallback_period
+
+    def forget(self, device):
+        self._health.pop(device, None)
+
+    def as_dict(self):
+        return {device: health.as_dict() for device, health in self._health.items()}
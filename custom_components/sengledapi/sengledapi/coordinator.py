@@ -0,0 +1,126 @@
+"""Sengled Bulb Integration."""
+import asyncio
+import functools
+import logging
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+# A device fetch younger than this is shared instead of asking the cloud again.
+DEVICE_CACHE_MAX_AGE = 5
+# Backoff after failed fetches: doubles per failure up to the maximum.
+BACKOFF_BASE = 10
+BACKOFF_MAX = 300
+
+
+def backoff_delay(failures):
+    """Seconds to wait after this many failed attempts in a row."""
+    return min(BACKOFF_BASE * 2 ** (failures - 1), BACKOFF_MAX)
+
+
+class DeviceCoordinator:
+    """
+    Shares one account-level device fetch between every bulb and switch.
+    Concurrent callers wait for the fetch already in flight instead of
+    starting their own. When the cloud is unreachable the last good snapshot
+    keeps being served and fetches back off.
+    """
+
+    def __init__(self, api, max_age=DEVICE_CACHE_MAX_AGE):
+        self._api = api
+        self._max_age = max_age
+        self._lock = asyncio.Lock()
+        self.devices = []
+        self.wifi_devices = []
+        self._index = {}
+        self._last_updated = {}
+        self.last_refresh = None
+        self.failures = 0
+        self._next_attempt = 0
+        self._listeners = []
+
+    @property
+    def has_data(self):
+        return self.last_refresh is not None
+
+    @property
+    def online(self):
+        """False while the last fetch failed and cached data is being served."""
+        return self.failures == 0
+
+    def get(self, uuid):
+        """Return (BulbProperty, wifi) for a device, or None if it is gone."""
+        return self._index.get(uuid)
+
+    def last_updated(self, uuid):
+        """Wall-clock time the device last appeared in a successful fetch."""
+        return self._last_updated.get(uuid)
+
+    def inventory(self):
+        """Return {uuid: (BulbProperty, wifi)} from the last fetch."""
+        return dict(self._index)
+
+    def add_listener(self, listener):
+        """
+        Call listener() after every successful fetch.
+        Returns a function that removes it.
+        """
+        self._listeners.append(listener)
+        return functools.partial(self._listeners.remove, listener)
+
+    async def async_refresh(self, force=False, max_age=None):
+        """
+        Fetch the device lists unless the last fetch is younger than max_age
+        (DEVICE_CACHE_MAX_AGE by default) or a failed fetch is backing off.
+        """
+        if max_age is None:
+            max_age = self._max_age
+        async with self._lock:
+            now = time.monotonic()
+            if not force:
+                if self.failures and now < self._next_attempt:
+                    return
+                if (
+                    not self.failures
+                    and self.last_refresh is not None
+                    and now - self.last_refresh < max_age
+                ):
+                    return
+            try:
+                devices, wifi_devices = await asyncio.gather(
+                    self._api.async_fetch_devices(),
+                    self._api.async_fetch_wifi_devices(),
+                )
+            except Exception as e:
+                self.failures += 1
+                backoff = backoff_delay(self.failures)
+                self._next_attempt = time.monotonic() + backoff
+                if not self.has_data:
+                    raise
+                _LOGGER.warning(
+                    "SengledApi: Device fetch failed (%s), serving cached state "
+                    "and retrying in %s seconds",
+                    e,
+                    backoff,
+                )
+                return
+            restored = self.failures > 0
+            self.failures = 0
+            self.devices = devices
+            self.wifi_devices = wifi_devices
+            index = {device.uuid: (device, False) for device in devices}
+            index.update((device.uuid, (device, True)) for device in wifi_devices)
+            self._index = index
+            self.last_refresh = time.monotonic()
+            wall_time = time.time()
+            self._last_updated = {uuid: wall_time for uuid in index}
+            _LOGGER.debug(
+                "SengledApi: Refreshed %s Zigbee and %s Wi-Fi devices",
+                len(devices),
+                len(wifi_devices),
+            )
+        for listener in list(self._listeners):
+            listener()
+        if restored:
+            _LOGGER.info("SengledApi: Sengled cloud reachable again")
+            await self._api.async_replay_offline_commands()
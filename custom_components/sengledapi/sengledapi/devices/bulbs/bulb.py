@@ -1,21 +1,80 @@
 """Sengled Bulb Integration."""
 
 import asyncio
-import json
+import functools
 import logging
 import time
 
+from ...control import HTTP
+from ...endpoints import ELEMENTS, LIFE2
+from ...log import HotPathLogger
+from ...metrics import endpoint_name
+from ...transitions import EFFECT_COLORLOOP, ColorLoop, Fade
+from .. import codec
 from .const import (
-    HTTPS,
     SET_BRIGHTNESS,
     SET_COLOR_TEMPERATURE,
     SET_GROUP,
+    SET_ONOFF,
+    SET_WIFI_ATTRIBUTE,
 )
 
-from .bulbproperty import BulbProperty
-
 _LOGGER = logging.getLogger(__name__)
-_LOGGER.info("SengledApi: Initializing Bulbs")
+_HOT = HotPathLogger(_LOGGER)
+
+# Seconds a command may stay unconfirmed before the cloud's value wins again.
+COMMAND_TIMEOUT = 30
+# Kelvin range the cloud's 0-100 percent color temperature maps onto.
+MIN_KELVIN = 2000
+MAX_KELVIN = 6500
+# Zigbee endpoint each command goes to.
+COMMAND_PATHS = {
+    "state": SET_ONOFF,
+    "brightness": SET_BRIGHTNESS,
+    "color_temperature": SET_COLOR_TEMPERATURE,
+    "color": SET_GROUP,
+}
+
+
+class PendingCommand:
+    """A command applied optimistically and not yet confirmed by the cloud."""
+
+    def __init__(self, expected, previous, deadline, span):
+        self.expected = expected
+        self.previous = previous
+        self.deadline = deadline
+        self.span = span
+        self.acked = False
+        # The "time" field of the MQTT update, echoed back in status messages.
+        self.time_ms = None
+
+
+def normalize_value(value):
+    """Bring cloud and command values to one form so they can be compared."""
+    if isinstance(value, str):
+        if ":" in value:
+            return tuple(int(v) for v in value.split(":"))
+        try:
+            return int(value)
+        except ValueError:
+            return value
+    if isinstance(value, (list, tuple)):
+        try:
+            return tuple(int(v) for v in value)
+        except (TypeError, ValueError):
+            return tuple(value)
+    return value
+
+
+def is_rejected(data):
+    """Whether a control response body says the cloud refused the command."""
+    if data is None:
+        return True
+    if not isinstance(data, dict):
+        return False
+    if data.get("success") is False:
+        return True
+    return str(data.get("ret", 0)) not in ("0", "200")
 
 
 class Bulb:
@@ -34,14 +93,19 @@ class Bulb:
         country,
         wifi,
     ):
-        _LOGGER.info("SengledApi: Bulb %s initializing.", friendly_name)
+        _LOGGER.debug("SengledApi: Bulb %s initializing.", friendly_name)
 
         self._api = api
         self._device_mac = device_mac
         self._friendly_name = friendly_name
         self._state = state
         self._available = isonline
-        self._just_changed_state = True
+        self._pending = {}
+        self._command_failed = None
+        self._seeded = False
+        self._stale = False
+        self._last_updated = None
+        self._offline = False
         self._device_model = device_model
         self._device_rssi = -30
         self._brightness = 255
@@ -57,19 +121,280 @@ class Bulb:
         self._support_brightness = support_brightness
         self._jsession_id = jsession_id
         self._country = country
-        # self._api._subscribe_mqtt(
-        #    "wifielement/{}/status".format(self._device_mac),
-        #    self.update_status,
-        # )
+        self._hub = None
+        self.attribute_update_callback = None
+        self._update_scheduled = False
+        # Brightness to go back to on the next turn on, after a fade out.
+        self._restore_brightness = None
+        self.subscribe_status()
+
+    def subscribe_status(self):
+        """Listen for MQTT status pushes from a Wi-Fi bulb."""
+        if self._wifi_device:
+            self._api.subscribe_mqtt(
+                "wifielement/{}/status".format(self._device_mac),
+                self.update_status,
+            )
 
-    async def async_toggle(self, onoff):
-        """Toggle Bulb on or off"""
-        if onoff == "1":
-            self._state = True
+    def unsubscribe_status(self):
+        if self._wifi_device:
+            self._api.unsubscribe_mqtt(
+                "wifielement/{}/status".format(self._device_mac),
+                self.update_status,
+            )
+
+    @property
+    def stale(self):
+        """Whether the state shown is restored or from a cached snapshot."""
+        return self._stale or self._offline
+
+    @property
+    def pending_commands(self):
+        """Names of the commands still waiting for confirmation."""
+        return sorted(self._pending)
+
+    def _begin_command(self, key, expected, **values):
+        """
+        Apply a command optimistically and remember how to undo it.
+        key -- the command, e.g. "brightness"
+        expected -- the value the cloud reports once the command has landed
+        values -- bulb attributes to set right away
+        """
+        tracer = self._api.tracer
+        pending = self._pending.get(key)
+        if pending is not None:
+            # Roll back to the last confirmed value, not the superseded command.
+            previous = pending.previous
+            tracer.finish(pending.span, "superseded")
         else:
-            self._state = False
+            previous = {attr: getattr(self, attr) for attr in values}
+        span = tracer.start(
+            key,
+            self._device_mac,
+            self._device_model,
+            self._hub,
+            self._country,
+            "mqtt" if self._wifi_device else "http",
+        )
+        pending = PendingCommand(
+            normalize_value(expected),
+            previous,
+            time.monotonic() + COMMAND_TIMEOUT,
+            span,
+        )
+        self._pending[key] = pending
+        self._command_failed = None
+        for attr, value in values.items():
+            setattr(self, attr, value)
+        return pending
+
+    def _rollback(self, key, pending, reason):
+        if self._pending.get(key) is not pending:
+            return
+        del self._pending[key]
+        for attr, value in pending.previous.items():
+            setattr(self, attr, value)
+        self._command_failed = key
+        self._api.tracer.finish(pending.span, "rejected")
+        _LOGGER.warning(
+            "SengledApi: Bulb %s %s command %s rolled back: %s",
+            self._friendly_name,
+            self._device_mac,
+            key,
+            reason,
+        )
+        # The entity still shows the optimistic value; write the old one.
+        self._schedule_attribute_update()
+
+    def command_endpoint(self, key):
+        """Metrics name of the endpoint a command to this bulb goes through."""
         if self._wifi_device:
+            return "mqtt"
+        return endpoint_name(COMMAND_PATHS[key])
+
+    def _begin_group_color(self, color):
+        """Start a color command that a shared group request will carry."""
+        self._state = True
+        pending = self._begin_command(
+            "color",
+            tuple(color),
+            _rgb_color_r=color[0],
+            _rgb_color_g=color[1],
+            _rgb_color_b=color[2],
+        )
+        pending.span.mark("sent")
+        return pending
+
+    def _send_request(self, key, pending, url, payload):
+        pending.span.mark("sent")
+        task = self._api.async_schedule_request(url, payload, self._jsession_id)
+        task.add_done_callback(functools.partial(self._request_done, key, pending))
+
+    def _request_done(self, key, pending, task):
+        data = None if task.cancelled() else task.result()
+        if is_rejected(data):
+            self._rollback(key, pending, "rejected by the cloud")
+        else:
+            pending.acked = True
+            pending.span.mark("acked")
+
+    def _publish(self, key, pending, data):
+        """Send a Wi-Fi bulb command over MQTT, or HTTP while MQTT is unhealthy."""
+        pending.time_ms = data["time"]
+        control = self._api.control
+        if control.choose(self._device_mac, self._api.mqtt_connected) == HTTP:
+            self._send_wifi_request(key, pending, data)
+            return
+        pending.span.mark("sent")
+        future = self._api.publish_mqtt(
+            "wifielement/{}/update".format(self._device_mac),
+            codec.dumps(data),
+            command=key,
+        )
+        future.add_done_callback(
+            functools.partial(
+                self._publish_done, key, pending, data, time.perf_counter()
+            )
+        )
+
+    def _publish_done(self, key, pending, data, start, future):
+        published = not future.cancelled() and future.result()
+        self._api.control.record(
+            self._device_mac, time.perf_counter() - start, published
+        )
+        if published:
+            pending.span.mark("published")
+        elif not self._api.control.http_fallback:
+            self._rollback(key, pending, "MQTT publish failed")
+        elif self._pending.get(key) is pending:
             _LOGGER.info(
+                "SengledApi: MQTT publish to %s failed, retrying over HTTP",
+                self._device_mac,
+            )
+            self._send_wifi_request(key, pending, data)
+
+    def _send_wifi_request(self, key, pending, data):
+        pending.span.transport = HTTP
+        url = self._api.endpoint(LIFE2, SET_WIFI_ATTRIBUTE)
+        self._send_request(key, pending, url, data)
+
+    def _reconcile(self, key, raw, **values):
+        """
+        Apply a value reported by a poll or push.
+        A pending command keeps its optimistic value until the cloud reports
+        the expected value or the command times out.
+        """
+        pending = self._pending.get(key)
+        if pending is not None:
+            if normalize_value(raw) == pending.expected:
+                del self._pending[key]
+                self._api.tracer.finish(pending.span, "confirmed")
+            elif time.monotonic() < pending.deadline:
+                return
+            else:
+                del self._pending[key]
+                self._api.tracer.finish(pending.span, "timeout")
+                if not pending.acked:
+                    self._command_failed = key
+                    _LOGGER.warning(
+                        "SengledApi: Bulb %s %s command %s timed out",
+                        self._friendly_name,
+                        self._device_mac,
+                        key,
+                    )
+        for attr, value in values.items():
+            setattr(self, attr, value)
+
+    @property
+    def effect(self):
+        """The effect running on the bulb, if any."""
+        return self._api.transitions.effect(self)
+
+    def _current_color(self):
+        """The color as an (r, g, b) tuple, or None while it is unknown."""
+        if self._wifi_device:
+            return tuple(int(c) for c in self._color.split(":"))
+        channels = (self._rgb_color_r, self._rgb_color_g, self._rgb_color_b)
+        if None in channels:
+            return None
+        return tuple(int(c) for c in channels)
+
+    async def async_transition(
+        self, duration, brightness=None, color=None, color_temperature=None
+    ):
+        """
+        Turn on and fade to the given values over duration seconds.
+        Values not given stay as they are; a bulb that was off fades up from
+        its lowest brightness, and values not known yet jump to their target.
+        Returns a future, True once the fade completes.
+        """
+        restore = self._restore_brightness
+        self._restore_brightness = None
+        start = {}
+        targets = {}
+        if self._support_brightness:
+            target = brightness or restore or self._brightness or 255
+            if not self._state:
+                await self.async_set_brightness(1)
+                await self.async_toggle("1")
+            if self._brightness is not None:
+                start["brightness"] = self._brightness
+            targets["brightness"] = target
+        elif not self._state:
+            await self.async_toggle("1")
+        if color is not None and self._support_color:
+            current = self._current_color()
+            if current is not None:
+                start["color"] = current
+            targets["color"] = tuple(int(c) for c in color)
+        if color_temperature is not None and self._support_color_temp:
+            if self._color_temperature is None:
+                await self.async_color_temperature(color_temperature)
+            else:
+                start["color_temperature"] = int(self._color_temperature)
+                targets["color_temperature"] = int(color_temperature)
+        return self._api.transitions.start(self, Fade(start, targets, duration))
+
+    async def async_fade_out(self, duration):
+        """Fade to the lowest brightness over duration seconds, then turn off."""
+        if not self._support_brightness or not self._state or not self._brightness:
+            await self.async_toggle("0")
+            return None
+        fade = Fade(
+            {"brightness": self._brightness},
+            {"brightness": 1},
+            duration,
+            turn_off=True,
+        )
+        return self._api.transitions.start(self, fade)
+
+    async def async_finish_fade_out(self, brightness):
+        """Turn off at the end of a fade out and remember where it started."""
+        await self.async_toggle("0")
+        self._restore_brightness = brightness
+
+    async def async_set_effect(self, effect):
+        """Start an effect; it runs until the next command to the bulb."""
+        if effect != EFFECT_COLORLOOP or not self._support_color:
+            _LOGGER.warning(
+                "SengledApi: Bulb %s does not support effect %s",
+                self._friendly_name,
+                effect,
+            )
+            return None
+        if not self._state:
+            await self.async_toggle("1")
+        return self._api.transitions.start(self, ColorLoop())
+
+    async def async_toggle(self, onoff):
+        """Toggle Bulb on or off"""
+        self._api.transitions.cancel(self)
+        state = onoff == "1"
+        restore = self._restore_brightness if state else None
+        self._restore_brightness = None
+        pending = self._begin_command("state", state, _state=state)
+        if self._wifi_device:
+            _LOGGER.debug(
                 "SengledApi: Wifi Bulb %s %s turning on.",
                 self._friendly_name,
                 self._device_mac,
@@ -81,87 +406,85 @@ class Bulb:
                 "time": int(time.time() * 1000),
             }
 
-            self._api.publish_mqtt(
-                "wifielement/{}/update".format(self._device_mac),
-                json.dumps(data),
-            )
+            self._publish("state", pending, data)
         else:
-            _LOGGER.info(
+            _LOGGER.debug(
                 "SengledApi: Bulb %s %s turning on.",
                 self._friendly_name,
                 self._device_mac,
             )
-            url = (
-                HTTPS
-                + self._country
-                + "-elements.cloud.sengled.com/zigbee/device/deviceSetOnOff.json"
-            )
+            url = self._api.endpoint(ELEMENTS, SET_ONOFF)
 
             payload = {"deviceUuid": self._device_mac, "onoff": onoff}
 
-            loop = asyncio.get_running_loop()
-            loop.create_task(
-                self._api.async_do_request(url, payload, self._jsession_id)
-            )
+            self._send_request("state", pending, url, payload)
+        if restore is not None:
+            await self.async_set_brightness(restore)
 
     async def async_set_brightness(self, brightness):
         """Set Bulb Brightness"""
+        self._api.transitions.cancel(self)
+        self._restore_brightness = None
         if self._wifi_device:
-            _LOGGER.info(
+            _LOGGER.debug(
                 "Wifi Bulb %s %s setting brightness %s, This is from HA ",
                 self._friendly_name,
                 self._device_mac,
-                str(brightness),
+                brightness,
             )
 
             brightness_precentage = round((brightness / 255) * 100)
 
-            _LOGGER.info(
+            _LOGGER.debug(
                 "SengledApi: Wifi Color Bulb %s %s setting Brighness %s, This is what we are setting Sengled API",
                 self._friendly_name,
                 self._device_mac,
-                str(brightness_precentage),
+                brightness_precentage,
             )
 
+            pending = self._begin_command(
+                "brightness", brightness_precentage, _brightness=brightness
+            )
             data_brightness = {
                 "dn": self._device_mac,
                 "type": "brightness",
-                "value": str(brightness_precentage),
+                "value": brightness_precentage,
                 "time": int(time.time() * 1000),
             }
 
-            self._api.publish_mqtt(
-                "wifielement/{}/update".format(self._device_mac),
-                json.dumps(data_brightness),
-            )
+            self._publish("brightness", pending, data_brightness)
         else:
-            _LOGGER.info(
+            _LOGGER.debug(
                 "Bulb %s %s setting brightness.", self._friendly_name, self._device_mac
             )
 
-            url = HTTPS + self._country + SET_BRIGHTNESS
+            url = self._api.endpoint(ELEMENTS, SET_BRIGHTNESS)
 
             payload = {"deviceUuid": self._device_mac, "brightness": brightness}
 
-            loop = asyncio.get_running_loop()
-            loop.create_task(
-                self._api.async_do_request(url, payload, self._jsession_id)
+            pending = self._begin_command(
+                "brightness", brightness, _brightness=brightness
             )
+            self._send_request("brightness", pending, url, payload)
 
     async def async_color_temperature(self, color_temperature):
-        _LOGGER.info(
+        _LOGGER.debug(
             "Wifi Bulb %s %s setting color Temperature %s, This is from HA ",
             self._friendly_name,
             self._device_mac,
-            str(color_temperature),
+            color_temperature,
         )
         """Set Color Temperature"""
-        color_temperature_precentage = round(
-            self.translate(int(color_temperature), 200, 6500, 1, 100)
+        self._api.transitions.cancel(self)
+        color_temperature_precentage = self.kelvin_to_percent(color_temperature)
+        pending = self._begin_command(
+            "color_temperature",
+            color_temperature_precentage,
+            _color_temperature=int(color_temperature),
         )
 
         if self._wifi_device:
-            _LOGGER.info(
+            _LOGGER.debug(
                 "SengledApi: Wifi Color Bulb %s %s Set Color Temperature %s, This is what we are setting Sengled API",
                 self._friendly_name,
                 self._device_mac,
@@ -175,29 +498,23 @@ class Bulb:
                 "time": int(time.time() * 1000),
             }
 
-            self._api.publish_mqtt(
-                "wifielement/{}/update".format(self._device_mac),
-                json.dumps(data_color_temperature),
-            )
+            self._publish("color_temperature", pending, data_color_temperature)
         else:
-            _LOGGER.info(
+            _LOGGER.debug(
                 "Bulb %s %s Set Color Temperature %s.",
                 self._friendly_name,
                 self._device_mac,
                 color_temperature_precentage,
             )
 
-            url = HTTPS + self._country + SET_COLOR_TEMPERATURE
+            url = self._api.endpoint(ELEMENTS, SET_COLOR_TEMPERATURE)
 
             payload = {
                 "deviceUuid": self._device_mac,
                 "colorTemperature": color_temperature_precentage,
             }
 
-            loop = asyncio.get_running_loop()
-            loop.create_task(
-                self._api.async_do_request(url, payload, self._jsession_id)
-            )
+            self._send_request("color_temperature", pending, url, payload)
 
     async def async_set_color(self, color):
         """
@@ -205,28 +522,26 @@ class Bulb:
         device_id: A single device ID or a list to update multiple at once
         color: [red(0-255), green(0-255), blue(0-255)]
         """
+        self._api.transitions.cancel(self)
         if self._wifi_device:
-            _LOGGER.info(
-                "SengledApi: Wifi Color Bulb "
-                + self._friendly_name
-                + " "
-                + self._device_mac
-                + " .Setting Color"
+            _LOGGER.debug(
+                "SengledApi: Wifi Color Bulb %s %s Setting Color",
+                self._friendly_name,
+                self._device_mac,
             )
 
+            sengled_color = self.convert_color_HA(color)
+            pending = self._begin_command("color", sengled_color, _color=sengled_color)
             data_color = {
                 "dn": self._device_mac,
                 "type": "color",
-                "value": self.convert_color_HA(color),
+                "value": sengled_color,
                 "time": int(time.time() * 1000),
             }
 
-            self._api.publish_mqtt(
-                "wifielement/{}/update".format(self._device_mac),
-                json.dumps(data_color),
-            )
+            self._publish("color", pending, data_color)
         else:
-            _LOGGER.info(
+            _LOGGER.debug(
                 "SengledApi: Color Bulb %s %s Setting Color",
                 self._friendly_name,
                 self._device_mac,
@@ -237,9 +552,9 @@ class Bulb:
                 mycolor = mycolor.replace(*r)
                 a, b, c = mycolor.split(",")
 
-            _LOGGER.info("SengledApi: Set Color R %s G %s B %s", int(a), int(b), int(c))
+            _LOGGER.debug("SengledApi: Set Color R %s G %s B %s", a, b, c)
 
-            url = HTTPS + self._country + SET_GROUP
+            url = self._api.endpoint(ELEMENTS, SET_GROUP)
 
             payload = {
                 "cmdId": 129,
@@ -251,110 +566,148 @@ class Bulb:
 
             self._state = True
 
-            loop = asyncio.get_running_loop()
-            loop.create_task(
-                self._api.async_do_request(url, payload, self._jsession_id)
+            pending = self._begin_command(
+                "color",
+                (int(a), int(b), int(c)),
+                _rgb_color_r=int(a),
+                _rgb_color_g=int(b),
+                _rgb_color_b=int(c),
             )
+            self._send_request("color", pending, url, payload)
 
     def is_on(self):
         """Get State"""
         return self._state
 
     async def async_update(self):
-        if self._wifi_device:
-            _LOGGER.info(
-                "SengledApi: Wifi Bulb %s %s is updating",
-                self._friendly_name,
-                self._device_mac,
-            )
-            if not self._just_changed_state:
-                _LOGGER.info(
-                    "SengledApi: Bulb State Change: %s", self._just_changed_state
+        _HOT.sample(
+            self._device_mac,
+            "SengledApi: Bulb updating",
+            name=self._friendly_name,
+            device=self._device_mac,
+        )
+        # One account-level fetch is shared by every bulb in a poll cycle.
+        device = await self._api.async_get_device(self._device_mac)
+        if device is None:
+            if self._api.online:
+                _LOGGER.debug(
+                    "SengledApi: Bulb %s is no longer on the account", self._device_mac
                 )
-            else:
-                bulbs = []
-                url = "https://life2.cloud.sengled.com/life2/device/list.json"
-                payload = {}
-
-                data = await self._api.async_do_request(url, payload, self._jsession_id)
+                self._available = False
+            return
+        self._last_updated = self._api.device_last_updated(self._device_mac)
+        self._offline = not self._api.online
+        if self._offline:
+            # Cached snapshot, already applied when it was fetched.
+            return
+        self.update_property(*device)
 
-                _LOGGER.info(
-                    "SengledApi: Wifi Bulb " + self._friendly_name + " updating."
-                )
-                for item in data["deviceList"]:
-                    _LOGGER.debug("SengledApi: Wifi Bulb update return: %s", str(item))
-                    bulbs.append(BulbProperty(self, item, True))
-                for items in bulbs:
-                    if items.uuid == self._device_mac:
-                        self._friendly_name = items.name
-                        self._state = items.switch
-                        self._avaliable = items.isOnline
-                        self._device_rssi = items.device_rssi
-                        # Supported Features
-                        if self._support_brightness:
-                            self._brightness = round(
-                                (int(items.brightness) / 100) * 255
-                            )
-                        if self._support_color_temp:
-                            _LOGGER.debug("SengledApi: Wifi Bulb Colo Temp: %s", items.color_temperature)
-                            self._color_temperature = round(self.translate(int(items.color_temperature), 0, 100, 2000, 6500))
-                        if self._support_color:
-                            _LOGGER.debug("SengledApi: Wifi Bulb Color: %s", items.color)
-                            self._color = items.color
+    def update_property(self, items, wifi):
+        """Apply a device list entry to this bulb."""
+        if wifi:
+            self.update_wifi_property(items)
         else:
-            _LOGGER.info(
-                "Sengled Bulb "
-                + self._friendly_name
-                + " "
-                + self._device_mac
-                + " updating."
+            self.update_zigbee_property(items)
+
+    def update_wifi_property(self, items):
+        """Apply a Wi-Fi device list entry to this bulb."""
+        self._friendly_name = items.name
+        self._reconcile("state", items.switch, _state=items.switch)
+        self._available = items.isOnline
+        self._device_rssi = items.device_rssi
+        # Supported Features
+        if self._support_brightness:
+            brightness = int(items.brightness)
+            self._reconcile(
+                "brightness", brightness, _brightness=round((brightness / 100) * 255)
             )
-            if self._just_changed_state:
-                self._just_changed_state = False
-                _LOGGER.info(
-                    "SengledApi: Bulb State Change: %s", self._just_changed_state
-                )
+        if self._support_color_temp:
+            _HOT.trace("SengledApi: Wifi Bulb Color Temp: %s", items.color_temperature)
+            color_temperature = int(items.color_temperature)
+            self._reconcile(
+                "color_temperature",
+                color_temperature,
+                _color_temperature=self.percent_to_kelvin(color_temperature),
+            )
+        if self._support_color:
+            _HOT.trace("SengledApi: Wifi Bulb Color: %s", items.color)
+            self._reconcile("color", items.color, _color=items.color)
+        self._seeded = True
+        self._stale = False
+
+    def update_zigbee_property(self, items):
+        """Apply a getDeviceDetails lamp entry to this bulb."""
+        self._friendly_name = items.name
+        self._reconcile("state", items.switch, _state=items.switch)
+        self._available = items.isOnline
+        if items.device_rssi is not None:
+            self._device_rssi = round(
+                self.translate(int(items.device_rssi), 0, 5, -100, -30)
+            )
+        # Supported Features
+        if self._support_brightness:
+            self._reconcile(
+                "brightness", items.brightness, _brightness=items.brightness
+            )
+        if self._support_color:
+            self._reconcile(
+                "color",
+                (items.rgb_color_r, items.rgb_color_g, items.rgb_color_b),
+                _rgb_color_r=items.rgb_color_r,
+                _rgb_color_g=items.rgb_color_g,
+                _rgb_color_b=items.rgb_color_b,
+            )
+        if self._support_color_temp:
+            _HOT.trace("SengledApi: Bulb Color Temp: %s", items.color_temperature)
+            color_temperature = items.color_temperature
+            if color_temperature is not None:
+                # Reported in percent, like Wi-Fi bulbs; kept in kelvin.
+                color_temperature = self.percent_to_kelvin(color_temperature)
+            self._reconcile(
+                "color_temperature",
+                items.color_temperature,
+                _color_temperature=color_temperature,
+            )
+        if items.typeCode == "E13-N11":
+            self._alarm_status = items.alarm_status
+        self._seeded = True
+        self._stale = False
+
+    def restore_state(self, state, brightness, color_temperature, rgb_color, rssi):
+        """
+        Fill in values from Home Assistant's last known state.
+        Values already taken from cloud data win; anything restored is marked
+        stale until the next successful update.
+        """
+        restored = {}
+        if not self._seeded:
+            restored["_state"] = state
+            restored["_device_rssi"] = rssi
+        restored["_brightness"] = brightness
+        restored["_color_temperature"] = color_temperature
+        if rgb_color is not None:
+            if self._wifi_device:
+                restored["_color"] = ":".join(str(int(c)) for c in rgb_color)
             else:
-                url = "https://element.cloud.sengled.com/zigbee/device/getDeviceDetails.json"
-                payload = {}
-                bulbs = []
-                data = await self._api.async_do_request(url, payload, self._jsession_id)
-                for item in data["deviceInfos"]:
-                    for devices in item["lampInfos"]:
-                        bulbs.append(BulbProperty(self, devices, False))
-                        for items in bulbs:
-                            if items.uuid == self._device_mac:
-                                self._friendly_name = items.name
-                                self._state = items.switch
-                                self._avaliable = items.isOnline
-                                self._device_rssi = round(
-                                    self.translate(
-                                        int(items.device_rssi), 0, 5, -100, -30
-                                    )
-                                )
-                                # Supported Features
-                                if self._support_brightness:
-                                    self._brightness = items.brightness
-                                if self._support_color:
-                                    self._rgb_color_b = items.rgb_color_b
-                                    self._rgb_color_g = items.rgb_color_g
-                                    self._rgb_color_r = items.rgb_color_r
-                                if self._support_color_temp:
-                                    _LOGGER.debug(
-                                        "color temp %s", items.color_temperature
-                                    )
-                                    self._color_temperature = items.color_temperature
-                                if items.typeCode == "E13-N11":
-                                    self._alarm_status = items.alarm_status
+                restored["_rgb_color_r"] = int(rgb_color[0])
+                restored["_rgb_color_g"] = int(rgb_color[1])
+                restored["_rgb_color_b"] = int(rgb_color[2])
+        for attr, value in restored.items():
+            if value is None:
+                continue
+            if self._seeded and getattr(self, attr) is not None:
+                continue
+            setattr(self, attr, value)
+            self._stale = True
 
     def update_status(self, message):
         """
-        Update the status from an incoming MQTT message.
-        message -- the incoming message. This is not used.
+        Update the status from an incoming MQTT message, on the event loop.
+        message -- the raw payload of a wifielement/<mac>/status message
         """
         try:
-            data = json.loads(message)
-            _LOGGER.debug("SengledApi: Update Status from MQTT %s", str(data))
+            data = codec.loads(message)
+            _HOT.trace("SengledApi: Update Status from MQTT %s", data)
         except ValueError:
             return
 
@@ -363,19 +716,53 @@ class Bulb:
                 continue
 
             if status["dn"] == self._device_mac:
+                value = status["value"]
+                self._mark_echo(status.get("time"))
+                if status["type"] == "switch":
+                    self._reconcile("state", value == "1", _state=value == "1")
                 if status["type"] == "color":
-                    self._color = status["value"]
+                    self._reconcile("color", value, _color=value)
                 if status["type"] == "colorMode":
-                    self._color_mode = status["value"]
+                    self._color_mode = value
                 if status["type"] == "brightness":
-                    self._brightness = status["value"]
+                    self._reconcile(
+                        "brightness",
+                        value,
+                        _brightness=round((int(value) / 100) * 255),
+                    )
                 if status["type"] == "colorTemperature":
-                    self._color_temperature = status["value"]
+                    self._reconcile(
+                        "color_temperature",
+                        value,
+                        _color_temperature=self.percent_to_kelvin(value),
+                    )
+        self._schedule_attribute_update()
+
+    def _schedule_attribute_update(self):
+        if self._update_scheduled or self.attribute_update_callback is None:
+            return
+        self._update_scheduled = True
+        # Runs after the rest of the current batch of messages, so a burst
+        # of pushes for this bulb is reported once.
+        asyncio.get_running_loop().call_soon(self._attribute_updated)
+
+    def _attribute_updated(self):
+        self._update_scheduled = False
+        if self.attribute_update_callback is not None:
+            self.attribute_update_callback()
+
+    def _mark_echo(self, time_ms):
+        """Note status messages that echo the time field of a pending update."""
+        if time_ms is None:
+            return
+        for pending in self._pending.values():
+            if pending.time_ms is not None and str(pending.time_ms) == str(time_ms):
+                pending.span.mark("echoed")
 
     def set_attribute_update_callback(self, callback):
         """
         Set the callback to be called when an attribute is updated.
-        callback -- callback
+        callback -- callback, called on the event loop after MQTT pushes
         """
         self.attribute_update_callback = callback
 
@@ -401,6 +788,15 @@ class Bulb:
             sengled_color = sengled_color.replace(*r)
         return sengled_color
 
+    def kelvin_to_percent(self, kelvin):
+        """Cloud color temperature for kelvin; percent_to_kelvin inverts it."""
+        percent = round(self.translate(int(kelvin), MIN_KELVIN, MAX_KELVIN, 0, 100))
+        return min(100, max(0, percent))
+
+    def percent_to_kelvin(self, percent):
+        """Kelvin for the cloud's 0 (warm) - 100 (cold) color temperature."""
+        return round(self.translate(int(percent), 0, 100, MIN_KELVIN, MAX_KELVIN))
+
     def translate(self, value, left_min, left_max, right_min, right_max):
         """Figure out how 'wide' each range is"""
         left_span = left_max - left_min
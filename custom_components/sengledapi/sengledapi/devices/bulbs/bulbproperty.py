@@ -1,11 +1,12 @@
 """Sengled Bulb Integration."""
 
 
-import json
 import logging
-import time
+
+from ...log import HotPathLogger
 
 _LOGGER = logging.getLogger(__name__)
+_HOT = HotPathLogger(_LOGGER)
 
 
 class BulbProperty:
@@ -15,9 +16,10 @@ class BulbProperty:
         api -- Sengledapi instance this is attached to
         info -- the device info object returned by the server
         """
-        _LOGGER.debug("SengledApi: Bulb Property - %s", info)
+        _HOT.trace("SengledApi: Bulb Property - %s", info)
         self._api = api
         self._wifi = wifi
+        self._info = info
         if wifi:
             self._uuid = info["deviceUuid"]
             self._category = info["category"]
@@ -27,7 +29,25 @@ class BulbProperty:
             self._uuid = info["deviceUuid"]
             self.device_class = info["deviceClass"]
             self._attributes = info["attributes"]
-            self._info = info
+
+    @property
+    def info(self):
+        """The device info object this was built from."""
+        return self._info
+
+    @property
+    def wifi(self):
+        """Whether this is a Wi-Fi device rather than a Zigbee one."""
+        return self._wifi
+
+    def attribute(self, name):
+        """Raw value of an attribute, or None if the device doesn't report it."""
+        if self._wifi:
+            for attr in self._attributes:
+                if attr["name"] == name:
+                    return attr["value"]
+            return None
+        return self._attributes.get(name)
 
     @property
     def brightness(self):
@@ -38,8 +58,8 @@ class BulbProperty:
                     return int(attr["value"], 10)
             return 0
         else:
-            if self._attributes["brightness"]:
-                brightness = self._info["attributes"]["brightness"]
+            brightness = self._attributes.get("brightness")
+            if brightness is not None and brightness != "":
                 return int(brightness)
 
     @property
@@ -55,8 +75,8 @@ class BulbProperty:
                     return int(attr["value"])
                 #return 2000
         else:
-            if self._attributes["colorTemperature"]:
-                color_temperature = self._info["attributes"]["colorTemperature"]
+            color_temperature = self._attributes.get("colorTemperature")
+            if color_temperature is not None and color_temperature != "":
                 return int(color_temperature)
 
     @property
@@ -168,6 +188,13 @@ class BulbProperty:
         """Universally unique identifier."""
         return self._uuid
 
+    @property
+    def hub(self):
+        """UUID of the hub a Zigbee bulb is paired with, if known."""
+        if self._wifi:
+            return None
+        return self._info.get("hubUuid")
+
     ##Hub property
     @property
     def alarm_status(self):
@@ -184,21 +211,16 @@ class BulbProperty:
 
     @property
     def rgb_color_r(self):
-        if self._attributes["rgbColorR"]:
-            rgbColorR = self._info["attributes"]["rgbColorR"]
-            return rgbColorR
+        # A channel of 0 is a real value, so only a missing key means unknown.
+        return self._attributes.get("rgbColorR")
 
     @property
     def rgb_color_g(self):
-        if self._attributes["rgbColorG"]:
-            rgbColorG = self._info["attributes"]["rgbColorG"]
-            return rgbColorG
+        return self._attributes.get("rgbColorG")
 
     @property
     def rgb_color_b(self):
-        if self._attributes["rgbColorB"]:
-            rgbColorB = self._info["attributes"]["rgbColorB"]
-            return rgbColorB
+        return self._attributes.get("rgbColorB")
 
     ###Wifi only Property
     @property
@@ -296,8 +318,7 @@ class BulbProperty:
                     if attr["name"] == "brightness":
                         return True
             else:
-                if self._attributes["brightness"]:
-                    brightness = self._info["attributes"]["brightness"]
+                if self._attributes["brightness"] not in (None, ""):
                     return True
         except:
             return False
@@ -310,8 +331,7 @@ class BulbProperty:
                     if attr["name"] == "colorTemperature":
                         return True
             else:
-                if self._attributes["colorTemperature"]:
-                    color_temperature = self._info["attributes"]["colorTemperature"]
+                if self._attributes["colorTemperature"] not in (None, ""):
                     return True
         except:
             return False
@@ -326,8 +346,7 @@ class BulbProperty:
                     if attr["name"] == "color":
                         return True
             else:
-                if self._attributes["rgbColorR"]:
-                    rgbColorR = self._info["attributes"]["rgbColorR"]
+                if self._attributes["rgbColorR"] not in (None, ""):
                     return True
         except:
             return False
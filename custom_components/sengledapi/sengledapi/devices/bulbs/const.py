@@ -1,9 +1,10 @@
-HTTPS = "https://"
-SET_ONOFF = "-elements.cloud.sengled.com/zigbee/device/deviceSetOnOff.json"
-SET_BRIGHTNESS = "-elements.cloud.sengled.com/zigbee/device/deviceSetBrightness.json"
-GET_DETAILS = "-element.cloud.sengled.com/zigbee/device/getDeviceDetails.json"
-SET_GROUP = "-elements.cloud.sengled.com/zigbee/device/deviceSetGroup.json"
-SET_COLOR_TEMPERATURE = (
-    "-elements.cloud.sengled.com/zigbee/device/deviceSetColorTemperature.json"
-)
-GET_WIFI_DETAILS = "life2.cloud.sengled.com/life2/device/list.json"
+# Paths on the DETAILS, ELEMENTS and LIFE2 endpoint families; see endpoints.py.
+SET_ONOFF = "/zigbee/device/deviceSetOnOff.json"
+SET_BRIGHTNESS = "/zigbee/device/deviceSetBrightness.json"
+GET_DETAILS = "/zigbee/device/getDeviceDetails.json"
+SET_GROUP = "/zigbee/device/deviceSetGroup.json"
+SET_COLOR_TEMPERATURE = "/zigbee/device/deviceSetColorTemperature.json"
+GET_WIFI_DETAILS = "/life2/device/list.json"
+# Takes the same body as a wifielement/<mac>/update MQTT message.
+# Not confirmed against the Sengled cloud; only used with wifi_http_fallback.
+SET_WIFI_ATTRIBUTE = "/life2/device/control.json"
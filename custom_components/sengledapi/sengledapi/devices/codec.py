@@ -0,0 +1,41 @@
+"""Sengled Bulb Integration."""
+
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the install
+    orjson = None
+
+
+def _json_dumps(obj):
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def _json_loads(data):
+    # json.loads accepts bytes directly and detects the encoding itself.
+    return json.loads(data)
+
+
+CODECS = {"json": (_json_dumps, _json_loads)}
+if orjson is not None:
+    CODECS["orjson"] = (orjson.dumps, orjson.loads)
+
+name = None
+dumps = None
+loads = None
+
+
+def set_codec(codec_name):
+    """
+    Select the codec used for request and MQTT payloads.
+    codec_name -- "orjson" or "json"
+    """
+    global name, dumps, loads
+    if codec_name not in CODECS:
+        raise ValueError("Unknown codec {}".format(codec_name))
+    name = codec_name
+    dumps, loads = CODECS[codec_name]
+
+
+set_codec("orjson" if "orjson" in CODECS else "json")
@@ -1,24 +1,73 @@
 """Sengled Bulb Integration."""
 
-import json
+import asyncio
+import contextlib
+import functools
 import logging
-import ssl
+from concurrent.futures import ThreadPoolExecutor
 
 import aiohttp
-import certifi
-import requests
 
-from .exceptions import SengledApiAccessToken
+from ..log import HotPathLogger
+from . import codec
+from .exceptions import SengledApiAccessToken, SengledApiError
 
-_LOGGER = logging.getLogger(__name__)
+try:
+    import ijson
+except ImportError:  # pragma: no cover - depends on the install
+    ijson = None
 
-_LOGGER.info("SengledApi: Initializing Request")
+_LOGGER = logging.getLogger(__name__)
+_HOT = HotPathLogger(_LOGGER)
+
+# getDeviceDetails.json nests every lamp of every hub under this prefix.
+HUB_PREFIX = "deviceInfos.item"
+LAMP_INFOS_PREFIX = "deviceInfos.item.lampInfos.item"
+HUB_UUID_PREFIX = "deviceInfos.item.deviceUuid"
+
+# Lamp attributes BulbProperty reads. Everything else is dropped while parsing.
+LAMP_ATTRIBUTES = frozenset(
+    (
+        "alarmStatus",
+        "brightness",
+        "colorMode",
+        "colorTemperature",
+        "deviceRssi",
+        "isOnline",
+        "name",
+        "onoff",
+        "productCode",
+        "rgbColorB",
+        "rgbColorG",
+        "rgbColorR",
+        "typeCode",
+        "version",
+    )
+)
+
+
+def prune_lamp_info(lamp, hub_uuid=None):
+    """
+    Reduce a lampInfos entry to the fields BulbProperty uses.
+    Returns (uuid, info).
+    """
+    attributes = lamp.get("attributes") or {}
+    info = {
+        "deviceUuid": lamp["deviceUuid"],
+        "deviceClass": lamp.get("deviceClass"),
+        "hubUuid": hub_uuid,
+        "attributes": {
+            key: value for key, value in attributes.items() if key in LAMP_ATTRIBUTES
+        },
+    }
+    return info["deviceUuid"], info
 
-import asyncio
-import functools
-from concurrent.futures import ThreadPoolExecutor
 
 async def async_create_ssl_context():
+    import ssl
+
+    import certifi
+
     loop = asyncio.get_running_loop()
     with ThreadPoolExecutor() as executor:
         return await loop.run_in_executor(
@@ -26,11 +75,33 @@ async def async_create_ssl_context():
         )
 
 
+class HttpTransport:
+    """
+    Sends Request's HTTP posts to the server.
+    A transport's post(url, data, headers) is an async context manager that
+    yields a response with status, read() and a content stream, like aiohttp.
+    capture.Recorder and capture.Replayer are drop-in replacements.
+    """
+
+    @contextlib.asynccontextmanager
+    async def post(self, url, data, headers):
+        sslcontext = await async_create_ssl_context()
+        async with aiohttp.ClientSession() as session:
+            async with session.post(
+                url, headers=headers, data=data, ssl=sslcontext
+            ) as response:
+                yield response
+
+
+HTTP_TRANSPORT = HttpTransport()
+
+
 class Request:
-    def __init__(self, url, payload, no_return=False):
-        _LOGGER.info("SengledApi: Sengled Request initializing.")
+    def __init__(self, url, payload, no_return=False, transport=None):
+        _HOT.trace("SengledApi: Request", url=url)
         self._url = url
-        self._payload = json.dumps(payload)
+        self._transport = transport or HTTP_TRANSPORT
+        self._payload = codec.dumps(payload)
         self._no_return = no_return
         self._response = None
         self._jsession_id = None
@@ -47,78 +118,126 @@ class Request:
             "Cookie": f"JSESSIONID={jsession_id}",
             "Connection": "keep-alive",
         }
-        
-        # Asynchronously create the SSL context in a non-blocking way.
-        sslcontext = await async_create_ssl_context()
 
-        # Use aiohttp's ClientSession for asynchronous HTTP requests.
-        async with aiohttp.ClientSession() as session:
-            async with session.post(self._url, headers=self._header, data=self._payload, ssl=sslcontext) as response:
-                # Make sure to handle potential exceptions and non-JSON responses appropriately.
-                if response.status == 200:
-                    data = await response.json()
-                    return data
-                else:
-                    _LOGGER.error("Failed to get response, status: %s", response.status)
-                    return None
+        async with self._transport.post(
+            self._url, self._payload, self._header
+        ) as response:
+            # Make sure to handle potential exceptions and non-JSON responses appropriately.
+            if response.status == 200:
+                data = codec.loads(await response.read())
+                return data
+            elif response.status == 401:
+                raise SengledApiAccessToken("Session rejected by {}".format(self._url))
+            else:
+                _LOGGER.error("Failed to get response, status: %s", response.status)
+                return None
+
+    async def async_get_status(self, jsession_id):
+        """HTTP status of the response; the body is never downloaded."""
+        self._header = {
+            "Content-Type": "application/json",
+            "Cookie": f"JSESSIONID={jsession_id}",
+            "Connection": "keep-alive",
+        }
+        async with self._transport.post(
+            self._url, self._payload, self._header
+        ) as response:
+            return response.status
+
+    async def async_iter_lamp_infos(self, jsession_id):
+        """
+        Yield (uuid, info) for every lamp in a getDeviceDetails.json response.
+        With ijson installed the body is parsed while it streams in, so the
+        caller can stop at the lamp it wants before the rest has arrived.
+        """
+        self._header = {
+            "Content-Type": "application/json",
+            "Cookie": f"JSESSIONID={jsession_id}",
+            "Connection": "keep-alive",
+        }
+        async with self._transport.post(
+            self._url, self._payload, self._header
+        ) as response:
+            if response.status == 401:
+                raise SengledApiAccessToken("Session rejected by {}".format(self._url))
+            if response.status != 200:
+                # An empty list here would look like every lamp was removed.
+                raise SengledApiError(
+                    "Failed to get response, status: {}".format(response.status)
+                )
+            if ijson is not None:
+                # Build one lamp at a time, noting the hub it belongs to. JSON
+                # key order isn't guaranteed, so lamps seen before their hub's
+                # deviceUuid wait until it arrives or the hub object ends.
+                hub_uuid = None
+                waiting = []
+                builder = None
+                async for prefix, event, value in ijson.parse(
+                    response.content, use_float=True
+                ):
+                    if builder is not None:
+                        if prefix == LAMP_INFOS_PREFIX and event == "end_map":
+                            if hub_uuid is None:
+                                waiting.append(builder.value)
+                            else:
+                                yield prune_lamp_info(builder.value, hub_uuid)
+                            builder = None
+                        else:
+                            builder.event(event, value)
+                    elif prefix == LAMP_INFOS_PREFIX and event == "start_map":
+                        builder = ijson.common.ObjectBuilder()
+                        builder.event(event, value)
+                    elif prefix == HUB_UUID_PREFIX:
+                        hub_uuid = value
+                        for lamp in waiting:
+                            yield prune_lamp_info(lamp, hub_uuid)
+                        waiting = []
+                    elif prefix == HUB_PREFIX and event == "start_map":
+                        hub_uuid = None
+                    elif prefix == HUB_PREFIX and event == "end_map":
+                        # A hub object without a deviceUuid.
+                        for lamp in waiting:
+                            yield prune_lamp_info(lamp, None)
+                        waiting = []
+                return
+            data = codec.loads(await response.read())
+
+        for hub in data.get("deviceInfos") or []:
+            for lamp in hub.get("lampInfos") or []:
+                yield prune_lamp_info(lamp, hub.get("deviceUuid"))
 
     ########################Login#####################################
-    def get_login_response(self):
-        _LOGGER.info("SengledApi: Get Login Reponse.")
-        r = requests.post(self._url, headers=self._header, data=self._payload)
-        data = r.json()
-        _LOGGER.debug("SengledApi: Get Login Reponse %s", str(data))
-        return data
-
     async def async_get_login_response(self):
         _LOGGER.info("SengledApi: Get Login Response async.")
-        sslcontext = await async_create_ssl_context()
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                self._url, headers=self._header, data=self._payload, ssl=sslcontext
-            ) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    _LOGGER.debug("SengledApi: Get Login Response %s ", str(data))
-                    return data
-                else:
-                    _LOGGER.error("Failed to get login response, status: %s", resp.status)
-                    return None
+        async with self._transport.post(
+            self._url, self._payload, self._header
+        ) as resp:
+            if resp.status == 200:
+                data = codec.loads(await resp.read())
+                _LOGGER.debug("SengledApi: Get Login Response %s ", data)
+                return data
+            else:
+                _LOGGER.error("Failed to get login response, status: %s", resp.status)
+                return None
 
     ######################Session Timeout#################################
-    def is_session_timeout_response(self, jsession_id):
-        _LOGGER.info("SengledApi: Get Session Timeout Response")
-        self._header = {
-            "Content-Type": "application/json",
-            "Cookie": "JSESSIONID={}".format(jsession_id),
-            "sid": jsession_id,
-            "X-Requested-With": "com.sengled.life2",
-        }
-
-        r = requests.post(self._url, headers=self._header, data=self._payload)
-        data = r.json()
-        _LOGGER.debug("SengledApi: Get Session Timeout Response %s", str(data))
-        return data
-
     async def async_is_session_timeout_response(self, jsession_id):
-        _LOGGER.info("SengledApi: Get Session Timeout Response Async")
+        _LOGGER.debug("SengledApi: Get Session Timeout Response Async")
         self._header = {
             "Content-Type": "application/json",
             "Cookie": "JSESSIONID={}".format(jsession_id),
             "sid": jsession_id,
             "X-Requested-With": "com.sengled.life2",
         }
-        sslcontext = await async_create_ssl_context()
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                self._url, headers=self._header, data=self._payload, ssl=sslcontext
-            ) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    _LOGGER.info(
-                        "SengledApi: Get Session Timeout Response Async %s", str(data)
-                    )
-                    return data
-                else:
-                    _LOGGER.error("Failed to get session timeout response, status: %s", resp.status)
-                    return None
+        async with self._transport.post(
+            self._url, self._payload, self._header
+        ) as resp:
+            if resp.status == 200:
+                data = codec.loads(await resp.read())
+                _LOGGER.debug(
+                    "SengledApi: Get Session Timeout Response Async %s", data
+                )
+                return data
+            else:
+                _LOGGER.error("Failed to get session timeout response, status: %s", resp.status)
+                return None
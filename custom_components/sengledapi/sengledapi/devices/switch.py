@@ -1,89 +1,123 @@
 """Sengled Bulb Integration."""
 
-import asyncio
+import functools
 import logging
+import time
+
+from ..endpoints import ELEMENTS
+from .bulbs.bulb import COMMAND_TIMEOUT, is_rejected
+from .bulbs.const import SET_ONOFF
 
 _LOGGER = logging.getLogger(__name__)
 
+# Zigbee smart plugs, listed by getDeviceDetails.json alongside the lamps.
+SWITCH_MODELS = frozenset(("E1E-G7F",))
+# A poll only fetches when the shared device list is older than this; light
+# polls normally keep it fresher, so switches add no requests of their own.
+SWITCH_MAX_AGE = 30
 
-class Switch:
-    def __init__(
-        self,
-        api,
-        device_mac,
-        friendly_name,
-        state,
-        device_model,
-        accesstoken,
-        country,
-    ):
-        _LOGGER.debug("SengledApi: Switch " + friendly_name + " initializing.")
 
-        self._api = api
-        self._device_mac = device_mac
-        self._friendly_name = friendly_name
-        self._state = state
-        self._avaliable = True
-        self._just_changed_state = False
-        self._device_model = device_model
-        self._accesstoken = accesstoken
-        self._country = country
+def is_switch(device):
+    """Whether a BulbProperty describes a smart plug rather than a lamp."""
+    if device.wifi:
+        return False
+    return device.productCode in SWITCH_MODELS or device.typeCode in SWITCH_MODELS
 
-    async def async_turn_on(self):
-        _LOGGER.debug("Switch " + self._friendly_name + " turning on.")
 
-        url = (
-            "https://"
-            + self._country
-            + "-elements.cloud.sengled.com/zigbee/device/deviceSetOnOff.json"
-        )
+class Switch:
+    def __init__(self, api, device, jsession_id):
+        """
+        api -- SengledApi instance this is attached to
+        device -- the plug's BulbProperty from the shared device fetch
+        """
+        _LOGGER.debug("SengledApi: Switch %s initializing.", device.name)
 
-        payload = {"deviceUuid": self._device_mac, "onoff": "1"}
+        self._api = api
+        self._device_mac = device.uuid
+        self._device_model = device.productCode or device.typeCode
+        self._friendly_name = device.name
+        self._state = device.switch
+        self._available = device.isOnline
+        self._jsession_id = jsession_id
+        # (state, deadline) of a command the cloud hasn't reported back yet.
+        self._pending = None
+        self.attribute_update_callback = None
+
+    def set_attribute_update_callback(self, callback):
+        """
+        Set the callback to be called when an attribute is updated.
+        callback -- callback, called after shared fetches that include the plug
+        """
+        self.attribute_update_callback = callback
 
-        loop = asyncio.get_running_loop()
-        loop.create_task(self._api.async_do_request(url, payload, self._accesstoken))
+    def is_on(self):
+        return self._state
 
-        self._state = True
-        self._just_changed_state = True
+    async def async_turn_on(self):
+        self._set_state(True)
 
     async def async_turn_off(self):
-        _LOGGER.debug("Switch " + self._friendly_name + " turning off.")
+        self._set_state(False)
 
-        url = (
-            "https://"
-            + self._country
-            + "-elements.cloud.sengled.com/zigbee/device/deviceSetOnOff.json"
+    def _set_state(self, state):
+        _LOGGER.debug(
+            "SengledApi: Switch %s turning %s.",
+            self._friendly_name,
+            "on" if state else "off",
         )
-
-        payload = {"deviceUuid": self._device_mac, "onoff": "0"}
-
-        loop = asyncio.get_running_loop()
-        loop.create_task(self._api.async_do_request(url, payload, self._accesstoken))
-
-        self._state = False
-        self._just_changed_state = True
-
-    def is_on(self):
-        return self._state
+        url = self._api.endpoint(ELEMENTS, SET_ONOFF)
+        payload = {"deviceUuid": self._device_mac, "onoff": "1" if state else "0"}
+        previous = self._state
+        self._state = state
+        self._pending = (state, time.monotonic() + COMMAND_TIMEOUT)
+        task = self._api.async_schedule_request(url, payload, self._jsession_id)
+        task.add_done_callback(functools.partial(self._request_done, state, previous))
+
+    def _request_done(self, state, previous, task):
+        data = None if task.cancelled() else task.result()
+        if not is_rejected(data) or self._pending is None:
+            return
+        if self._pending[0] != state:
+            # A newer command owns the state now.
+            return
+        _LOGGER.warning(
+            "SengledApi: Switch %s %s command rolled back",
+            self._friendly_name,
+            self._device_mac,
+        )
+        self._pending = None
+        self._state = previous
+        if self.attribute_update_callback is not None:
+            self.attribute_update_callback()
 
     async def async_update(self):
-        _LOGGER.debug("Switch " + self._friendly_name + " updating.")
-        if self._just_changed_state:
-            self._just_changed_state = False
+        """Update from the shared device fetch, fetching only if it is old."""
+        device = await self._api.async_get_device(
+            self._device_mac, max_age=SWITCH_MAX_AGE
+        )
+        if device is None:
+            self._available = False
+            return
+        self.update_property(device[0])
+
+    def refresh(self):
+        """Apply the latest shared fetch; called by the coordinator."""
+        device = self._api.device(self._device_mac)
+        if device is None:
+            self._available = False
         else:
-            url = (
-                "https://element.cloud.sengled.com/zigbee/device/getDeviceDetails.json"
-            )
-
-            payload = {}
-            data = await self._api.async_do_request(url, payload, self._accesstoken)
-            _LOGGER.debug("Switch " + self._friendly_name + " updating.")
-            for item in data["deviceInfos"]:
-                for items in item["lampInfos"]:
-                    self._friendly_name = items["attributes"]["name"]
-                    self._state = (
-                        True if int(items["attributes"]["onoff"]) == 1 else False
-                    )
-                    self._avaliable = (
-                        False if int(items["attributes"]["isOnline"]) == 0 else True
-                    )
+            self.update_property(device[0])
+        if self.attribute_update_callback is not None:
+            self.attribute_update_callback()
+
+    def update_property(self, device):
+        """Apply a getDeviceDetails entry for this plug."""
+        self._friendly_name = device.name
+        self._available = device.isOnline
+        if self._pending is not None:
+            state, deadline = self._pending
+            if device.switch != state and time.monotonic() < deadline:
+                # The command hasn't landed yet; keep the optimistic state.
+                return
+            self._pending = None
+        self._state = device.switch
@@ -0,0 +1,210 @@
+"""Sengled Bulb Integration."""
+import asyncio
+import logging
+import time
+from urllib.parse import urlsplit
+
+_LOGGER = logging.getLogger(__name__)
+
+# Endpoint families: every path in a family is served by the same hosts.
+UCENTER = "ucenter"  # login and session checks
+LIFE2 = "life2"  # Wi-Fi device list and MQTT server info
+DETAILS = "details"  # Zigbee device details
+ELEMENTS = "elements"  # Zigbee control
+
+# Candidate hosts per family, best guess first. {country} is the account's.
+# Zigbee control keeps its one host: no other is known to accept commands.
+CANDIDATES = {
+    UCENTER: ("ucenter.cloud.sengled.com",),
+    LIFE2: ("life2.cloud.sengled.com",),
+    DETAILS: (
+        "element.cloud.sengled.com",
+        "{country}-element.cloud.sengled.com",
+    ),
+    ELEMENTS: ("{country}-elements.cloud.sengled.com",),
+}
+# Path requested on each candidate when probing. Only the status is read, so
+# the device list behind the Zigbee details path is never downloaded.
+PROBE_PATHS = {
+    UCENTER: "/user/app/customer/isSessionTimeout.json",
+    LIFE2: "/life2/server/getServerInfo.json",
+    DETAILS: "/zigbee/device/getDeviceDetails.json",
+}
+PROBE_TIMEOUT = 5
+# Consecutive failed requests before a host is failed over.
+FAILOVER_ERRORS = 3
+# A host is degraded once its smoothed latency is this many times its probe.
+DEGRADED_FACTOR = 4
+# ... and at least this many seconds, so fast hosts don't flap.
+DEGRADED_MIN_LATENCY = 1.0
+# Weight of the newest sample in the smoothed latency.
+LATENCY_SMOOTHING = 0.2
+# Failovers don't trigger another probe more often than this.
+REPROBE_INTERVAL = 600
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+class HostStats:
+    def __init__(self, host):
+        self.host = host
+        self.probe_latency = None
+        self.latency = None
+        self.errors = 0
+
+    @property
+    def degraded(self):
+        if self.errors >= FAILOVER_ERRORS:
+            return True
+        if self.latency is None or self.probe_latency is None:
+            return False
+        limit = max(DEGRADED_FACTOR * self.probe_latency, DEGRADED_MIN_LATENCY)
+        return self.latency > limit
+
+    def as_dict(self):
+        return {
+            "probe_ms": _ms(self.probe_latency),
+            "latency_ms": _ms(self.latency),
+            "errors": self.errors,
+        }
+
+
+class EndpointRegistry:
+    """
+    Picks the host every endpoint family is sent to.
+    Families with more than one candidate are probed and ranked by latency;
+    request outcomes are fed back, and a host that keeps failing or slows
+    down is swapped for the next reachable one until the next probe.
+    """
+
+    def __init__(self, country, candidates=CANDIDATES):
+        self._families = {}
+        self._hosts = {}
+        for family, hosts in candidates.items():
+            ranked = []
+            for host in hosts:
+                host = host.format(country=country)
+                if host not in ranked:
+                    ranked.append(host)
+                    self._hosts[host] = family
+            self._families[family] = ranked
+        self._stats = {host: HostStats(host) for host in self._hosts}
+        self._active = {family: hosts[0] for family, hosts in self._families.items()}
+        self.last_probe = None
+
+    def host(self, family):
+        return self._active[family]
+
+    def url(self, family, path):
+        return "https://{}{}".format(self._active[family], path)
+
+    @property
+    def needs_probe(self):
+        return (
+            self.last_probe is None
+            or time.monotonic() - self.last_probe > REPROBE_INTERVAL
+        )
+
+    async def async_probe(self, send):
+        """
+        Time a probe request to every candidate of the families that have a
+        choice and activate the fastest reachable host of each.
+        send -- coroutine function(url) returning True if the host answered
+        """
+        self.last_probe = time.monotonic()
+        probes = [
+            (family, host)
+            for family, hosts in self._families.items()
+            if len(hosts) > 1
+            for host in hosts
+        ]
+        results = await asyncio.gather(
+            *(self._async_probe_host(send, family, host) for family, host in probes)
+        )
+        for (family, host), latency in zip(probes, results):
+            stats = self._stats[host]
+            stats.probe_latency = latency
+            if latency is not None:
+                stats.latency = latency
+                stats.errors = 0
+        for family, hosts in self._families.items():
+            if len(hosts) < 2:
+                continue
+            # Failover walks the candidates in this order.
+            hosts.sort(key=self._probe_rank)
+            best = hosts[0]
+            if self._stats[best].probe_latency is None:
+                # Nothing answered; keep what we have.
+                continue
+            if best != self._active[family]:
+                _LOGGER.info(
+                    "SengledApi: Using %s for %s (%.0f ms)",
+                    best,
+                    family,
+                    self._stats[best].probe_latency * 1000,
+                )
+                self._active[family] = best
+
+    def _probe_rank(self, host):
+        latency = self._stats[host].probe_latency
+        return float("inf") if latency is None else latency
+
+    async def _async_probe_host(self, send, family, host):
+        url = "https://{}{}".format(host, PROBE_PATHS[family])
+        start = time.perf_counter()
+        try:
+            ok = await asyncio.wait_for(send(url), PROBE_TIMEOUT)
+        except Exception as e:
+            _LOGGER.debug("SengledApi: Probe of %s failed: %s", host, e)
+            return None
+        return time.perf_counter() - start if ok else None
+
+    def record(self, url, seconds, error=False):
+        """
+        Feed back a request outcome. Returns True when the host was just
+        failed over, so the caller can schedule a new probe.
+        """
+        host = urlsplit(url).hostname
+        family = self._hosts.get(host)
+        if family is None:
+            return False
+        stats = self._stats[host]
+        if error:
+            stats.errors += 1
+        else:
+            stats.errors = 0
+            if stats.latency is None:
+                stats.latency = seconds
+            else:
+                stats.latency += LATENCY_SMOOTHING * (seconds - stats.latency)
+        if host != self._active[family] or not stats.degraded:
+            return False
+        for candidate in self._families[family]:
+            if candidate == host or not self._usable(candidate):
+                continue
+            _LOGGER.warning(
+                "SengledApi: %s is failing or slow, failing over to %s",
+                host,
+                candidate,
+            )
+            self._active[family] = candidate
+            return True
+        return False
+
+    def _usable(self, host):
+        stats = self._stats[host]
+        if stats.degraded:
+            return False
+        # Once probed, only hosts that answered are failover targets.
+        return self.last_probe is None or stats.probe_latency is not None
+
+    def as_dict(self):
+        return {
+            family: {
+                "active": self._active[family],
+                "hosts": {host: self._stats[host].as_dict() for host in hosts},
+            }
+            for family, hosts in self._families.items()
+        }
@@ -0,0 +1,52 @@
+"""Sengled Bulb Integration."""
+
+# The floodlight with a motion sensor is the only lamp with an alarm status.
+ALARM_MODELS = frozenset(("E13-N11",))
+
+# Health values read from one BulbProperty of the shared device fetch. Each
+# returns None when the device doesn't report the value.
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def rssi(device):
+    """Wi-Fi signal strength in dBm."""
+    if not device.wifi:
+        return None
+    return _int(device.attribute("deviceRssi"))
+
+
+def signal_level(device):
+    """Zigbee signal level, 0-5 bars as the Sengled app shows it."""
+    if device.wifi:
+        return None
+    return _int(device.attribute("deviceRssi"))
+
+
+def online(device):
+    value = device.attribute("online" if device.wifi else "isOnline")
+    return None if value is None else str(value) == "1"
+
+
+def alarm(device):
+    if device.typeCode not in ALARM_MODELS:
+        return None
+    value = device.attribute("alarmStatus")
+    return None if value is None else str(value) != "0"
+
+
+def consumption_time(device):
+    return _int(device.attribute("consumptionTime"))
+
+
+def ip(device):
+    return device.attribute("ip") or None
+
+
+def version(device):
+    return device.attribute("version") or None
@@ -0,0 +1,78 @@
+"""Sengled Bulb Integration."""
+import logging
+import time
+
+# Per-key sampled messages are logged at most once per this many seconds.
+SAMPLE_INTERVAL = 60
+
+_verbose = False
+_saved_level = logging.NOTSET
+
+
+def set_verbose(enabled, logger=None):
+    """
+    Turn the verbose hot-path trace on or off at runtime.
+    While it is on, logger (the library's package logger by default) is
+    raised to DEBUG and sampling is bypassed.
+    """
+    global _verbose, _saved_level
+    enabled = bool(enabled)
+    if logger is None:
+        logger = logging.getLogger(__name__.rpartition(".")[0])
+    if enabled and not _verbose:
+        _saved_level = logger.level
+        logger.setLevel(logging.DEBUG)
+    elif not enabled and _verbose:
+        logger.setLevel(_saved_level)
+    _verbose = enabled
+
+
+def is_verbose():
+    return _verbose
+
+
+class HotPathLogger:
+    """
+    Logging for code that runs per request, per message or per entity poll.
+    Every call is level-gated before any argument is touched, and fields are
+    appended as key=value pairs and attached to the record as `sengled`.
+
+    debug -- a plain DEBUG message
+    trace -- only logged while verbose mode is on
+    sample -- logged at most once per key and interval, with a count of
+              the messages skipped in between
+    """
+
+    def __init__(self, logger):
+        self._logger = logger
+        self._last_sample = {}
+        self._suppressed = {}
+
+    def debug(self, msg, *args, **fields):
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._log(msg, args, fields)
+
+    def trace(self, msg, *args, **fields):
+        if _verbose and self._logger.isEnabledFor(logging.DEBUG):
+            self._log(msg, args, fields)
+
+    def sample(self, key, msg, *args, interval=SAMPLE_INTERVAL, **fields):
+        if not self._logger.isEnabledFor(logging.DEBUG):
+            return
+        now = time.monotonic()
+        last = self._last_sample.get(key)
+        if not _verbose and last is not None and now - last < interval:
+            self._suppressed[key] = self._suppressed.get(key, 0) + 1
+            return
+        self._last_sample[key] = now
+        suppressed = self._suppressed.pop(key, 0)
+        if suppressed:
+            fields["suppressed"] = suppressed
+        self._log(msg, args, fields)
+
+    def _log(self, msg, args, fields):
+        if fields:
+            msg = msg + "".join(" {}=%s".format(name) for name in fields)
+            args = args + tuple(fields.values())
+        # stacklevel points the record at the caller, not this wrapper.
+        self._logger.debug(msg, *args, extra={"sengled": fields}, stacklevel=3)
@@ -0,0 +1,109 @@
+"""Sengled Bulb Integration."""
+import threading
+import time
+from collections import deque
+from urllib.parse import urlparse
+
+# Latency samples kept per endpoint for the percentiles.
+LATENCY_SAMPLES = 500
+# Window for the inbound MQTT message rate, in seconds.
+MESSAGE_RATE_WINDOW = 60
+
+
+def endpoint_name(url):
+    """Short endpoint name for a URL, e.g. 'deviceSetOnOff.json'."""
+    return urlparse(url).path.rsplit("/", 1)[-1] or url
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of samples."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class LatencyStats:
+    """Call count, error count and recent latencies for one operation."""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.samples = deque(maxlen=LATENCY_SAMPLES)
+
+    def record(self, seconds, error=False):
+        self.count += 1
+        if error:
+            self.errors += 1
+        self.samples.append(seconds)
+
+    def percentile_ms(self, pct):
+        value = percentile(list(self.samples), pct)
+        return None if value is None else round(value * 1000, 1)
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "p50_ms": self.percentile_ms(50),
+            "p95_ms": self.percentile_ms(95),
+            "p99_ms": self.percentile_ms(99),
+        }
+
+
+class Metrics:
+    """Request, MQTT publish and inbound message statistics for one account."""
+
+    def __init__(self):
+        self.endpoints = {}
+        self.requests = LatencyStats()
+        self.mqtt_publish = LatencyStats()
+        self.mqtt_messages = 0
+        self._message_times = deque()
+        # Messages are recorded on the MQTT thread and counted on the loop.
+        self._message_lock = threading.Lock()
+
+    def record_request(self, url, seconds, error=False):
+        name = endpoint_name(url)
+        stats = self.endpoints.get(name)
+        if stats is None:
+            stats = self.endpoints[name] = LatencyStats()
+        stats.record(seconds, error)
+        self.requests.record(seconds, error)
+
+    def record_publish(self, seconds, error=False):
+        self.mqtt_publish.record(seconds, error)
+
+    def record_message(self):
+        """Count an inbound message; called from the MQTT network thread."""
+        now = time.monotonic()
+        with self._message_lock:
+            self.mqtt_messages += 1
+            self._message_times.append(now)
+            # Pruned on every append, so the deque only holds the window even
+            # when nothing reads the rate.
+            self._prune_messages(now)
+
+    def message_rate(self):
+        """Inbound MQTT messages per minute over the last window."""
+        with self._message_lock:
+            self._prune_messages(time.monotonic())
+            count = len(self._message_times)
+        return round(count * 60 / MESSAGE_RATE_WINDOW, 1)
+
+    def _prune_messages(self, now):
+        cutoff = now - MESSAGE_RATE_WINDOW
+        while self._message_times and self._message_times[0] < cutoff:
+            self._message_times.popleft()
+
+    def as_dict(self):
+        return {
+            "requests": self.requests.as_dict(),
+            "endpoints": {
+                name: stats.as_dict() for name, stats in sorted(self.endpoints.items())
+            },
+            "mqtt_publish": self.mqtt_publish.as_dict(),
+            "mqtt_messages": self.mqtt_messages,
+            "mqtt_messages_per_minute": self.message_rate(),
+        }
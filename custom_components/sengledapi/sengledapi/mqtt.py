@@ -0,0 +1,36 @@
+"""Sengled Bulb Integration."""
+import concurrent.futures
+import ssl
+
+import paho.mqtt.client as mqtt
+
+
+def create_ssl_context():
+    context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
+    context.load_default_certs(ssl.Purpose.SERVER_AUTH)
+    return context
+
+
+def create_client(session, on_message):
+    """
+    Build the websocket MQTT client for a logged in session.
+    This module is only imported once a Wi-Fi account needs MQTT.
+    """
+    client = mqtt.Client(
+        client_id="{}@lifeApp".format(session.jsession_id), transport="websockets"
+    )
+
+    # Run the blocking operation in a separate thread
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        ssl_context = executor.submit(create_ssl_context).result()
+        client.tls_set_context(ssl_context)
+
+    client.ws_set_options(
+        path=session.mqtt_server["path"],
+        headers={
+            "Cookie": "JSESSIONID={}".format(session.jsession_id),
+            "X-Requested-With": "com.sengled.life2",
+        },
+    )
+    client.on_message = on_message
+    return client
@@ -0,0 +1,122 @@
+"""Sengled Bulb Integration."""
+import cProfile
+import io
+import os
+import pstats
+import re
+import sys
+import threading
+from collections import Counter
+
+# The integration's directory; only frames from files under it are reported.
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Seconds between stack samples.
+SAMPLE_INTERVAL = 0.01
+TOP = 20
+
+
+def in_package(filename):
+    return filename.startswith(PACKAGE_DIR)
+
+
+def describe(code):
+    filename = code.co_filename
+    if in_package(filename):
+        filename = os.path.relpath(filename, PACKAGE_DIR)
+    return "{} ({}:{})".format(code.co_name, filename, code.co_firstlineno)
+
+
+class CallProfiler:
+    """
+    cProfile on the thread that starts it, normally the event loop.
+    Everything on that thread is profiled; the summary is restricted to the
+    integration's files and the .prof file keeps the full picture.
+    """
+
+    extension = "prof"
+
+    def __init__(self):
+        self._profile = cProfile.Profile()
+
+    def start(self):
+        # ValueError if another profiler is already active.
+        self._profile.enable()
+
+    def stop(self):
+        self._profile.disable()
+
+    def write(self, path, top=TOP):
+        """Write the profile to path and return the top-N summary."""
+        self._profile.dump_stats(path)
+        out = io.StringIO()
+        stats = pstats.Stats(self._profile, stream=out)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE)
+        stats.print_stats(re.escape(PACKAGE_DIR), top)
+        return out.getvalue()
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of every thread from a background thread, keeping
+    those that run integration code. Cheap enough to leave on for minutes,
+    and it sees the MQTT thread as well as the event loop. Coroutines
+    suspended on I/O are not on any stack, so this measures CPU, not waits.
+    """
+
+    extension = "txt"
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self._interval = interval
+        self._stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+        self.samples = 0
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run, name="sengledapi profiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self._interval):
+            self.samples += 1
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
+                if any(in_package(code.co_filename) for code in stack):
+                    self._stacks[tuple(reversed(stack))] += 1
+
+    def write(self, path, top=TOP):
+        """
+        Write collapsed stacks (flamegraph.pl and speedscope read them) to
+        path and return the integration functions seen in the most samples.
+        """
+        inclusive = Counter()
+        for stack, count in self._stacks.items():
+            for code in set(stack):
+                if in_package(code.co_filename):
+                    inclusive[code] += count
+        with open(path, "w", encoding="utf-8") as out:
+            for stack, count in self._stacks.most_common():
+                out.write("{} {}\n".format(";".join(map(describe, stack)), count))
+        lines = [
+            "{} samples, {} with integration code".format(
+                self.samples, sum(self._stacks.values())
+            )
+        ]
+        for code, count in inclusive.most_common(top):
+            share = 100 * count / self.samples if self.samples else 0
+            lines.append("{:6} {:5.1f}%  {}".format(count, share, describe(code)))
+        return "\n".join(lines)
@@ -0,0 +1,111 @@
+"""Sengled Bulb Integration."""
+import asyncio
+import logging
+import time
+from collections import deque
+
+_LOGGER = logging.getLogger(__name__)
+
+# Publishes awaiting the broker at once; later ones queue in order.
+MQTT_WINDOW = 16
+# QoS for bulb commands that have no setting of their own.
+DEFAULT_QOS = 1
+# Seconds to wait for the broker before a publish counts as failed.
+PUBLISH_TIMEOUT = 10
+
+
+class MqttPublisher:
+    """
+    Pipelines MQTT publishes without blocking the event loop.
+    Up to `window` publishes are outstanding at once and the rest wait their
+    turn. Every publish returns a future that resolves to True once the
+    broker has the message (PUBACK for QoS 1 and 2, written out for QoS 0)
+    and to False if it could not be sent or timed out.
+    """
+
+    def __init__(self, metrics, window=MQTT_WINDOW, timeout=PUBLISH_TIMEOUT):
+        self._metrics = metrics
+        self._window = window
+        self._timeout = timeout
+        self._client = None
+        self._loop = None
+        # mid -> (future, start, timeout handle)
+        self._in_flight = {}
+        self._waiting = deque()
+
+    def attach(self, client):
+        """Publish through client; it reports completions via on_publish."""
+        self._client = client
+        client.on_publish = self._on_publish
+
+    def publish(self, topic, payload, qos):
+        """Queue a publish and return its completion future."""
+        self._loop = asyncio.get_running_loop()
+        future = self._loop.create_future()
+        if self._client is None:
+            future.set_result(False)
+            return future
+        self._waiting.append((topic, payload, qos, future, time.perf_counter()))
+        self._pump()
+        return future
+
+    def _pump(self):
+        while self._waiting and len(self._in_flight) < self._window:
+            self._send(*self._waiting.popleft())
+
+    def _send(self, topic, payload, qos, future, start):
+        if future.done():
+            return
+        try:
+            info = self._client.publish(topic, payload=payload, qos=qos)
+        except ValueError as e:
+            _LOGGER.warning("SengledApi: Could not publish to %s: %s", topic, e)
+            self._finish(future, start, False)
+            return
+        # QoS 0 is dropped when not connected; QoS 1 and 2 are resent by paho.
+        if info.rc != 0 and qos == 0:
+            self._finish(future, start, False)
+            return
+        timer = self._loop.call_later(self._timeout, self._complete, info.mid, False)
+        self._in_flight[info.mid] = (future, start, timer)
+
+    def _on_publish(self, client, userdata, mid, *args):
+        # paho's network thread, or the publishing thread for QoS 0.
+        try:
+            self._loop.call_soon_threadsafe(self._complete, mid, True)
+        except RuntimeError:
+            # The event loop is gone; nobody is waiting any more.
+            pass
+
+    def _complete(self, mid, published):
+        entry = self._in_flight.pop(mid, None)
+        if entry is None:
+            return
+        future, start, timer = entry
+        timer.cancel()
+        if not published:
+            _LOGGER.warning("SengledApi: MQTT publish %s timed out", mid)
+        self._finish(future, start, published)
+        self._pump()
+
+    def _finish(self, future, start, published):
+        self._metrics.record_publish(time.perf_counter() - start, not published)
+        if not future.done():
+            future.set_result(published)
+
+    def close(self):
+        """Fail everything still waiting or in flight."""
+        for future, start, timer in self._in_flight.values():
+            timer.cancel()
+            self._finish(future, start, False)
+        self._in_flight = {}
+        while self._waiting:
+            _, _, _, future, start = self._waiting.popleft()
+            self._finish(future, start, False)
+
+    def as_dict(self):
+        return {
+            "window": self._window,
+            "in_flight": len(self._in_flight),
+            "waiting": len(self._waiting),
+        }
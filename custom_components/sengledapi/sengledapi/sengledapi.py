@@ -1,21 +1,51 @@
 #!/usr/bin/python3
 """Sengled Bulb Integration."""
-import json
+import asyncio
+import functools
 import logging
 import time
+from collections import deque
 from urllib.parse import urlparse
 from uuid import uuid4
 
-import paho.mqtt.client as mqtt
-import requests
-
+from .cache import TtlCache
+from .control import ControlSelector
+from .coordinator import DeviceCoordinator, backoff_delay
+from .endpoints import DETAILS, ELEMENTS, LIFE2, UCENTER, EndpointRegistry
+from .log import HotPathLogger
+from .metrics import Metrics, endpoint_name
+from .publisher import DEFAULT_QOS, MQTT_WINDOW, MqttPublisher
+from .tracing import CommandTracer
+from .transitions import RATE_BUDGET, TransitionScheduler
 from .devices.bulbs.bulb import Bulb
 from .devices.bulbs.bulbproperty import BulbProperty
-from .devices.exceptions import SengledApiAccessToken
+from .devices.bulbs.const import GET_DETAILS, GET_WIFI_DETAILS, SET_GROUP
+from .devices.exceptions import SengledApiAccessToken, SengledApiError
 from .devices.request import Request
-from .devices.switch import Switch
+from .devices.switch import Switch, is_switch
 
 _LOGGER = logging.getLogger(__name__)
+_HOT = HotPathLogger(_LOGGER)
+
+# Upper bound on control requests in flight at once.
+MAX_CONCURRENT_REQUESTS = 8
+# How long async_shutdown waits for in-flight requests before cancelling them.
+SHUTDOWN_TIMEOUT = 10
+
+# What to do with control requests issued while the cloud is unreachable.
+OFFLINE_REPLAY = "replay"
+OFFLINE_DISCARD = "discard"
+OFFLINE_POLICIES = (OFFLINE_REPLAY, OFFLINE_DISCARD)
+# Queued commands older than this are dropped instead of replayed.
+OFFLINE_COMMAND_MAX_AGE = 300
+# Seconds a removed device stays, unavailable, in case it comes back.
+REMOVED_DEVICE_GRACE = 3600
+
+# How long a session check and the MQTT server info are reused.
+SESSION_CHECK_TTL = 300
+SERVER_INFO_TTL = 6 * 3600
+# Cache keys tied to the current jsessionId.
+SESSION_KEYS = ("session_check",)
 
 
 class SengledSession:
@@ -41,12 +71,88 @@ SESSION = SengledSession()
 
 
 class SengledApi:
-    def __init__(self, user_name, password, country, wifi):
+    def __init__(
+        self,
+        user_name,
+        password,
+        country,
+        wifi,
+        offline_commands=OFFLINE_REPLAY,
+        base_url=None,
+        mqtt_factory=None,
+        transport=None,
+        mqtt_qos=None,
+        mqtt_window=MQTT_WINDOW,
+        transition_rate=RATE_BUDGET,
+        wifi_http_fallback=False,
+    ):
+        """
+        base_url -- send every request to this server instead of the Sengled
+                    cloud, e.g. "http://127.0.0.1:8080" for tools/fake_cloud.py
+        mqtt_factory -- callable(session, on_message) returning an MQTT client,
+                        used instead of the paho websocket client
+        transport -- sends HTTP requests instead of HttpTransport, e.g. a
+                     capture.Recorder or capture.Replayer
+        mqtt_qos -- {command: QoS} for Wi-Fi bulb commands ("state",
+                    "brightness", "color_temperature", "color", "default")
+        mqtt_window -- MQTT publishes awaiting the broker at once
+        transition_rate -- control requests per second transitions may send
+        wifi_http_fallback -- send Wi-Fi bulb commands over HTTP while MQTT is
+                              down or unhealthy
+        """
         _LOGGER.info("Sengled Api initializing.")
         SESSION.username = user_name
         SESSION.password = password
         SESSION.countryCode = country
         SESSION.wifi = wifi
+        self._tasks = set()
+        self._request_semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+        self.task_failures = 0
+        self._coordinator = DeviceCoordinator(self)
+        self._bulbs = {}
+        self._switches = {}
+        # uuid -> monotonic time the device disappeared from the account
+        self._removed = {}
+        # Set once login and the first device fetch have succeeded.
+        self.started = False
+        self._offline_policy = offline_commands
+        self._offline_commands = {}
+        self.metrics = Metrics()
+        self.tracer = CommandTracer()
+        self.cache = TtlCache()
+        self.mqtt_qos = dict(mqtt_qos or {})
+        self.publisher = MqttPublisher(self.metrics, mqtt_window)
+        self.control = ControlSelector(http_fallback=wifi_http_fallback)
+        self.transitions = TransitionScheduler(self, transition_rate)
+        # MQTT messages handed from paho's thread to the event loop.
+        self._inbox = deque()
+        self._drain_scheduled = False
+        self._loop = None
+        self.endpoints = EndpointRegistry(country)
+        self._base_url = base_url.rstrip("/") if base_url else None
+        self._mqtt_factory = mqtt_factory
+        self._transport = transport
+
+    def endpoint(self, family, path):
+        """URL for path on the endpoint family's current host."""
+        if self._base_url is not None:
+            return self._base_url + path
+        return self.endpoints.url(family, path)
+
+    async def async_probe_endpoints(self):
+        """Pick the fastest reachable host for each endpoint family."""
+        if self._base_url is not None:
+            return
+        await self.endpoints.async_probe(self._async_probe_url)
+
+    async def _async_probe_url(self, url):
+        status = await self._request(url, {}).async_get_status(SESSION.jsession_id)
+        return status == 200
+
+    def _record_request(self, url, seconds, error=False):
+        self.metrics.record_request(url, seconds, error)
+        if self.endpoints.record(url, seconds, error) and self.endpoints.needs_probe:
+            self.async_create_task(self.async_probe_endpoints())
 
     async def async_init(self):
         _LOGGER.info("Sengled Api initializing async.")
@@ -54,6 +160,43 @@ class SengledApi:
             SESSION.username, SESSION.password, SESSION.device_id
         )
 
+    async def async_start(self):
+        """
+        Log in and make the first device fetch.
+        While the cloud is unreachable both are retried with the device
+        fetch backoff, so an outage at boot delays discovery instead of
+        ending it. Returns False only when the login is rejected.
+        """
+        failures = 0
+        while True:
+            try:
+                await self.async_init()
+                if not self.is_valid_login():
+                    return False
+                await self._coordinator.async_refresh(force=True)
+            except Exception as e:
+                failures += 1
+                delay = backoff_delay(failures)
+                _LOGGER.warning(
+                    "SengledApi: Sengled cloud unreachable at startup (%s), "
+                    "retrying in %s seconds",
+                    e,
+                    delay,
+                )
+                await asyncio.sleep(delay)
+                continue
+            self.started = True
+            # Bulbs restored from a stored inventory take the cloud's state.
+            inventory = self._coordinator.inventory()
+            for uuid, bulb in self._bulbs.items():
+                if uuid in inventory:
+                    bulb.update_property(*inventory[uuid])
+                    # Made before MQTT was up, so not subscribed yet.
+                    bulb.subscribe_status()
+                    bulb._schedule_attribute_update()
+            await self.async_replay_offline_commands()
+            return True
+
     async def async_login(self, username, password, device_id):
         """
         Log user into server.
@@ -61,11 +204,12 @@ class SengledApi:
         """
         _LOGGER.info("Sengledapi: Login")
 
-        if SESSION.jsession_id:
+        # A valid session is reused, unless MQTT setup failed after it was made.
+        if SESSION.jsession_id and (SESSION.mqtt_client or not SESSION.wifi):
             if not await self.async_is_session_timeout():
                 return
 
-        url = "https://ucenter.cloud.sengled.com/user/app/customer/v2/AuthenCross.json"
+        url = self.endpoint(UCENTER, "/user/app/customer/v2/AuthenCross.json")
         payload = {
             "uuid": SESSION.device_id,
             "user": SESSION.username,
@@ -77,13 +221,21 @@ class SengledApi:
 
         data = await self.async_do_login_request(url, payload)
 
-        _LOGGER.debug("SengledApi Login %s", str(data))
+        _LOGGER.debug("SengledApi Login %s", data)
 
-        if "jsessionId" not in data or not data["jsessionId"]:
+        if data is None:
+            # The cloud didn't answer; async_start retries with backoff.
+            raise SengledApiError("Login request failed")
+        if not data.get("jsessionId"):
             return False
 
+        if data["jsessionId"] != SESSION.jsession_id:
+            self.cache.invalidate(*SESSION_KEYS)
         SESSION.jsession_id = data["jsessionId"]
 
+        if self.endpoints.needs_probe:
+            await self.async_probe_endpoints()
+
         if SESSION.wifi:
             await self.async_get_server_info()
 
@@ -95,7 +247,7 @@ class SengledApi:
         return True
 
     def is_valid_login(self):
-        if SESSION.jsession_id is None:
+        if not SESSION.jsession_id:
             return False
         return True
 
@@ -104,12 +256,19 @@ class SengledApi:
         Determine whether or not the session has timed out.
         Returns True if timed out, False otherwise.
         """
-        _LOGGER.info("SengledApi: Session Timeout")
+        _LOGGER.debug("SengledApi: Session Timeout")
 
         if not SESSION.jsession_id:
             return True
 
-        url = "https://ucenter.cloud.sengled.com/user/app/customer/isSessionTimeout.json"  # noqa
+        valid = await self.cache.async_get(
+            "session_check", self._async_check_session, SESSION_CHECK_TTL
+        )
+        return not valid
+
+    async def _async_check_session(self):
+        """True if the session is still valid, None otherwise."""
+        url = self.endpoint(UCENTER, "/user/app/customer/isSessionTimeout.json")
         payload = {
             "uuid": SESSION.device_id,
             "os_type": "android",
@@ -118,28 +277,24 @@ class SengledApi:
 
         data = await self.async_do_is_session_timeout_request(url, payload)
 
-        _LOGGER.debug("SengledApi: async_is_session_timeout " + str(data))
+        _LOGGER.debug("SengledApi: async_is_session_timeout %s", data)
 
-        if "info" not in data or data["info"] != "OK":
-            return True
+        if not data or data.get("info") != "OK":
+            return None
 
-        return False
+        return True
 
     async def async_get_server_info(self):
         """Get secondary server info from the primary."""
         if not SESSION.jsession_id:
             return
-        url = "https://life2.cloud.sengled.com/life2/server/getServerInfo.json"
-        payload = {}
-
-        data = await self.async_do_request(url, payload, SESSION.jsession_id)
-
-        _LOGGER.debug("SengledApi: Get MQTT Server Info" + str(data))
-
-        if "inceptionAddr" not in data or not data["inceptionAddr"]:
+        address = await self.cache.async_get(
+            "server_info", self._async_fetch_server_info, SERVER_INFO_TTL
+        )
+        if not address:
             return
 
-        url = urlparse(data["inceptionAddr"])
+        url = urlparse(address)
         if ":" in url.netloc:
             SESSION.mqtt_server["host"] = url.netloc.split(":")[0]
             SESSION.mqtt_server["port"] = int(url.netloc.split(":")[1], 10)
@@ -148,167 +303,438 @@ class SengledApi:
             SESSION.mqtt_server["host"] = url.netloc
             SESSION.mqtt_server["port"] = 443
             SESSION.mqtt_server["path"] = url.path
-        _LOGGER.debug("SengledApi: Parse MQTT Server Info" + str(url))
+        _LOGGER.debug("SengledApi: Parse MQTT Server Info %s", url)
+
+    async def _async_fetch_server_info(self):
+        """Return the MQTT server's address, or None."""
+        url = self.endpoint(LIFE2, "/life2/server/getServerInfo.json")
+        payload = {}
+
+        data = await self.async_do_request(url, payload, SESSION.jsession_id)
+
+        _LOGGER.debug("SengledApi: Get MQTT Server Info %s", data)
+
+        if not data or not data.get("inceptionAddr"):
+            return None
+        return data["inceptionAddr"]
 
     async def async_get_wifi_devices(self):
         """
         Get list of Wifi connected devices.
         """
-        if not SESSION.wifi_devices:
-            url = "https://life2.cloud.sengled.com/life2/device/list.json"
-            payload = {}
-            data = await self.async_do_request(url, payload, SESSION.jsession_id)
-            if "deviceList" not in data or not data["deviceList"]:
-                return SESSION.wifi_devices
-            for devices in data["deviceList"]:
-                found = False
-
-                for dev in SESSION.wifi_devices:
-                    if dev.uuid == devices["deviceUuid"]:
-                        found = True
-                        break
-                if not found:
-                    _LOGGER.debug("SengledApi: Get Wifi Mqtt Devices %s", devices)
-                    SESSION.wifi_devices.append(BulbProperty(self, devices, True))
+        await self._coordinator.async_refresh()
+        SESSION.wifi_devices = self._coordinator.wifi_devices
         return SESSION.wifi_devices
 
     async def async_get_devices(self):
         _LOGGER.debug("SengledApi: Get Devices.")
-        if not SESSION.devices:
-            url = (
-                "https://element.cloud.sengled.com/zigbee/device/getDeviceDetails.json"
-            )
-            payload = {}
-            data = await self.async_do_request(url, payload, SESSION.jsession_id)
-            for d in data["deviceInfos"]:
-                for devices in d["lampInfos"]:
-                    SESSION.devices.append(BulbProperty(self, devices, False))
+        await self._coordinator.async_refresh()
+        SESSION.devices = self._coordinator.devices
         return SESSION.devices
 
+    async def async_get_device(self, uuid, max_age=None):
+        """
+        Return (BulbProperty, wifi) for one device from the shared fetch,
+        or None if the account no longer has it.
+        max_age -- reuse a fetch up to this many seconds old
+        """
+        if not self.started:
+            # Restored bulbs poll before login; there is nothing to fetch yet.
+            return None
+        await self._coordinator.async_refresh(max_age=max_age)
+        return self._coordinator.get(uuid)
+
+    def device(self, uuid):
+        """(BulbProperty, wifi) from the last fetch, without fetching."""
+        return self._coordinator.get(uuid)
+
+    def inventory(self):
+        """{uuid: (BulbProperty, wifi)} from the last fetch, without fetching."""
+        return self._coordinator.inventory()
+
+    def device_snapshot(self):
+        """The last fetch's device list, as JSON data for restore_devices."""
+        return [
+            {"wifi": wifi, "info": device.info}
+            for device, wifi in self._coordinator.inventory().values()
+        ]
+
+    def restore_devices(self, snapshot):
+        """
+        Create bulbs from a device_snapshot() saved by an earlier run, so
+        lights are usable before login. Until async_start() succeeds they
+        are flagged stale and their commands wait in the offline queue.
+        """
+        bulbs = []
+        for entry in snapshot:
+            device = BulbProperty(self, entry["info"], entry["wifi"])
+            if device.uuid in self._bulbs or is_switch(device):
+                continue
+            bulb = self.create_bulb(device, entry["wifi"])
+            # Home Assistant's last state is newer than the stored payload.
+            bulb._seeded = False
+            bulb._stale = True
+            bulbs.append(bulb)
+        _LOGGER.info("SengledApi: Restored %s bulbs from storage", len(bulbs))
+        return bulbs
+
+    def known_bulbs(self):
+        """Bulbs created so far, without fetching."""
+        return [
+            bulb for uuid, bulb in self._bulbs.items() if uuid not in self._removed
+        ]
+
+    def add_listener(self, listener):
+        """
+        Call listener() after every successful shared device fetch.
+        Returns a function that removes it.
+        """
+        return self._coordinator.add_listener(listener)
+
+    async def async_fetch_wifi_devices(self):
+        """Fetch the Wi-Fi device list from the cloud."""
+        if not SESSION.wifi:
+            return []
+        url = self.endpoint(LIFE2, GET_WIFI_DETAILS)
+        payload = {}
+        data = await self.async_do_request(url, payload, SESSION.jsession_id)
+        if data is None:
+            raise SengledApiError("No response for the Wi-Fi device list")
+        devices = []
+        for device in data.get("deviceList") or []:
+            _HOT.trace("SengledApi: Get Wifi Mqtt Devices %s", device)
+            devices.append(BulbProperty(self, device, True))
+        return devices
+
+    async def async_fetch_devices(self):
+        """Fetch the Zigbee device list from the cloud."""
+        url = self.endpoint(DETAILS, GET_DETAILS)
+        payload = {}
+        return [
+            BulbProperty(self, info, False)
+            async for uuid, info in self.async_iter_devices(url, payload)
+        ]
+
+    async def async_rediscover(self):
+        """
+        Diff the device inventory against the bulbs already created.
+        Uses the last poll's fetch when there is one. Returns the new bulbs,
+        the bulbs that disappeared from the account, and the uuids of bulbs
+        gone for REMOVED_DEVICE_GRACE, which are forgotten.
+        """
+        if not self._coordinator.has_data:
+            await self._coordinator.async_refresh()
+        inventory = self._coordinator.inventory()
+        added = []
+        for uuid, (device, wifi) in inventory.items():
+            if uuid in self._bulbs or is_switch(device):
+                continue
+            _LOGGER.info("SengledApi: Discovered new device %s", uuid)
+            added.append(self.create_bulb(device, wifi))
+        removed = []
+        dropped = []
+        now = time.monotonic()
+        for uuid, bulb in list(self._bulbs.items()):
+            if uuid in inventory:
+                if self._removed.pop(uuid, None) is not None:
+                    _LOGGER.info("SengledApi: Device %s is back", uuid)
+                    bulb.subscribe_status()
+                continue
+            removed_at = self._removed.get(uuid)
+            if removed_at is None:
+                _LOGGER.info("SengledApi: Device %s was removed", uuid)
+                self._removed[uuid] = now
+                bulb._available = False
+                # Don't hold a broker subscription for a bulb that is gone.
+                bulb.unsubscribe_status()
+                self.control.forget(uuid)
+                self.transitions.cancel(bulb)
+                removed.append(bulb)
+            elif now - removed_at >= REMOVED_DEVICE_GRACE:
+                _LOGGER.info("SengledApi: Forgetting removed device %s", uuid)
+                del self._removed[uuid]
+                del self._bulbs[uuid]
+                dropped.append(uuid)
+        return added, removed, dropped
+
+    async def async_iter_devices(self, url, payload):
+        """Stream (uuid, info) pairs for each lamp in a getDeviceDetails response."""
+        start = time.perf_counter()
+        try:
+            async for uuid, info in self._request(url, payload).async_iter_lamp_infos(
+                SESSION.jsession_id
+            ):
+                yield uuid, info
+        except Exception as e:
+            self._record_request(url, time.perf_counter() - start, True)
+            if isinstance(e, SengledApiAccessToken):
+                self.cache.invalidate()
+            _LOGGER.error("Error in async_iter_devices: %s", e)
+            raise
+        self._record_request(url, time.perf_counter() - start)
+
     async def discover_devices(self):
         _LOGGER.info("SengledApi: List All Bulbs.")
         bulbs = []
         for device in await self.async_get_devices():
-            bulbs.append(
-                Bulb(
-                    self,
-                    device.uuid,
-                    device.name,
-                    device.switch,
-                    device.typeCode,
-                    device.isOnline,
-                    device.support_color,
-                    device.support_color_temp,
-                    device.support_brightness,
-                    SESSION.jsession_id,
-                    SESSION.countryCode,
-                    False,
-                )
-            )
+            if is_switch(device):
+                # Smart plugs belong to the switch platform.
+                continue
+            bulbs.append(self.create_bulb(device, False))
         if SESSION.wifi:
             for device in await self.async_get_wifi_devices():
-                bulbs.append(
-                    Bulb(
-                        self,
-                        device.uuid,
-                        device.name,
-                        device.switch,
-                        device.typeCode,
-                        device.isOnline,
-                        device.support_color,
-                        device.support_color_temp,
-                        device.support_brightness,
-                        SESSION.jsession_id,
-                        SESSION.countryCode,
-                        True,
-                    )
-                )
+                bulbs.append(self.create_bulb(device, True))
         return bulbs
 
+    def create_bulb(self, device, wifi):
+        """Build a Bulb and seed its state from the discovery payload."""
+        bulb = Bulb(
+            self,
+            device.uuid,
+            device.name,
+            device.switch,
+            device.typeCode,
+            device.isOnline,
+            device.support_color,
+            device.support_color_temp,
+            device.support_brightness,
+            SESSION.jsession_id,
+            SESSION.countryCode,
+            wifi,
+        )
+        bulb._hub = device.hub
+        self._bulbs[device.uuid] = bulb
+        try:
+            if wifi:
+                bulb.update_wifi_property(device)
+            else:
+                bulb.update_zigbee_property(device)
+        except (TypeError, ValueError) as e:
+            _LOGGER.debug("SengledApi: Could not seed bulb %s: %s", device.uuid, e)
+        return bulb
+
     async def async_list_switch(self):
+        """
+        Return a Switch for every smart plug in the shared device fetch.
+        Each one is refreshed from every later fetch at no extra cost.
+        """
         _LOGGER.info("Sengled Api listing switches.")
-        switch = []
-        for device in await self.async_get_devices():
-            _LOGGER.debug(device)
-            if "lampInfos" in device:
-                for switch in device["lampInfos"]:
-                    if switch["attributes"]["productCode"] == "E1E-G7F":
-                        switch.append(
-                            Switch(
-                                self,
-                                device["deviceUuid"],
-                                device["attributes"]["name"],
-                                ("on" if device["attributes"]["onoff"] == 1 else "off"),
-                                device["attributes"]["productCode"],
-                                self._access_token,
-                                SESSION.countryCode,
-                            )
-                        )
-        return switch
+        await self.async_get_devices()
+        return self.switches()
+
+    def switches(self):
+        """
+        Return a Switch for every smart plug in the last shared fetch,
+        without fetching. Plugs that joined since the last call get one.
+        """
+        switches = []
+        for device, _wifi in self._coordinator.inventory().values():
+            if not is_switch(device):
+                continue
+            switch = self._switches.get(device.uuid)
+            if switch is None:
+                switch = Switch(self, device, SESSION.jsession_id)
+                self._switches[device.uuid] = switch
+                self._coordinator.add_listener(switch.refresh)
+            switches.append(switch)
+        return switches
+
+    @property
+    def online(self):
+        """False while the cloud is unreachable and cached state is served."""
+        return self.started and self._coordinator.online
+
+    def diagnostics(self):
+        """Request, MQTT and cache statistics, for a diagnostics dump."""
+        return {
+            "online": self.online,
+            "pending_tasks": self.pending_tasks,
+            "task_failures": self.task_failures,
+            "metrics": self.metrics.as_dict(),
+            "cache": self.cache.as_dict(),
+            "mqtt_publisher": self.publisher.as_dict(),
+            "mqtt_control": self.control.as_dict(),
+            "transitions": self.transitions.as_dict(),
+            "endpoints": self.endpoints.as_dict(),
+            "command_traces": self.tracer.as_dict(),
+        }
+
+    def device_last_updated(self, uuid):
+        """Wall-clock time a device was last seen in a successful fetch."""
+        return self._coordinator.last_updated(uuid)
+
+    def async_schedule_request(self, url, payload, jsessionId):
+        """
+        Send a control request in the background.
+        Returns a task, or while offline a future that resolves once the
+        queued request is replayed or dropped.
+        """
+        if not self.online:
+            return self._queue_offline_command(url, payload)
+        # Devices may hold the session they were created with; use the current one.
+        return self.async_create_task(
+            self.async_do_request(url, payload, SESSION.jsession_id or jsessionId)
+        )
+
+    def set_group_color(self, bulbs, color):
+        """
+        Set one color on several Zigbee bulbs with a single group request.
+        Returns the endpoint's metrics name.
+        """
+        url = self.endpoint(ELEMENTS, SET_GROUP)
+        payload = {
+            "cmdId": 129,
+            "deviceUuidList": [{"deviceUuid": bulb._device_mac} for bulb in bulbs],
+            "rgbColorR": int(color[0]),
+            "rgbColorG": int(color[1]),
+            "rgbColorB": int(color[2]),
+        }
+        pending = [(bulb, bulb._begin_group_color(color)) for bulb in bulbs]
+        task = self.async_schedule_request(url, payload, SESSION.jsession_id)
+        for bulb, command in pending:
+            task.add_done_callback(
+                functools.partial(bulb._request_done, "color", command)
+            )
+        return endpoint_name(url)
+
+    def _queue_offline_command(self, url, payload):
+        future = asyncio.get_running_loop().create_future()
+        if self._offline_policy == OFFLINE_DISCARD:
+            _LOGGER.info("SengledApi: Offline, discarding command to %s", url)
+            future.set_result(None)
+            return future
+        key = (url, str(payload.get("deviceUuid", payload.get("deviceUuidList"))))
+        superseded = self._offline_commands.pop(key, None)
+        if superseded is not None and not superseded[2].done():
+            superseded[2].set_result(None)
+        _LOGGER.info("SengledApi: Offline, queueing command to %s", url)
+        self._offline_commands[key] = (time.monotonic(), payload, future)
+        return future
+
+    async def async_replay_offline_commands(self):
+        """Replay or drop the commands queued while the cloud was unreachable."""
+        commands, self._offline_commands = self._offline_commands, {}
+        now = time.monotonic()
+        for (url, _), (queued_at, payload, future) in commands.items():
+            if future.done():
+                continue
+            if now - queued_at > OFFLINE_COMMAND_MAX_AGE:
+                _LOGGER.info("SengledApi: Dropping stale queued command to %s", url)
+                future.set_result(None)
+                continue
+            _LOGGER.info("SengledApi: Replaying queued command to %s", url)
+            task = self.async_create_task(
+                self.async_do_request(url, payload, SESSION.jsession_id)
+            )
+            task.add_done_callback(
+                lambda task, future=future: future.done()
+                or future.set_result(None if task.cancelled() else task.result())
+            )
+
+    def async_create_task(self, coro):
+        """
+        Run coro as a tracked background task.
+        At most MAX_CONCURRENT_REQUESTS run at once, failures are logged and
+        counted, and async_shutdown drains whatever is left.
+        """
+        task = asyncio.get_running_loop().create_task(self._async_supervise(coro))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _async_supervise(self, coro):
+        try:
+            async with self._request_semaphore:
+                return await coro
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.task_failures += 1
+            _LOGGER.error("SengledApi: Background request failed: %s", e)
+            return None
+        finally:
+            # Cancelled while waiting on the semaphore: never started.
+            coro.close()
+
+    @property
+    def pending_tasks(self):
+        return len(self._tasks)
+
+    async def async_shutdown(self, timeout=SHUTDOWN_TIMEOUT):
+        """Wait for in-flight requests, then cancel whatever is still running."""
+        _LOGGER.info("SengledApi: Shutting down, %s tasks pending", len(self._tasks))
+        self.transitions.cancel_all()
+        self.publisher.close()
+        for _, _, future in self._offline_commands.values():
+            if not future.done():
+                future.set_result(None)
+        self._offline_commands = {}
+        if not self._tasks:
+            return
+        done, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def _request(self, url, payload):
+        return Request(url, payload, transport=self._transport)
 
     async def async_do_request(self, url, payload, jsessionId):
+        start = time.perf_counter()
         try:
-            return await Request(url, payload).async_get_response(jsessionId)
+            data = await self._request(url, payload).async_get_response(jsessionId)
         except Exception as e:
+            self._record_request(url, time.perf_counter() - start, True)
+            if isinstance(e, SengledApiAccessToken):
+                # The session was rejected; nothing cached from it holds.
+                self.cache.invalidate()
             _LOGGER.error("Error in async_do_request: %s", e)
             raise
+        self._record_request(url, time.perf_counter() - start, data is None)
+        return data
 
     async def async_do_login_request(self, url, payload):
         _LOGGER.info("SengledApi: Login Request.")
+        start = time.perf_counter()
         try:
-            return await Request(url, payload).async_get_login_response()
+            data = await self._request(url, payload).async_get_login_response()
+            self._record_request(url, time.perf_counter() - start, data is None)
+            return data
         except Exception as e:
+            self._record_request(url, time.perf_counter() - start, True)
             _LOGGER.error("Error in async_do_login_request: %s", e)
-            return Request(url, payload).get_login_response()
+            raise
 
     async def async_do_is_session_timeout_request(self, url, payload):
-        _LOGGER.info("SengledApi: Sengled Api doing request.")
+        _LOGGER.debug("SengledApi: Sengled Api doing request.")
+        start = time.perf_counter()
         try:
-            return await Request(url, payload).async_is_session_timeout_response(
+            data = await self._request(url, payload).async_is_session_timeout_response(
                 SESSION.jsession_id
             )
+            self._record_request(url, time.perf_counter() - start, data is None)
+            return data
         except Exception as e:
+            self._record_request(url, time.perf_counter() - start, True)
             _LOGGER.error("Error in async_do_is_session_timeout_request: %s", e)
-            return Request(url, payload).is_session_timeout_response(
-                SESSION.jsession_id
-            )
+            return None
 
     def initialize_mqtt(self):
         _LOGGER.info("SengledApi: Initialize the MQTT connection")
         if not SESSION.jsession_id:
             return False
 
-        def on_message(api, userdata, msg):
-            if msg.topic in SESSION.subscribe:
-                SESSION.subscribe[msg.topic](msg.payload)
-
-        import concurrent.futures
-        import functools
-        import ssl
+        self._loop = asyncio.get_running_loop()
+        create_client = self._mqtt_factory
+        if create_client is None:
+            # paho is only loaded for accounts that actually use MQTT.
+            from . import mqtt
 
-        # Create SSL context in a separate thread to avoid blocking
-        def create_ssl_context():
-            context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
-            context.load_default_certs(ssl.Purpose.SERVER_AUTH)
-            return context
+            create_client = mqtt.create_client
 
-        SESSION.mqtt_client = mqtt.Client(
-            client_id="{}@lifeApp".format(SESSION.jsession_id), transport="websockets"
-        )
-        
-        # Run the blocking operation in a separate thread
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            ssl_context = executor.submit(create_ssl_context).result()
-            SESSION.mqtt_client.tls_set_context(ssl_context)
-            
-        SESSION.mqtt_client.ws_set_options(
-            path=SESSION.mqtt_server["path"],
-            headers={
-                "Cookie": "JSESSIONID={}".format(SESSION.jsession_id),
-                "X-Requested-With": "com.sengled.life2",
-            },
-        )
-        SESSION.mqtt_client.on_message = on_message
+        SESSION.mqtt_client = create_client(SESSION, self._on_mqtt_message)
+        self.publisher.attach(SESSION.mqtt_client)
         SESSION.mqtt_client.connect(
             SESSION.mqtt_server["host"],
             port=SESSION.mqtt_server["port"],
@@ -318,11 +744,40 @@ class SengledApi:
         _LOGGER.info("SengledApi: Start mqtt loop")
         return True
 
+    def _on_mqtt_message(self, client, userdata, msg):
+        # paho's network thread: queue the message for the loop and return.
+        # deque appends are thread safe and the flag only saves wakeups.
+        self.metrics.record_message()
+        self._inbox.append((msg.topic, msg.payload))
+        if self._drain_scheduled:
+            return
+        self._drain_scheduled = True
+        try:
+            self._loop.call_soon_threadsafe(self._drain_inbox)
+        except RuntimeError:
+            # The event loop is closed; nothing is listening any more.
+            pass
+
+    def _drain_inbox(self):
+        """Apply every queued MQTT message on the event loop, in arrival order."""
+        # Cleared first: a message queued during the drain schedules another.
+        self._drain_scheduled = False
+        while self._inbox:
+            topic, payload = self._inbox.popleft()
+            callback = SESSION.subscribe.get(topic)
+            if callback is None:
+                continue
+            try:
+                callback(payload)
+            except Exception:
+                _LOGGER.exception("SengledApi: Could not apply message on %s", topic)
+
     def reinitialize_mqtt(self):
         _LOGGER.info("SengledApi: Re-initialize the MQTT connection")
         if SESSION.mqtt_client is None or not SESSION.jsession_id:
             return False
 
+        self.publisher.attach(SESSION.mqtt_client)
         SESSION.mqtt_client.loop_stop()
         SESSION.mqtt_client.disconnect()
         SESSION.mqtt_client.ws_set_options(
@@ -339,35 +794,37 @@ class SengledApi:
 
         return True
 
-    def publish_mqtt(self, topic, payload=None):
-        _LOGGER.info("SengledApi: Publish MQTT message")
-        if SESSION.mqtt_client is None:
-            return False
+    @property
+    def mqtt_connected(self):
+        return SESSION.mqtt_client is not None and SESSION.mqtt_client.is_connected()
 
-        r = SESSION.mqtt_client.publish(topic, payload=payload)
-        _LOGGER.debug("SengledApi: Publish Mqtt %s", str(r))
-        try:
-            r.wait_for_publish()
-            return r.is_published
-        except ValueError:
-            pass
-
-        return False
+    def publish_mqtt(self, topic, payload=None, command=None):
+        """
+        Publish without waiting for the broker.
+        Returns a future that resolves to True once the message is delivered
+        at the command's QoS, False if it failed.
+        """
+        qos = self.mqtt_qos.get(command, self.mqtt_qos.get("default", DEFAULT_QOS))
+        _HOT.trace("SengledApi: Publish MQTT message", topic=topic, qos=qos)
+        return self.publisher.publish(topic, payload, qos)
 
     def subscribe_mqtt(self, topic, callback):
-        _LOGGER.info("SengledApi: Subscribe to an MQTT Topic")
+        _LOGGER.debug("SengledApi: Subscribe to an MQTT Topic %s", topic)
         if SESSION.mqtt_client is None:
             return False
 
         r = SESSION.mqtt_client.subscribe(topic)
-        _LOGGER.info("SengledApi: Subscribe Mqtt %s", str(r))
-        if r[0] != mqtt.MQTT_ERR_SUCCESS:
+        _LOGGER.debug("SengledApi: Subscribe Mqtt %s", r)
+        # MQTT_ERR_SUCCESS is 0 for paho and for injected clients alike.
+        if r[0] != 0:
             return False
 
         SESSION.subscribe[topic] = callback
         return True
 
     def unsubscribe_mqtt(self, topic, callback):
-        _LOGGER.info("SengledApi: Unsubscribe from an MQTT topic")
+        _LOGGER.debug("SengledApi: Unsubscribe from an MQTT topic %s", topic)
         if topic in SESSION.subscribe:
             del SESSION.subscribe[topic]
+        if SESSION.mqtt_client is not None:
+            SESSION.mqtt_client.unsubscribe(topic)
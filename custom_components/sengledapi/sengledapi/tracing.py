@@ -0,0 +1,113 @@
+"""Sengled Bulb Integration."""
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+
+from .metrics import percentile
+
+_LOGGER = logging.getLogger(__name__)
+
+# Finished spans kept in memory for the diagnostics dump.
+MAX_SPANS = 500
+
+
+class TraceSpan:
+    """
+    One command from the service call to the state the cloud confirmed.
+    Events are milliseconds since the command started.
+    """
+
+    def __init__(self, command, device, model, hub, region, transport):
+        self.command = command
+        self.device = device
+        self.model = model
+        self.hub = hub
+        self.region = region
+        self.transport = transport
+        self.started = time.time()
+        self._start = time.monotonic()
+        self.events = {}
+        self.outcome = None
+        self.duration_ms = None
+
+    def mark(self, event):
+        """Record the first time an event happens, until the span is finished."""
+        if self.outcome is None and event not in self.events:
+            self.events[event] = round((time.monotonic() - self._start) * 1000, 1)
+
+    def as_dict(self):
+        return {
+            "command": self.command,
+            "device": self.device,
+            "model": self.model,
+            "hub": self.hub,
+            "region": self.region,
+            "transport": self.transport,
+            "started": self.started,
+            "events": self.events,
+            "outcome": self.outcome,
+            "duration_ms": self.duration_ms,
+        }
+
+
+class CommandTracer:
+    """Collects command spans and optionally appends them to a JSONL file."""
+
+    def __init__(self, path=None, max_spans=MAX_SPANS):
+        self.path = path
+        self.spans = deque(maxlen=max_spans)
+
+    def start(self, command, device, model, hub, region, transport):
+        return TraceSpan(command, device, model, hub, region, transport)
+
+    def finish(self, span, outcome):
+        if span.outcome is not None:
+            return
+        span.mark(outcome)
+        span.outcome = outcome
+        span.duration_ms = span.events[outcome]
+        self.spans.append(span)
+        if self.path:
+            line = json.dumps(span.as_dict()) + "\n"
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                self._write(line)
+            else:
+                # Keep file I/O off the event loop.
+                loop.run_in_executor(None, self._write, line)
+
+    def _write(self, line):
+        try:
+            with open(self.path, "a", encoding="utf-8") as trace_file:
+                trace_file.write(line)
+        except OSError as e:
+            _LOGGER.warning("SengledApi: Could not write trace to %s: %s", self.path, e)
+
+    def summary(self):
+        """Confirmed-command latency grouped by device, hub and region."""
+        groups = {"device": {}, "hub": {}, "region": {}}
+        for span in self.spans:
+            if span.outcome != "confirmed":
+                continue
+            for field, group in groups.items():
+                group.setdefault(getattr(span, field), []).append(span.duration_ms)
+        return {
+            field: {
+                str(key): {
+                    "count": len(values),
+                    "p50_ms": percentile(values, 50),
+                    "p95_ms": percentile(values, 95),
+                }
+                for key, values in group.items()
+            }
+            for field, group in groups.items()
+        }
+
+    def as_dict(self):
+        return {
+            "spans": [span.as_dict() for span in self.spans],
+            "summary": self.summary(),
+        }
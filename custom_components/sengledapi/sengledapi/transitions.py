@@ -0,0 +1,220 @@
+"""Sengled Bulb Integration."""
+import asyncio
+import colorsys
+import logging
+import time
+
+from .metrics import percentile
+
+_LOGGER = logging.getLogger(__name__)
+
+# Steps are never closer together than this, in seconds.
+MIN_STEP_INTERVAL = 0.25
+# ... nor closer than this many median round trips of the endpoints in use.
+LATENCY_FACTOR = 2
+# HTTP control requests per second all transitions of an account may send.
+RATE_BUDGET = 10
+
+EFFECT_COLORLOOP = "colorloop"
+EFFECTS = (EFFECT_COLORLOOP,)
+# Seconds for the color loop to go once around the hue circle.
+COLORLOOP_PERIOD = 60
+
+
+def interpolate(start, end, fraction):
+    if isinstance(end, tuple):
+        return tuple(interpolate(a, b, fraction) for a, b in zip(start, end))
+    return round(start + (end - start) * fraction)
+
+
+class Fade:
+    """Moves a bulb's values from start to targets over duration seconds."""
+
+    effect = None
+
+    def __init__(self, start, targets, duration, turn_off=False):
+        self.start = start
+        self.targets = targets
+        self.duration = duration
+        self.turn_off = turn_off
+        self.began = time.monotonic()
+
+    def values(self, now):
+        """Return the values due at now and whether the fade is over."""
+        if self.duration <= 0:
+            fraction = 1
+        else:
+            fraction = min(1, (now - self.began) / self.duration)
+        values = {
+            key: interpolate(self.start.get(key, target), target, fraction)
+            for key, target in self.targets.items()
+        }
+        return values, fraction >= 1
+
+
+class ColorLoop:
+    """Cycles a color bulb through the hues until another command arrives."""
+
+    effect = EFFECT_COLORLOOP
+    turn_off = False
+
+    def __init__(self, period=COLORLOOP_PERIOD):
+        self.period = period
+        self.began = time.monotonic()
+
+    def values(self, now):
+        hue = (now - self.began) / self.period % 1
+        color = tuple(round(c * 255) for c in colorsys.hsv_to_rgb(hue, 1, 1))
+        return {"color": color}, False
+
+
+class TransitionScheduler:
+    """
+    Steps every running transition and effect of an account on one clock.
+    Each tick sends the values that changed, with Zigbee color steps that
+    share a value merged into one group request. Ticks are spaced by the
+    median latency of the endpoints the last tick used and by RATE_BUDGET,
+    so a room-wide fade slows its steps down instead of queueing up behind
+    the cloud. A new command to a bulb cancels its transition.
+    """
+
+    def __init__(self, api, rate_budget=RATE_BUDGET):
+        self._api = api
+        self._rate_budget = rate_budget
+        # bulb -> [transition, values sent so far, completion future]
+        self._active = {}
+        self._task = None
+
+    def start(self, bulb, transition):
+        """Run transition on bulb; returns a future, True once it completes."""
+        self._stop(bulb)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._active[bulb] = [transition, {}, future]
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._async_run())
+        return future
+
+    def cancel(self, bulb):
+        """Stop bulb's transition, unless this is one of its own steps."""
+        if self._task is not None and asyncio.current_task() is self._task:
+            return
+        self._stop(bulb)
+
+    def _stop(self, bulb):
+        entry = self._active.pop(bulb, None)
+        if entry is not None and not entry[2].done():
+            entry[2].set_result(False)
+
+    def cancel_all(self):
+        for bulb in list(self._active):
+            self._stop(bulb)
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def effect(self, bulb):
+        entry = self._active.get(bulb)
+        return None if entry is None else entry[0].effect
+
+    @property
+    def active(self):
+        return len(self._active)
+
+    async def _async_run(self):
+        while self._active:
+            now = time.monotonic()
+            steps = []
+            finished = []
+            for bulb, (transition, sent, future) in list(self._active.items()):
+                try:
+                    values, done = transition.values(now)
+                except Exception as e:
+                    # Only this bulb's transition ends; the others keep going.
+                    _LOGGER.error(
+                        "SengledApi: Transition of %s failed: %s", bulb._device_mac, e
+                    )
+                    self._stop(bulb)
+                    continue
+                changed = {
+                    key: value
+                    for key, value in values.items()
+                    if sent.get(key) != value
+                }
+                if changed:
+                    steps.append((bulb, sent, changed))
+                if done:
+                    del self._active[bulb]
+                    finished.append((bulb, transition, future))
+            try:
+                requests, endpoints = await self._async_send(
+                    [(bulb, changed) for bulb, _, changed in steps]
+                )
+                # Only steps that went out count as sent.
+                for _, sent, changed in steps:
+                    sent.update(changed)
+                for bulb, transition, future in finished:
+                    if transition.turn_off:
+                        await bulb.async_finish_fade_out(
+                            transition.start["brightness"]
+                        )
+                        requests += 1
+                    if not future.done():
+                        future.set_result(True)
+            except Exception as e:
+                _LOGGER.error("SengledApi: Transition step failed: %s", e)
+                # Finished transitions are no longer tracked; don't leave
+                # their callers waiting.
+                for _, _, future in finished:
+                    if not future.done():
+                        future.set_result(False)
+                requests, endpoints = 0, set()
+            if self._active:
+                await asyncio.sleep(self.interval(requests, endpoints))
+
+    async def _async_send(self, steps):
+        """Send one tick's steps; returns the HTTP request count and endpoints."""
+        requests = 0
+        endpoints = set()
+        groups = {}
+        for bulb, changed in steps:
+            for key, value in changed.items():
+                if key == "color" and not bulb._wifi_device:
+                    groups.setdefault(value, []).append(bulb)
+                    continue
+                endpoint = bulb.command_endpoint(key)
+                endpoints.add(endpoint)
+                if endpoint != "mqtt":
+                    # The budget is for the HTTP API; publishes have a window.
+                    requests += 1
+                if key == "brightness":
+                    await bulb.async_set_brightness(value)
+                elif key == "color_temperature":
+                    await bulb.async_color_temperature(value)
+                elif key == "color":
+                    await bulb.async_set_color(value)
+        for color, bulbs in groups.items():
+            endpoints.add(self._api.set_group_color(bulbs, color))
+            requests += 1
+        return requests, endpoints
+
+    def interval(self, requests, endpoints):
+        """Seconds until the next tick."""
+        latency = 0
+        metrics = self._api.metrics
+        for name in endpoints:
+            if name == "mqtt":
+                stats = metrics.mqtt_publish
+            else:
+                stats = metrics.endpoints.get(name)
+            if stats is not None and stats.samples:
+                latency = max(latency, percentile(list(stats.samples), 50))
+        return max(
+            MIN_STEP_INTERVAL, LATENCY_FACTOR * latency, requests / self._rate_budget
+        )
+
+    def as_dict(self):
+        return {
+            "active": len(self._active),
+            "effects": sum(1 for entry in self._active.values() if entry[0].effect),
+        }
@@ -0,0 +1,205 @@
+#!/usr/bin/python3
+
+"""Platform for Sengled diagnostic sensors."""
+
+import logging
+from datetime import timedelta
+
+from homeassistant.components.sensor import (SensorDeviceClass, SensorEntity,
+                                             SensorStateClass)
+from homeassistant.const import (ATTR_ATTRIBUTION,
+                                 SIGNAL_STRENGTH_DECIBELS_MILLIWATT,
+                                 EntityCategory, UnitOfTime)
+
+from .const import ATTRIBUTION, DOMAIN
+from .entity import SengledFleetEntity, setup_fleet_entities
+from .sengledapi import fleet
+
+# Sensors only read in-memory counters, so polling them costs no cloud calls.
+SCAN_INTERVAL = timedelta(seconds=30)
+
+_LOGGER = logging.getLogger(__name__)
+
+# key, name, unit, state class, value from Metrics
+METRIC_SENSORS = (
+    (
+        "requests",
+        "Sengled Requests",
+        None,
+        SensorStateClass.TOTAL_INCREASING,
+        lambda metrics: metrics.requests.count,
+    ),
+    (
+        "request_errors",
+        "Sengled Request Errors",
+        None,
+        SensorStateClass.TOTAL_INCREASING,
+        lambda metrics: metrics.requests.errors,
+    ),
+    (
+        "request_latency_p50",
+        "Sengled Request Latency p50",
+        UnitOfTime.MILLISECONDS,
+        SensorStateClass.MEASUREMENT,
+        lambda metrics: metrics.requests.percentile_ms(50),
+    ),
+    (
+        "request_latency_p95",
+        "Sengled Request Latency p95",
+        UnitOfTime.MILLISECONDS,
+        SensorStateClass.MEASUREMENT,
+        lambda metrics: metrics.requests.percentile_ms(95),
+    ),
+    (
+        "request_latency_p99",
+        "Sengled Request Latency p99",
+        UnitOfTime.MILLISECONDS,
+        SensorStateClass.MEASUREMENT,
+        lambda metrics: metrics.requests.percentile_ms(99),
+    ),
+    (
+        "mqtt_publish_latency_p95",
+        "Sengled MQTT Publish Latency p95",
+        UnitOfTime.MILLISECONDS,
+        SensorStateClass.MEASUREMENT,
+        lambda metrics: metrics.mqtt_publish.percentile_ms(95),
+    ),
+    (
+        "mqtt_message_rate",
+        "Sengled MQTT Messages per Minute",
+        None,
+        SensorStateClass.MEASUREMENT,
+        lambda metrics: metrics.message_rate(),
+    ),
+)
+
+# key, name, device class, unit, state class, value from a BulbProperty
+DEVICE_SENSORS = (
+    (
+        "rssi",
+        "Signal Strength",
+        SensorDeviceClass.SIGNAL_STRENGTH,
+        SIGNAL_STRENGTH_DECIBELS_MILLIWATT,
+        SensorStateClass.MEASUREMENT,
+        fleet.rssi,
+    ),
+    (
+        "signal_level",
+        "Signal Level",
+        None,
+        None,
+        SensorStateClass.MEASUREMENT,
+        fleet.signal_level,
+    ),
+    (
+        "consumption_time",
+        "Consumption Time",
+        None,
+        None,
+        SensorStateClass.TOTAL_INCREASING,
+        fleet.consumption_time,
+    ),
+    ("ip", "IP Address", None, None, None, fleet.ip),
+    ("version", "Firmware Version", None, None, None, fleet.version),
+)
+
+
+async def async_setup_platform(hass, config, add_entities, discovery_info=None):
+    """Set up the Sengled sensor platform."""
+    _LOGGER.debug("Creating new Sengled sensor component")
+    api = hass.data[DOMAIN]["sengledapi_account"]
+    add_entities(
+        [SengledMetricSensor(api, *description) for description in METRIC_SENSORS],
+        True,
+    )
+    # Per-device health sensors, all read from the one account-level fetch.
+    setup_fleet_entities(
+        hass, api, add_entities, DEVICE_SENSORS, SengledDeviceSensor
+    )
+
+
+class SengledMetricSensor(SensorEntity):
+    """Diagnostic sensor for the integration's own request statistics."""
+
+    def __init__(self, api, key, name, unit, state_class, value_fn):
+        """Initialize a Sengled metric sensor."""
+        self._api = api
+        self._key = key
+        self._name = name
+        self._unit = unit
+        self._state_class = state_class
+        self._value_fn = value_fn
+        self._value = None
+
+    @property
+    def name(self):
+        """Return the display name of this sensor."""
+        return self._name
+
+    @property
+    def unique_id(self):
+        return "{}_{}".format(DOMAIN, self._key)
+
+    @property
+    def entity_category(self):
+        return EntityCategory.DIAGNOSTIC
+
+    @property
+    def native_unit_of_measurement(self):
+        return self._unit
+
+    @property
+    def state_class(self):
+        return self._state_class
+
+    @property
+    def native_value(self):
+        return self._value
+
+    @property
+    def extra_state_attributes(self):
+        """Per-endpoint breakdown for the request sensors."""
+        attributes = {ATTR_ATTRIBUTION: ATTRIBUTION}
+        if self._key.startswith("request"):
+            attributes["endpoints"] = {
+                name: stats.as_dict()
+                for name, stats in self._api.metrics.endpoints.items()
+            }
+        return attributes
+
+    async def async_update(self):
+        """Read the current value from the account's metrics."""
+        self._value = self._value_fn(self._api.metrics)
+
+
+class SengledDeviceSensor(SengledFleetEntity, SensorEntity):
+    """Diagnostic sensor for one device's health, from the shared fetch."""
+
+    def __init__(
+        self, api, device, key, name, device_class, unit, state_class, value_fn
+    ):
+        """Initialize a Sengled device sensor."""
+        super().__init__(api, device, key, name, value_fn)
+        self._device_class = device_class
+        self._unit = unit
+        self._state_class = state_class
+
+    @property
+    def entity_category(self):
+        return EntityCategory.DIAGNOSTIC
+
+    @property
+    def device_class(self):
+        return self._device_class
+
+    @property
+    def native_unit_of_measurement(self):
+        return self._unit
+
+    @property
+    def state_class(self):
+        return self._state_class
+
+    @property
+    def native_value(self):
+        return self._value
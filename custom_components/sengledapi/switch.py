@@ -2,43 +2,70 @@
 
 """Platform for switch integration."""
 import logging
+from datetime import timedelta
 
-import homeassistant.helpers.config_validation as cv
-import voluptuous as vol
-# Import the device class from the component that you want to support
-from homeassistant.components.switch import PLATFORM_SCHEMA, SwitchDevice
+from homeassistant.components.switch import SwitchEntity
 from homeassistant.const import ATTR_ATTRIBUTION
+from homeassistant.core import callback
 
-from . import DOMAIN
-from .sengledapi.sengledapi import SengledApi
+from .const import ATTRIBUTION, DOMAIN
+
+# State arrives with every shared device fetch; polls are only a fallback.
+SCAN_INTERVAL = timedelta(seconds=60)
 
 _LOGGER = logging.getLogger(__name__)
-ATTRIBUTION = "Data provided by Sengled"
 
 
 async def async_setup_platform(hass, config, add_entities, discovery_info=None):
     """Set up the Sengled Switch platform."""
-    _LOGGER.debug("""Creating new SengledApi switch component""")
+    _LOGGER.debug("Creating new SengledApi switch component")
+    api = hass.data[DOMAIN]["sengledapi_account"]
+    known = set()
+
+    @callback
+    def async_add_new_switches():
+        """Add plugs that joined the account since the last shared fetch."""
+        switches = [
+            switch for switch in api.switches() if switch._device_mac not in known
+        ]
+        known.update(switch._device_mac for switch in switches)
+        if switches:
+            # Switches are built from the shared fetch, so no update first.
+            add_entities([SengledSwitch(switch) for switch in switches], False)
 
-    # Add devices
-    add_entities(
-        SengledSwitch(switch)
-        for switch in await hass.data[DOMAIN]["sengledapi_account"].async_list_switch()
-    )
+    await api.async_list_switch()
+    async_add_new_switches()
+    api.add_listener(async_add_new_switches)
 
 
-class SengledSwitch(SwitchDevice):
-    """Representation of a Wyze Switch."""
+class SengledSwitch(SwitchEntity):
+    """Representation of a Sengled smart plug."""
 
     def __init__(self, switch):
-        """Initialize a Wyze Switch."""
+        """Initialize a Sengled smart plug."""
         self._switch = switch
         self._name = switch._friendly_name
         self._state = switch._state
-        self._avaliable = True
+        self._available = switch._available
         self._device_mac = switch._device_mac
         self._device_model = switch._device_model
 
+    async def async_added_to_hass(self):
+        """Follow the shared device fetches."""
+        await super().async_added_to_hass()
+        self._switch.set_attribute_update_callback(self._handle_refresh)
+        self.async_on_remove(
+            lambda: self._switch.set_attribute_update_callback(None)
+        )
+
+    @callback
+    def _handle_refresh(self):
+        """Write the state a shared fetch brought in, if it changed."""
+        before = (self._name, self._available, self._state)
+        self._copy_switch_state()
+        if (self._name, self._available, self._state) != before:
+            self.async_write_ha_state()
+
     @property
     def name(self):
         """Return the display name of this switch."""
@@ -47,7 +74,7 @@ class SengledSwitch(SwitchDevice):
     @property
     def available(self):
         """Return the connection status of this switch"""
-        return self._avaliable
+        return self._available
 
     @property
     def is_on(self):
@@ -64,22 +91,39 @@ class SengledSwitch(SwitchDevice):
         return {
             ATTR_ATTRIBUTION: ATTRIBUTION,
             "state": self._state,
-            "available": self._avaliable,
+            "available": self._available,
             "device model": self._device_model,
             "mac": self._device_mac,
         }
 
+    @property
+    def device_info(self):
+        """Return the device info."""
+        return {
+            "name": self._name,
+            "identifiers": {(DOMAIN, self._device_mac)},
+            "model": self._device_model,
+            "manufacturer": "Sengled",
+        }
+
     async def async_turn_on(self, **kwargs):
         """Instruct the switch to turn on."""
         await self._switch.async_turn_on()
+        self._copy_switch_state()
 
     async def async_turn_off(self, **kwargs):
         """Instruct the switch to turn off."""
         await self._switch.async_turn_off()
+        self._copy_switch_state()
 
     async def async_update(self):
         """Fetch new state data for this switch.
         This is the only method that should fetch new data for Home Assistant.
         """
         await self._switch.async_update()
+        self._copy_switch_state()
+
+    def _copy_switch_state(self):
+        self._name = self._switch._friendly_name
+        self._available = self._switch._available
         self._state = self._switch._state
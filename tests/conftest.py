@@ -0,0 +1,24 @@
+"""Put the library and the fake cloud on the path and reset the session."""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [
+    os.path.join(ROOT, "tools"),
+    os.path.join(ROOT, "custom_components", "sengledapi"),
+]
+
+from sengledapi.sengledapi import SESSION  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def fresh_session():
+    """SESSION is module-level state; start every test logged out."""
+    yield
+    SESSION.jsession_id = ""
+    SESSION.mqtt_client = None
+    SESSION.subscribe = {}
+    SESSION.devices = []
+    SESSION.wifi_devices = []
@@ -0,0 +1,51 @@
+"""Helpers for running the library against tools/fake_cloud.py."""
+import asyncio
+import contextlib
+
+from fake_cloud import FakeCloud
+from sengledapi.sengledapi import SengledApi
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@contextlib.asynccontextmanager
+async def fake_account(
+    zigbee=2, wifi=0, hubs=1, cloud_options=None, login=True, **options
+):
+    """Yield (cloud, api) for a fresh fake cloud, logged in unless login=False."""
+    cloud = FakeCloud(zigbee=zigbee, wifi=wifi, hubs=hubs, **(cloud_options or {}))
+    base_url = await cloud.start()
+    api = SengledApi(
+        "user",
+        "password",
+        "us",
+        bool(wifi),
+        base_url=base_url,
+        mqtt_factory=cloud.mqtt_factory,
+        **options,
+    )
+    try:
+        if login:
+            await api.async_start()
+        yield cloud, api
+    finally:
+        await api.async_shutdown(timeout=1)
+        await cloud.stop()
+
+
+async def settle(api):
+    """Wait for every background control request to finish."""
+    while api._tasks:
+        await asyncio.gather(*list(api._tasks), return_exceptions=True)
+    await asyncio.sleep(0)
+
+
+async def wait_for(predicate, timeout=2):
+    """Poll predicate on the loop until it holds, e.g. for MQTT echoes."""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("condition not met in {}s".format(timeout))
+        await asyncio.sleep(0.01)
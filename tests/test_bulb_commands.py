@@ -0,0 +1,73 @@
+"""Optimistic commands: confirmation, rollback and timeout."""
+from helpers import fake_account, run, settle
+
+from sengledapi.devices.bulbs import bulb as bulb_module
+
+
+def test_zigbee_brightness_confirmed_by_poll():
+    async def scenario():
+        async with fake_account() as (cloud, api):
+            bulb = (await api.discover_devices())[0]
+            await bulb.async_set_brightness(128)
+            assert bulb._brightness == 128
+            assert bulb.pending_commands == ["brightness"]
+            await settle(api)
+            await api._coordinator.async_refresh(force=True)
+            await bulb.async_update()
+            assert bulb.pending_commands == []
+            assert bulb._command_failed is None
+
+    run(scenario())
+
+
+def test_zigbee_color_with_zero_channel_is_confirmed():
+    async def scenario():
+        async with fake_account() as (cloud, api):
+            bulb = (await api.discover_devices())[0]
+            await bulb.async_set_color((255, 0, 0))
+            await settle(api)
+            # The cloud may send channels as numbers; 0 must still match.
+            lamp = cloud.zigbee[bulb._device_mac]["attributes"]
+            lamp.update(rgbColorR=255, rgbColorG=0, rgbColorB=0)
+            await api._coordinator.async_refresh(force=True)
+            await bulb.async_update()
+            assert bulb.pending_commands == []
+            assert bulb._command_failed is None
+
+    run(scenario())
+
+
+def test_rejected_command_rolls_back():
+    async def scenario():
+        async with fake_account() as (cloud, api):
+            bulb = (await api.discover_devices())[0]
+            before = bulb._brightness
+            writes = []
+            bulb.set_attribute_update_callback(lambda: writes.append(bulb._brightness))
+            # The fake cloud rejects commands for devices it doesn't know.
+            del cloud.zigbee[bulb._device_mac]
+            await bulb.async_set_brightness(10)
+            await settle(api)
+            assert bulb._brightness == before
+            assert bulb._command_failed == "brightness"
+            # The rolled back value is written to Home Assistant.
+            assert writes[-1:] == [before]
+
+    run(scenario())
+
+
+def test_unconfirmed_command_times_out(monkeypatch):
+    async def scenario():
+        async with fake_account() as (cloud, api):
+            bulb = (await api.discover_devices())[0]
+            monkeypatch.setattr(bulb_module, "COMMAND_TIMEOUT", 0)
+            await bulb.async_set_brightness(10)
+            await settle(api)
+            # The cloud never applies it, so the poll's value wins again.
+            cloud.zigbee[bulb._device_mac]["attributes"]["brightness"] = "200"
+            await api._coordinator.async_refresh(force=True)
+            await bulb.async_update()
+            assert bulb.pending_commands == []
+            assert bulb._brightness == 200
+
+    run(scenario())
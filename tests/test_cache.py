@@ -0,0 +1,82 @@
+"""TtlCache: single-flight fills, TTLs and invalidation."""
+import asyncio
+
+from helpers import run
+
+from sengledapi.cache import TtlCache
+
+
+def test_concurrent_callers_share_one_fill():
+    async def scenario():
+        cache = TtlCache()
+        calls = []
+
+        async def fill():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "value"
+
+        values = await asyncio.gather(
+            *(cache.async_get("key", fill, 60) for _ in range(5))
+        )
+        assert values == ["value"] * 5
+        assert len(calls) == 1
+        assert await cache.async_get("key", fill, 60) == "value"
+        assert len(calls) == 1
+
+    run(scenario())
+
+
+def test_expired_and_none_values_are_refilled():
+    async def scenario():
+        cache = TtlCache()
+        results = iter([None, "a", "b"])
+
+        async def fill():
+            return next(results)
+
+        assert await cache.async_get("key", fill, 60) is None
+        assert await cache.async_get("key", fill, 0) == "a"
+        assert await cache.async_get("key", fill, 60) == "b"
+
+    run(scenario())
+
+
+def test_invalidate_during_fill_is_not_stored():
+    async def scenario():
+        cache = TtlCache()
+        started = asyncio.Event()
+        results = iter(["old", "new"])
+
+        async def fill():
+            started.set()
+            await asyncio.sleep(0.01)
+            return next(results)
+
+        first = asyncio.ensure_future(cache.async_get("key", fill, 60))
+        await started.wait()
+        cache.invalidate("key")
+        assert await first == "old"
+        assert await cache.async_get("key", fill, 60) == "new"
+
+    run(scenario())
+
+
+def test_failed_fill_is_not_cached():
+    async def scenario():
+        cache = TtlCache()
+        attempts = []
+
+        async def fill():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise RuntimeError("cloud down")
+            return "value"
+
+        try:
+            await cache.async_get("key", fill, 60)
+        except RuntimeError:
+            pass
+        assert await cache.async_get("key", fill, 60) == "value"
+
+    run(scenario())
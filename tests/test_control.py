@@ -0,0 +1,51 @@
+"""ControlSelector: MQTT fallback to HTTP and probation."""
+from sengledapi.control import HTTP, MQTT, ControlSelector
+
+
+def test_http_while_disconnected():
+    assert ControlSelector(http_fallback=True).choose("bulb", False) == HTTP
+
+
+def test_falls_back_after_failures_and_retries_on_probation():
+    selector = ControlSelector(failures=2, fallback_period=0, http_fallback=True)
+    assert selector.choose("bulb", True) == MQTT
+    selector.record("bulb", 0.1, False)
+    assert selector.choose("bulb", True) == MQTT
+    selector.record("bulb", 0.1, False)
+    assert selector._health["bulb"].fallback_until is not None
+    # The fallback period is over: MQTT on probation.
+    assert selector.choose("bulb", True) == MQTT
+    selector.record("bulb", 0.1, False)
+    assert selector._health["bulb"].fallback_until is not None
+
+
+def test_stays_on_http_during_fallback_period():
+    selector = ControlSelector(failures=1, fallback_period=60, http_fallback=True)
+    selector.record("bulb", 0.1, False)
+    assert selector.choose("bulb", True) == HTTP
+    assert selector.choose("other", True) == MQTT
+
+
+def test_slow_publishes_fall_back():
+    selector = ControlSelector(
+        latency_budget=1.0, fallback_period=60, http_fallback=True
+    )
+    selector.record("bulb", 5.0, True)
+    assert selector.choose("bulb", True) == HTTP
+
+
+def test_success_on_probation_clears_the_record():
+    selector = ControlSelector(failures=1, fallback_period=0, http_fallback=True)
+    selector.record("bulb", 0.1, False)
+    assert selector.choose("bulb", True) == MQTT
+    selector.record("bulb", 0.1, True)
+    assert selector._health["bulb"].fallback_until is None
+    assert selector._health["bulb"].failures == 0
+
+
+def test_mqtt_only_without_http_fallback():
+    selector = ControlSelector(failures=1, fallback_period=60)
+    assert selector.choose("bulb", False) == MQTT
+    selector.record("bulb", 0.1, False)
+    assert selector.choose("bulb", True) == MQTT
+    assert selector._health["bulb"].fallback_until is None
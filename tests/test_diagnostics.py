@@ -0,0 +1,16 @@
+import json
+
+from helpers import fake_account, run
+
+
+def test_diagnostics_are_json():
+    async def scenario():
+        async with fake_account(zigbee=2) as (cloud, api):
+            await api.async_get_devices()
+            data = json.loads(json.dumps(api.diagnostics(), default=str))
+            assert data["online"] is True
+            assert data["pending_tasks"] == 0
+            for key in ("metrics", "cache", "mqtt_publisher", "endpoints"):
+                assert isinstance(data[key], dict)
+
+    run(scenario())
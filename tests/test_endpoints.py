@@ -0,0 +1,62 @@
+"""Probing the candidate hosts of each endpoint family."""
+import contextlib
+
+from helpers import run
+
+from sengledapi.endpoints import DETAILS, ELEMENTS
+from sengledapi.sengledapi import SengledApi
+
+
+class ProbeTransport:
+    """Answers probes with a 200, or 500 for down hosts, and notes body reads."""
+
+    def __init__(self, down=()):
+        self.urls = []
+        self.body_read = False
+        self.status = 200
+        self._down = down
+
+    @contextlib.asynccontextmanager
+    async def post(self, url, data, headers):
+        self.urls.append(url)
+        self.status = 500 if url.split("/")[2] in self._down else 200
+        yield self
+
+    async def read(self):
+        self.body_read = True
+        return b"{}"
+
+    @property
+    def content(self):
+        self.body_read = True
+        return None
+
+
+def test_probe_reads_only_the_status():
+    async def scenario():
+        transport = ProbeTransport()
+        api = SengledApi("user", "password", "us", False, transport=transport)
+        await api.async_probe_endpoints()
+        assert len(transport.urls) == 2
+        assert not transport.body_read
+        # Every candidate answered, so one of them is in use.
+        assert api.endpoints.host(DETAILS) in {
+            url.split("/")[2] for url in transport.urls
+        }
+
+    run(scenario())
+
+
+def test_control_host_is_never_probed_or_failed_over():
+    async def scenario():
+        transport = ProbeTransport(down={"element.cloud.sengled.com"})
+        api = SengledApi("user", "password", "us", False, transport=transport)
+        await api.async_probe_endpoints()
+        assert api.endpoints.host(DETAILS) == "us-element.cloud.sengled.com"
+        assert not any("-elements." in url for url in transport.urls)
+        control = api.endpoints.url(ELEMENTS, "/zigbee/device/deviceSetOnOff.json")
+        for _ in range(5):
+            assert api.endpoints.record(control, 0.1, error=True) is False
+        assert api.endpoints.host(ELEMENTS) == "us-elements.cloud.sengled.com"
+
+    run(scenario())
@@ -0,0 +1,17 @@
+"""Per-device health values read from the shared device fetch."""
+from helpers import fake_account, run
+
+from sengledapi import fleet
+
+
+def test_signal_is_dbm_on_wifi_and_bars_on_zigbee():
+    async def scenario():
+        async with fake_account(zigbee=1, wifi=1) as (cloud, api):
+            await api.async_get_devices()
+            devices = {device.wifi: device for device, _ in api.inventory().values()}
+            assert fleet.rssi(devices[True]) == -40
+            assert fleet.signal_level(devices[True]) is None
+            assert fleet.rssi(devices[False]) is None
+            assert fleet.signal_level(devices[False]) == 5
+
+    run(scenario())
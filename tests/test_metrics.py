@@ -0,0 +1,24 @@
+"""Request and message statistics."""
+from sengledapi import metrics
+from sengledapi.metrics import MESSAGE_RATE_WINDOW, Metrics
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def test_message_times_stay_within_the_window_without_readers(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(metrics, "time", clock)
+    stats = Metrics()
+    for _ in range(1000):
+        stats.record_message()
+        clock.now += 1
+    assert stats.mqtt_messages == 1000
+    assert len(stats._message_times) <= MESSAGE_RATE_WINDOW + 1
+    # One message a second.
+    assert stats.message_rate() == 60
@@ -0,0 +1,89 @@
+"""Wi-Fi bulbs: MQTT commands, echoes and the message inbox."""
+import json
+import threading
+
+from fake_cloud import FakeMessage
+from helpers import fake_account, run, wait_for
+
+
+def status(mac, kind, value):
+    return FakeMessage(
+        "wifielement/{}/status".format(mac),
+        json.dumps([{"dn": mac, "type": kind, "value": value}]).encode(),
+    )
+
+
+def test_command_is_published_and_confirmed_by_echo():
+    async def scenario():
+        async with fake_account(zigbee=0, wifi=1) as (cloud, api):
+            bulb = (await api.discover_devices())[0]
+            await bulb.async_set_brightness(128)
+            await wait_for(lambda: not bulb.pending_commands)
+            assert cloud.stats["mqtt_publish"] == 1
+            assert bulb._command_failed is None
+
+    run(scenario())
+
+
+def test_messages_from_another_thread_are_applied_on_the_loop_in_order():
+    async def scenario():
+        async with fake_account(zigbee=0, wifi=2) as (cloud, api):
+            bulbs = await api.discover_devices()
+            updates = []
+            loop_thread = threading.get_ident()
+            for bulb in bulbs:
+                bulb.set_attribute_update_callback(
+                    lambda bulb=bulb: updates.append(
+                        (bulb._device_mac, threading.get_ident())
+                    )
+                )
+            client = cloud._clients[0]
+
+            def flood():
+                for value in range(100):
+                    bulb = bulbs[value % 2]
+                    client.on_message(
+                        client, None, status(bulb._device_mac, "brightness", value)
+                    )
+
+            thread = threading.Thread(target=flood)
+            thread.start()
+            await wait_for(lambda: not thread.is_alive() and not api._inbox)
+            await wait_for(lambda: bulbs[1]._brightness == round(99 / 100 * 255))
+            assert bulbs[0]._brightness == round(98 / 100 * 255)
+            assert {ident for _, ident in updates} == {loop_thread}
+            # Updates are coalesced: far fewer callbacks than messages.
+            assert 0 < len(updates) < 100
+
+    run(scenario())
+
+
+def test_commands_stay_on_mqtt_without_http_fallback():
+    async def scenario():
+        options = {"mqtt_qos": {"default": 0}}
+        async with fake_account(zigbee=0, wifi=1, **options) as (cloud, api):
+            bulb = (await api.discover_devices())[0]
+            cloud.mqtt_down = True
+            await bulb.async_set_brightness(128)
+            await wait_for(lambda: not bulb.pending_commands)
+            assert cloud.stats["control.json"] == 0
+            assert bulb._command_failed == "brightness"
+            assert bulb._brightness == 255
+
+    run(scenario())
+
+
+def test_http_fallback_sends_commands_to_life2_while_mqtt_is_down():
+    async def scenario():
+        options = {"wifi_http_fallback": True}
+        async with fake_account(zigbee=0, wifi=1, **options) as (cloud, api):
+            bulb = (await api.discover_devices())[0]
+            cloud.mqtt_down = True
+            await bulb.async_set_brightness(128)
+            await wait_for(lambda: cloud.stats["control.json"] == 1)
+            assert cloud.stats["mqtt_publish"] == 0
+            lamp = cloud.wifi[bulb._device_mac]
+            await wait_for(lambda: lamp["attributes"]["brightness"] == "50")
+            assert bulb._command_failed is None
+
+    run(scenario())
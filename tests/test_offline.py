@@ -0,0 +1,70 @@
+"""Cached state and queued commands while the cloud is unreachable."""
+from helpers import fake_account, run, settle
+
+from sengledapi import sengledapi as api_module
+from sengledapi.sengledapi import OFFLINE_DISCARD
+
+
+async def go_offline(cloud, api):
+    cloud.error_rate = 1.0
+    await api._coordinator.async_refresh(force=True)
+    assert not api.online
+
+
+async def come_back(cloud, api):
+    cloud.error_rate = 0.0
+    await api._coordinator.async_refresh(force=True)
+    await settle(api)
+    assert api.online
+
+
+def test_cached_state_is_served_while_offline():
+    async def scenario():
+        async with fake_account() as (cloud, api):
+            bulbs = await api.discover_devices()
+            await go_offline(cloud, api)
+            assert len(await api.async_get_devices()) == len(bulbs)
+
+    run(scenario())
+
+
+def test_latest_queued_command_is_replayed():
+    async def scenario():
+        async with fake_account() as (cloud, api):
+            bulb = (await api.discover_devices())[0]
+            await go_offline(cloud, api)
+            await bulb.async_set_brightness(10)
+            await bulb.async_set_brightness(20)
+            assert len(api._offline_commands) == 1
+            await come_back(cloud, api)
+            lamp = cloud.zigbee[bulb._device_mac]["attributes"]
+            assert lamp["brightness"] == "20"
+            assert cloud.stats["deviceSetBrightness.json"] == 1
+
+    run(scenario())
+
+
+def test_stale_queued_command_is_dropped(monkeypatch):
+    async def scenario():
+        async with fake_account() as (cloud, api):
+            bulb = (await api.discover_devices())[0]
+            await go_offline(cloud, api)
+            monkeypatch.setattr(api_module, "OFFLINE_COMMAND_MAX_AGE", -1)
+            await bulb.async_set_brightness(10)
+            await come_back(cloud, api)
+            assert cloud.stats["deviceSetBrightness.json"] == 0
+
+    run(scenario())
+
+
+def test_discard_policy_drops_commands():
+    async def scenario():
+        async with fake_account(offline_commands=OFFLINE_DISCARD) as (cloud, api):
+            bulb = (await api.discover_devices())[0]
+            await go_offline(cloud, api)
+            await bulb.async_set_brightness(10)
+            assert api._offline_commands == {}
+            await come_back(cloud, api)
+            assert cloud.stats["deviceSetBrightness.json"] == 0
+
+    run(scenario())
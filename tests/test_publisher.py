@@ -0,0 +1,88 @@
+"""MqttPublisher: in-flight window, QoS 0 drops, timeouts and close."""
+import asyncio
+
+from helpers import run
+
+from sengledapi.metrics import Metrics
+from sengledapi.publisher import MqttPublisher
+
+
+class Info:
+    def __init__(self, mid, rc=0):
+        self.mid = mid
+        self.rc = rc
+
+
+class Client:
+    """Records publishes; the test acknowledges them through on_publish."""
+
+    def __init__(self, rc=0):
+        self.rc = rc
+        self.on_publish = None
+        self.sent = []
+
+    def publish(self, topic, payload=None, qos=0):
+        self.sent.append((topic, qos))
+        return Info(len(self.sent), self.rc)
+
+    def ack(self, mid):
+        self.on_publish(self, None, mid)
+
+
+def test_window_limits_publishes_in_flight():
+    async def scenario():
+        client = Client()
+        publisher = MqttPublisher(Metrics(), window=2)
+        publisher.attach(client)
+        futures = [publisher.publish("t", "p", 1) for _ in range(5)]
+        assert len(client.sent) == 2
+        client.ack(1)
+        assert await futures[0] is True
+        assert len(client.sent) == 3
+        for mid in (2, 3, 4, 5):
+            client.ack(mid)
+        assert await asyncio.gather(*futures) == [True] * 5
+        assert publisher.as_dict()["in_flight"] == 0
+
+    run(scenario())
+
+
+def test_qos_is_passed_through_and_qos0_fails_when_not_sent():
+    async def scenario():
+        client = Client(rc=4)
+        publisher = MqttPublisher(Metrics())
+        publisher.attach(client)
+        assert await publisher.publish("t", "p", 0) is False
+        # QoS 1 is resent by the client after a reconnect, so it waits.
+        future = publisher.publish("t", "p", 1)
+        assert [qos for _, qos in client.sent] == [0, 1]
+        client.ack(2)
+        assert await future is True
+
+    run(scenario())
+
+
+def test_unacknowledged_publish_times_out():
+    async def scenario():
+        client = Client()
+        publisher = MqttPublisher(Metrics(), window=1, timeout=0.01)
+        publisher.attach(client)
+        first = publisher.publish("t", "p", 1)
+        second = publisher.publish("t", "p", 1)
+        assert await first is False
+        # The slot is freed for the next publish.
+        client.ack(2)
+        assert await second is True
+
+    run(scenario())
+
+
+def test_close_fails_everything_outstanding():
+    async def scenario():
+        publisher = MqttPublisher(Metrics(), window=1)
+        publisher.attach(Client())
+        futures = [publisher.publish("t", "p", 1) for _ in range(3)]
+        publisher.close()
+        assert await asyncio.gather(*futures) == [False] * 3
+
+    run(scenario())
@@ -0,0 +1,72 @@
+"""Periodic rediscovery: new, removed, returning and forgotten devices."""
+from fake_cloud import wifi_bulb, zigbee_lamp
+from helpers import fake_account, run
+
+from sengledapi import sengledapi as api_module
+from sengledapi.sengledapi import SESSION
+
+
+async def rediscover(api):
+    await api._coordinator.async_refresh(force=True)
+    return await api.async_rediscover()
+
+
+def test_new_and_returning_devices():
+    async def scenario():
+        async with fake_account() as (cloud, api):
+            bulbs = await api.discover_devices()
+            lamp = zigbee_lamp(99)
+            cloud.zigbee[lamp["deviceUuid"]] = lamp
+            cloud.hubs["HUB0000"].append(lamp)
+            added, removed, dropped = await rediscover(api)
+            assert [bulb._device_mac for bulb in added] == [lamp["deviceUuid"]]
+            gone = cloud.zigbee.pop(bulbs[0]._device_mac)
+            cloud.hubs["HUB0000"].remove(gone)
+            added, removed, dropped = await rediscover(api)
+            assert removed == [bulbs[0]] and not bulbs[0]._available
+            cloud.zigbee[gone["deviceUuid"]] = gone
+            cloud.hubs["HUB0000"].append(gone)
+            added, removed, dropped = await rediscover(api)
+            assert (added, removed, dropped) == ([], [], [])
+            assert api._removed == {}
+
+    run(scenario())
+
+
+def test_removed_devices_are_forgotten_after_the_grace_period(monkeypatch):
+    monkeypatch.setattr(api_module, "REMOVED_DEVICE_GRACE", 0)
+
+    async def scenario():
+        async with fake_account(zigbee=0, wifi=1) as (cloud, api):
+            await api.discover_devices()
+            for index in range(1, 20):
+                # Swap the account's only bulb for a new one.
+                cloud.wifi.clear()
+                bulb = wifi_bulb(index)
+                cloud.wifi[bulb["deviceUuid"]] = bulb
+                await rediscover(api)
+            # The bulb from the last swap is removed, not yet forgotten.
+            assert len(api._bulbs) == 2
+            assert len(api._removed) == 1
+            assert len(SESSION.subscribe) == 1
+
+    run(scenario())
+
+
+def test_plugs_that_join_later_get_a_switch():
+    async def scenario():
+        async with fake_account() as (cloud, api):
+            assert await api.async_list_switch() == []
+            plug = zigbee_lamp(99)
+            plug["attributes"]["typeCode"] = "E1E-G7F"
+            cloud.zigbee[plug["deviceUuid"]] = plug
+            cloud.hubs["HUB0000"].append(plug)
+            await api._coordinator.async_refresh(force=True)
+            switches = api.switches()
+            assert [switch._device_mac for switch in switches] == [
+                plug["deviceUuid"]
+            ]
+            # Later calls hand back the same Switch, not a new one.
+            assert api.switches() == switches
+
+    run(scenario())
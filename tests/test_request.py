@@ -0,0 +1,76 @@
+"""getDeviceDetails.json parsing, streamed and buffered."""
+import contextlib
+import json
+
+import pytest
+from helpers import run
+
+from sengledapi.devices import request as request_module
+from sengledapi.devices.request import Request
+
+# lampInfos before deviceUuid in the second hub: key order isn't guaranteed.
+BODY = json.dumps(
+    {
+        "ret": 0,
+        "deviceInfos": [
+            {
+                "deviceUuid": "HUB1",
+                "lampInfos": [{"deviceUuid": "A", "attributes": {"name": "a"}}],
+            },
+            {
+                "lampInfos": [{"deviceUuid": "B", "attributes": {"name": "b"}}],
+                "deviceUuid": "HUB2",
+            },
+            {"lampInfos": [{"deviceUuid": "C", "attributes": {"name": "c"}}]},
+        ],
+    }
+).encode()
+
+
+class Content:
+    def __init__(self, body):
+        self._body = body
+
+    async def read(self, size=-1):
+        if size < 0:
+            size = len(self._body)
+        chunk, self._body = self._body[:size], self._body[size:]
+        return chunk
+
+
+class Response:
+    status = 200
+
+    def __init__(self, body):
+        self._body = body
+        self.content = Content(body)
+
+    async def read(self):
+        return self._body
+
+
+class Transport:
+    @contextlib.asynccontextmanager
+    async def post(self, url, data, headers):
+        yield Response(BODY)
+
+
+async def hubs():
+    request = Request("http://fake/getDeviceDetails.json", {}, transport=Transport())
+    return {
+        uuid: info["hubUuid"]
+        async for uuid, info in request.async_iter_lamp_infos("session")
+    }
+
+
+EXPECTED = {"A": "HUB1", "B": "HUB2", "C": None}
+
+
+def test_streamed_lamps_get_their_own_hub():
+    pytest.importorskip("ijson")
+    assert run(hubs()) == EXPECTED
+
+
+def test_buffered_lamps_get_their_own_hub(monkeypatch):
+    monkeypatch.setattr(request_module, "ijson", None)
+    assert run(hubs()) == EXPECTED
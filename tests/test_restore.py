@@ -0,0 +1,52 @@
+"""Bulbs restored from a stored inventory before the cloud answers."""
+import asyncio
+import json
+
+from helpers import fake_account, run, settle, wait_for
+
+from sengledapi import coordinator
+from sengledapi.sengledapi import SESSION
+
+
+async def snapshot(zigbee, wifi):
+    async with fake_account(zigbee=zigbee, wifi=wifi) as (cloud, api):
+        # Stored by Home Assistant as JSON.
+        return json.loads(json.dumps(api.device_snapshot()))
+
+
+def test_restored_bulbs_queue_commands_until_the_cloud_answers(monkeypatch):
+    monkeypatch.setattr(coordinator, "BACKOFF_BASE", 0.01)
+
+    async def scenario():
+        stored = await snapshot(2, 1)
+        SESSION.jsession_id = ""
+        SESSION.mqtt_client = None
+        options = {"error_rate": 1.0}
+        async with fake_account(
+            zigbee=2, wifi=1, cloud_options=options, login=False
+        ) as (cloud, api):
+            bulbs = api.restore_devices(stored)
+            assert len(bulbs) == 3 and api.known_bulbs() == bulbs
+            assert all(bulb.stale for bulb in bulbs)
+            zigbee = next(bulb for bulb in bulbs if not bulb._wifi_device)
+            wifi = next(bulb for bulb in bulbs if bulb._wifi_device)
+            # Polls before login don't touch the cloud or the state.
+            await zigbee.async_update()
+            assert zigbee._available
+            await zigbee.async_set_brightness(42)
+            assert zigbee._brightness == 42
+            assert len(api._offline_commands) == 1
+
+            start = asyncio.ensure_future(api.async_start())
+            await asyncio.sleep(0.05)
+            cloud.error_rate = 0.0
+            assert await asyncio.wait_for(start, 2) is True
+            await settle(api)
+            lamp = cloud.zigbee[zigbee._device_mac]["attributes"]
+            assert lamp["brightness"] == "42"
+            assert not wifi.stale
+            # The Wi-Fi bulb is subscribed now that MQTT is up.
+            await wifi.async_set_brightness(50)
+            await wait_for(lambda: not wifi.pending_commands)
+
+    run(scenario())
@@ -0,0 +1,56 @@
+"""Login and the first device fetch at startup."""
+import asyncio
+
+import aiohttp
+from helpers import fake_account, run
+
+from sengledapi import coordinator
+from sengledapi.devices.request import Request
+from sengledapi.sengledapi import SESSION
+
+
+def test_startup_retries_until_the_cloud_answers(monkeypatch):
+    monkeypatch.setattr(coordinator, "BACKOFF_BASE", 0.01)
+
+    async def scenario():
+        options = {"error_rate": 1.0}
+        async with fake_account(cloud_options=options, login=False) as (cloud, api):
+            start = asyncio.ensure_future(api.async_start())
+            await asyncio.sleep(0.1)
+            assert not start.done()
+            cloud.error_rate = 0.0
+            assert await asyncio.wait_for(start, 2) is True
+            assert len(api.inventory()) == 2
+            assert len(await api.discover_devices()) == 2
+
+    run(scenario())
+
+
+def test_startup_gives_up_on_rejected_credentials():
+    async def scenario():
+        async with fake_account(login=False) as (cloud, api):
+            SESSION.password = ""
+            assert await asyncio.wait_for(api.async_start(), 2) is False
+
+    run(scenario())
+
+
+def test_startup_retries_when_login_cannot_reach_the_cloud(monkeypatch):
+    monkeypatch.setattr(coordinator, "BACKOFF_BASE", 0.01)
+    calls = []
+    original = Request.async_get_login_response
+
+    async def unreachable(self):
+        calls.append(self._url)
+        if len(calls) < 3:
+            raise aiohttp.ClientConnectionError("unreachable")
+        return await original(self)
+
+    monkeypatch.setattr(Request, "async_get_login_response", unreachable)
+
+    async def scenario():
+        async with fake_account(login=False) as (cloud, api):
+            assert await asyncio.wait_for(api.async_start(), 2) is True
+            assert len(calls) == 3
+
+    run(scenario())
@@ -0,0 +1,167 @@
+"""Software transitions and the color loop effect."""
+import asyncio
+
+from helpers import fake_account, run, settle
+
+from sengledapi import transitions
+from sengledapi.transitions import EFFECT_COLORLOOP
+
+
+def test_fade_reaches_its_target(monkeypatch):
+    monkeypatch.setattr(transitions, "MIN_STEP_INTERVAL", 0.01)
+
+    async def scenario():
+        async with fake_account() as (cloud, api):
+            bulb = (await api.discover_devices())[0]
+            future = await bulb.async_transition(0.1, brightness=40)
+            assert await asyncio.wait_for(future, 2) is True
+            await settle(api)
+            lamp = cloud.zigbee[bulb._device_mac]["attributes"]
+            assert lamp["brightness"] == "40"
+            assert lamp["onoff"] == "1"
+            assert cloud.stats["deviceSetBrightness.json"] > 1
+
+    run(scenario())
+
+
+def test_fade_out_turns_off_and_restores_brightness(monkeypatch):
+    monkeypatch.setattr(transitions, "MIN_STEP_INTERVAL", 0.01)
+
+    async def scenario():
+        async with fake_account() as (cloud, api):
+            bulb = (await api.discover_devices())[0]
+            await bulb.async_toggle("1")
+            future = await bulb.async_fade_out(0.1)
+            assert await asyncio.wait_for(future, 2) is True
+            await settle(api)
+            assert cloud.zigbee[bulb._device_mac]["attributes"]["onoff"] == "0"
+            assert not bulb._state
+
+    run(scenario())
+
+
+def test_new_command_cancels_the_color_loop(monkeypatch):
+    monkeypatch.setattr(transitions, "MIN_STEP_INTERVAL", 0.01)
+
+    async def scenario():
+        async with fake_account() as (cloud, api):
+            bulb = (await api.discover_devices())[0]
+            future = await bulb.async_set_effect(EFFECT_COLORLOOP)
+            assert bulb.effect == EFFECT_COLORLOOP
+            await asyncio.sleep(0.05)
+            await bulb.async_set_brightness(100)
+            assert await future is False
+            assert bulb.effect is None
+
+    run(scenario())
+
+
+def test_zigbee_color_steps_share_group_requests(monkeypatch):
+    monkeypatch.setattr(transitions, "MIN_STEP_INTERVAL", 0.01)
+
+    async def scenario():
+        async with fake_account(zigbee=4) as (cloud, api):
+            bulbs = await api.discover_devices()
+            futures = [
+                await bulb.async_transition(0.05, color=(255, 0, 0)) for bulb in bulbs
+            ]
+            await asyncio.wait_for(asyncio.gather(*futures), 2)
+            await settle(api)
+            for bulb in bulbs:
+                lamp = cloud.zigbee[bulb._device_mac]["attributes"]
+                assert (lamp["rgbColorR"], lamp["rgbColorG"]) == ("255", "0")
+            # One group request per step, not one per bulb.
+            ticks = cloud.stats["deviceSetGroup.json"]
+            assert ticks < 4 * 3
+
+    run(scenario())
+
+
+def test_zigbee_color_temperature_fades_from_kelvin(monkeypatch):
+    monkeypatch.setattr(transitions, "MIN_STEP_INTERVAL", 0.01)
+
+    async def scenario():
+        async with fake_account() as (cloud, api):
+            bulb = (await api.discover_devices())[0]
+            # The cloud reports 50 percent.
+            assert bulb._color_temperature == 4250
+            future = await bulb.async_transition(0.1, color_temperature=6500)
+            fade = api.transitions._active[bulb][0]
+            assert fade.start["color_temperature"] == 4250
+            assert await asyncio.wait_for(future, 2) is True
+            await settle(api)
+            lamp = cloud.zigbee[bulb._device_mac]["attributes"]
+            assert lamp["colorTemperature"] == "100"
+            assert bulb._color_temperature == 6500
+
+    run(scenario())
+
+
+def test_fade_from_unknown_values_jumps_to_the_target(monkeypatch):
+    monkeypatch.setattr(transitions, "MIN_STEP_INTERVAL", 0.01)
+
+    async def scenario():
+        async with fake_account() as (cloud, api):
+            bulb = (await api.discover_devices())[0]
+            await bulb.async_toggle("1")
+            bulb._brightness = None
+            bulb._rgb_color_r = None
+            future = await bulb.async_transition(
+                0.1, brightness=40, color=(255, 0, 0)
+            )
+            assert await asyncio.wait_for(future, 2) is True
+            await settle(api)
+            assert cloud.zigbee[bulb._device_mac]["attributes"]["brightness"] == "40"
+
+    run(scenario())
+
+
+def test_broken_transition_fails_only_its_bulb(monkeypatch):
+    monkeypatch.setattr(transitions, "MIN_STEP_INTERVAL", 0.01)
+
+    async def scenario():
+        async with fake_account() as (cloud, api):
+            broken, bulb = await api.discover_devices()
+            fade = transitions.Fade({"brightness": None}, {"brightness": 40}, 0.1)
+            failed = api.transitions.start(broken, fade)
+            future = await bulb.async_transition(0.1, brightness=40)
+            assert await asyncio.wait_for(failed, 2) is False
+            assert await asyncio.wait_for(future, 2) is True
+            await settle(api)
+            assert cloud.zigbee[bulb._device_mac]["attributes"]["brightness"] == "40"
+
+    run(scenario())
+
+
+def test_failed_send_resolves_finished_transitions(monkeypatch):
+    monkeypatch.setattr(transitions, "MIN_STEP_INTERVAL", 0.01)
+
+    async def fail(steps):
+        raise RuntimeError("cloud gone")
+
+    async def scenario():
+        async with fake_account() as (cloud, api):
+            short, long = await api.discover_devices()
+            monkeypatch.setattr(api.transitions, "_async_send", fail)
+            finished = await short.async_transition(0, brightness=40)
+            running = await long.async_transition(10, brightness=40)
+            assert await asyncio.wait_for(finished, 2) is False
+            # Nothing went out, so nothing counts as sent.
+            assert api.transitions._active[long][1] == {}
+            api.transitions.cancel_all()
+            assert await running is False
+
+    run(scenario())
+
+
+def test_color_temperature_percent_round_trips():
+    async def scenario():
+        async with fake_account() as (cloud, api):
+            bulb = (await api.discover_devices())[0]
+            for percent in range(101):
+                kelvin = bulb.percent_to_kelvin(percent)
+                assert bulb.kelvin_to_percent(kelvin) == percent
+            assert bulb.kelvin_to_percent(2000) == 0
+            assert bulb.kelvin_to_percent(6500) == 100
+
+    run(scenario())
@@ -0,0 +1,213 @@
+#!/usr/bin/python3
+"""
+Fleet-scale benchmark for the Sengled API library.
+
+Runs discovery, a full poll cycle, parsing a raw getDeviceDetails.json body
+into BulbProperty objects, per-bulb brightness commands and one batched group
+color command against tools/fake_cloud.py for each fleet size, and reports
+wall time, CPU time, requests issued and peak Python memory as JSON. The
+fake cloud runs in the same process, so its share of the CPU time is
+included.
+
+    python tools/bench_fleet.py --sizes 10 100 1000 --runs 3 > baseline.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+COMPONENT_DIR = os.path.join(TOOLS_DIR, "..", "custom_components", "sengledapi")
+sys.path[:0] = [TOOLS_DIR, COMPONENT_DIR]
+
+from fake_cloud import FakeCloud  # noqa: E402
+from sengledapi.capture import BufferedResponse  # noqa: E402
+from sengledapi.devices.bulbs.bulbproperty import BulbProperty  # noqa: E402
+from sengledapi.devices.bulbs.const import GET_DETAILS  # noqa: E402
+from sengledapi.devices.request import Request  # noqa: E402
+from sengledapi.sengledapi import SengledApi  # noqa: E402
+
+# Bulb attributes read per device in the parse scenario.
+PROPERTIES = (
+    "name",
+    "switch",
+    "isOnline",
+    "brightness",
+    "color_temperature",
+    "typeCode",
+    "support_color",
+    "support_color_temp",
+    "support_brightness",
+)
+
+
+def http_requests(cloud):
+    return sum(
+        count
+        for name, count in cloud.stats.items()
+        if name.endswith(".json")
+    )
+
+
+async def measure(cloud, coro):
+    """Run coro and return its wall time, CPU time, requests and peak memory."""
+    before = http_requests(cloud)
+    tracemalloc.start()
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    await coro
+    cpu = time.process_time() - cpu
+    wall = time.perf_counter() - wall
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "wall_ms": round(wall * 1000, 3),
+        "cpu_ms": round(cpu * 1000, 3),
+        "requests": http_requests(cloud) - before,
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+class BodyTransport:
+    """Answers every request with the same response body."""
+
+    def __init__(self, body):
+        self._body = body
+
+    @contextlib.asynccontextmanager
+    async def post(self, url, data, headers):
+        yield BufferedResponse(200, self._body)
+
+
+def details_body(cloud):
+    """The getDeviceDetails.json response body the fake cloud would send."""
+    return json.dumps(
+        {
+            "ret": 0,
+            "deviceInfos": [
+                {"deviceUuid": hub, "lampInfos": lamps}
+                for hub, lamps in cloud.hubs.items()
+            ],
+        }
+    ).encode()
+
+
+async def discover(api, bulbs):
+    # Fetch the device lists again instead of reading the startup fetch.
+    await api._coordinator.async_refresh(force=True)
+    bulbs[:] = await api.discover_devices()
+
+
+async def poll(api, bulbs):
+    # One poll cycle: the first update fetches, the rest share it.
+    await api._coordinator.async_refresh(force=True)
+    await asyncio.gather(*(bulb.async_update() for bulb in bulbs))
+
+
+async def parse(api, transport):
+    # Decoding and pruning as a device fetch does, without the network.
+    request = Request("https://bench" + GET_DETAILS, {}, transport=transport)
+    async for _, info in request.async_iter_lamp_infos("bench"):
+        device = BulbProperty(api, info, False)
+        for name in PROPERTIES:
+            getattr(device, name)
+
+
+async def wait_for_tasks(api):
+    if api._tasks:
+        await asyncio.wait(set(api._tasks))
+
+
+async def per_bulb(api, bulbs, brightness):
+    # One command per bulb, as separate light service calls send them.
+    await asyncio.gather(*(bulb.async_set_brightness(brightness) for bulb in bulbs))
+    await wait_for_tasks(api)
+
+
+async def group_color(api, bulbs, color):
+    # All Zigbee bulbs in one group request, as a light group call sends them.
+    zigbee = [bulb for bulb in bulbs if not bulb._wifi_device]
+    if zigbee:
+        api.set_group_color(zigbee, color)
+    await wait_for_tasks(api)
+
+
+async def bench_size(size, wifi_share, latency, runs):
+    wifi = int(size * wifi_share)
+    cloud = FakeCloud(
+        zigbee=size - wifi, wifi=wifi, hubs=max(1, size // 50), latency=latency
+    )
+    base_url = await cloud.start()
+    api = SengledApi(
+        "bench", "bench", "us", bool(wifi),
+        base_url=base_url, mqtt_factory=cloud.mqtt_factory,
+    )
+    await api.async_start()
+    bulbs = []
+    transport = BodyTransport(details_body(cloud))
+    scenarios = {
+        "discover": lambda: discover(api, bulbs),
+        "poll": lambda: poll(api, bulbs),
+        "parse": lambda: parse(api, transport),
+        "per_bulb": lambda: per_bulb(api, bulbs, 64 + len(results["per_bulb"])),
+        "group_color": lambda: group_color(
+            api, bulbs, (255, len(results["group_color"]), 0)
+        ),
+    }
+    results = {name: [] for name in scenarios}
+    try:
+        for _ in range(runs):
+            for name, scenario in scenarios.items():
+                results[name].append(await measure(cloud, scenario()))
+    finally:
+        await api.async_shutdown()
+        await cloud.stop()
+    return {
+        name: {
+            key: statistics.median(sample[key] for sample in samples)
+            for key in samples[0]
+        }
+        for name, samples in results.items()
+    }
+
+
+async def run(args):
+    return {
+        str(size): await bench_size(size, args.wifi_share, args.latency, args.runs)
+        for size in args.sizes
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument(
+        "--wifi-share", type=float, default=0.1, help="fraction of Wi-Fi bulbs"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="fake cloud latency in seconds"
+    )
+    args = parser.parse_args()
+
+    print(
+        json.dumps(
+            {
+                "python": sys.version.split()[0],
+                "runs": args.runs,
+                "wifi_share": args.wifi_share,
+                "latency": args.latency,
+                "sizes": asyncio.run(run(args)),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/python3
+"""
+Import-time benchmark for the Sengled API library.
+
+Imports sengledapi.sengledapi in fresh interpreters and reports the median
+import time and which heavy dependencies got loaded, as JSON.
+
+    python tools/bench_import.py --runs 20
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+COMPONENT_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "custom_components", "sengledapi"
+)
+
+# Modules the library should only pull in when they are actually needed.
+HEAVY_MODULES = ("paho.mqtt.client", "requests", "aiohttp", "certifi", "ssl", "ijson")
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import sengledapi.sengledapi
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    "seconds": elapsed,
+    "loaded": [m for m in %r if m in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+
+def run_once(python):
+    result = subprocess.run(
+        [python, "-c", PROBE],
+        cwd=COMPONENT_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode:
+        sys.exit(result.stderr)
+    return json.loads(result.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--python", default=sys.executable)
+    args = parser.parse_args()
+
+    samples = [run_once(args.python) for _ in range(args.runs)]
+    times = sorted(sample["seconds"] for sample in samples)
+    print(
+        json.dumps(
+            {
+                "runs": args.runs,
+                "median_ms": round(statistics.median(times) * 1000, 3),
+                "min_ms": round(times[0] * 1000, 3),
+                "max_ms": round(times[-1] * 1000, 3),
+                "loaded": samples[-1]["loaded"],
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
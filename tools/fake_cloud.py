@@ -0,0 +1,463 @@
+#!/usr/bin/python3
+"""
+Local stand-in for the Sengled cloud, for offline testing and benchmarking.
+
+Serves the HTTP endpoints the library calls with aiohttp and fakes the
+Wi-Fi bulbs' MQTT topics in process. Fleet size, latency, error rate and a
+per-session rate limit are configurable.
+
+    python tools/fake_cloud.py --zigbee 50 --wifi 10 --latency 0.05
+
+Point the library at it with SengledApi(..., base_url=cloud.base_url,
+mqtt_factory=cloud.mqtt_factory). MQTT only works when the library runs in
+the same process as the FakeCloud.
+"""
+import argparse
+import asyncio
+import json
+import queue
+import random
+import threading
+import time
+from collections import Counter, deque
+from uuid import uuid4
+
+from aiohttp import web
+
+ZIGBEE_MODEL = "E11-N1EA"
+WIFI_MODEL = "W21-N13"
+
+
+def zigbee_lamp(index):
+    return {
+        "deviceUuid": "B0CE1814030{:05X}".format(index),
+        "deviceClass": 1,
+        "attributes": {
+            "name": "Zigbee Bulb {}".format(index),
+            "onoff": "0",
+            "isOnline": "1",
+            "brightness": "255",
+            "colorTemperature": "50",
+            "colorMode": "2",
+            "rgbColorR": "255",
+            "rgbColorG": "255",
+            "rgbColorB": "255",
+            "deviceRssi": "5",
+            "typeCode": ZIGBEE_MODEL,
+            "productCode": ZIGBEE_MODEL,
+            "version": "9",
+            "alarmStatus": "0",
+        },
+    }
+
+
+def wifi_bulb(index):
+    return {
+        "deviceUuid": "B0:CE:18:{:02X}:{:02X}:{:02X}".format(
+            index >> 16 & 0xFF, index >> 8 & 0xFF, index & 0xFF
+        ),
+        "category": "wifielement",
+        "typeCode": WIFI_MODEL,
+        "attributes": {
+            "name": "Wi-Fi Bulb {}".format(index),
+            "switch": "0",
+            "online": "1",
+            "brightness": "100",
+            "colorTemperature": "50",
+            "color": "255:255:255",
+            "colorMode": "2",
+            "deviceRssi": "-40",
+            "typeCode": WIFI_MODEL,
+            "product_code": "wifielement",
+        },
+    }
+
+
+class FakeCloud:
+    """
+    In-memory Sengled account with Zigbee bulbs behind hubs and Wi-Fi bulbs.
+
+    latency -- seconds added to every HTTP request and MQTT status push
+    jitter -- up to this many extra seconds, picked at random per request
+    error_rate -- fraction of HTTP requests answered with a 500
+    rate_limit -- HTTP requests per second per session before 429s
+
+    Set mqtt_down to make the broker drop every client until it is cleared.
+    """
+
+    def __init__(
+        self,
+        zigbee=10,
+        wifi=0,
+        hubs=1,
+        latency=0.0,
+        jitter=0.0,
+        error_rate=0.0,
+        rate_limit=None,
+        seed=None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self._random = random.Random(seed)
+        self.hubs = {
+            "HUB{:04d}".format(index): [] for index in range(max(hubs, 1))
+        }
+        hub_ids = list(self.hubs)
+        self.zigbee = {}
+        for index in range(zigbee):
+            lamp = zigbee_lamp(index)
+            self.zigbee[lamp["deviceUuid"]] = lamp
+            self.hubs[hub_ids[index % len(hub_ids)]].append(lamp)
+        self.wifi = {}
+        for index in range(wifi):
+            bulb = wifi_bulb(index)
+            self.wifi[bulb["deviceUuid"]] = bulb
+        self.sessions = set()
+        self.mqtt_down = False
+        self._request_times = {}
+        self._clients = []
+        self.stats = Counter()
+        self.base_url = None
+        self._runner = None
+
+    # HTTP
+
+    def make_app(self):
+        app = web.Application(middlewares=[self._middleware])
+        routes = {
+            "/user/app/customer/v2/AuthenCross.json": self.handle_login,
+            "/user/app/customer/isSessionTimeout.json": self.handle_session_timeout,
+            "/life2/server/getServerInfo.json": self.handle_server_info,
+            "/life2/device/list.json": self.handle_wifi_list,
+            "/life2/device/control.json": self.handle_wifi_control,
+            "/zigbee/device/getDeviceDetails.json": self.handle_device_details,
+            "/zigbee/device/deviceSetOnOff.json": self.handle_set_onoff,
+            "/zigbee/device/deviceSetBrightness.json": self.handle_set_brightness,
+            "/zigbee/device/deviceSetColorTemperature.json": (
+                self.handle_set_color_temperature
+            ),
+            "/zigbee/device/deviceSetGroup.json": self.handle_set_group,
+        }
+        for path, handler in routes.items():
+            app.router.add_post(path, handler)
+        return app
+
+    async def start(self, host="127.0.0.1", port=0):
+        """Serve the app and return its base URL."""
+        self._runner = web.AppRunner(self.make_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = "http://{}:{}".format(host, port)
+        return self.base_url
+
+    async def stop(self):
+        for client in list(self._clients):
+            client.loop_stop()
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    @web.middleware
+    async def _middleware(self, request, handler):
+        name = request.path.rsplit("/", 1)[-1]
+        self.stats[name] += 1
+        delay = self.latency + self._random.uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        if self._rate_limited(request.cookies.get("JSESSIONID")):
+            self.stats["rate_limited"] += 1
+            return web.json_response({"ret": 429, "msg": "rate limited"}, status=429)
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.stats["errors"] += 1
+            return web.json_response({"ret": 500, "msg": "injected error"}, status=500)
+        try:
+            payload = await request.json()
+        except ValueError:
+            payload = {}
+        return web.json_response(await handler(request, payload or {}))
+
+    def _rate_limited(self, session):
+        if not self.rate_limit:
+            return False
+        now = time.monotonic()
+        times = self._request_times.setdefault(session, deque())
+        while times and times[0] < now - 1:
+            times.popleft()
+        if len(times) >= self.rate_limit:
+            return True
+        times.append(now)
+        return False
+
+    def _authorized(self, request):
+        return request.cookies.get("JSESSIONID") in self.sessions
+
+    async def handle_login(self, request, payload):
+        if not payload.get("user") or not payload.get("pwd"):
+            return {"ret": 1, "msg": "bad credentials"}
+        session = uuid4().hex
+        self.sessions.add(session)
+        return {"ret": 0, "jsessionId": session}
+
+    async def handle_session_timeout(self, request, payload):
+        if self._authorized(request):
+            return {"ret": 0, "info": "OK"}
+        return {"ret": 100, "info": "session timeout"}
+
+    async def handle_server_info(self, request, payload):
+        return {"ret": 0, "inceptionAddr": "wss://127.0.0.1:443/mqtt"}
+
+    async def handle_wifi_list(self, request, payload):
+        if not self._authorized(request):
+            return {"ret": 100, "msg": "session timeout"}
+        return {
+            "ret": 0,
+            "deviceList": [
+                {
+                    "deviceUuid": bulb["deviceUuid"],
+                    "category": bulb["category"],
+                    "typeCode": bulb["typeCode"],
+                    "attributeList": [
+                        {"name": name, "value": value}
+                        for name, value in bulb["attributes"].items()
+                    ],
+                }
+                for bulb in self.wifi.values()
+            ],
+        }
+
+    async def handle_wifi_control(self, request, payload):
+        if not self._authorized(request):
+            return {"ret": 100, "msg": "session timeout"}
+        if self.apply_wifi_update(payload) is None:
+            return {"ret": 1, "msg": "unknown device"}
+        return {"ret": 0}
+
+    async def handle_device_details(self, request, payload):
+        if not self._authorized(request):
+            return {"ret": 100, "msg": "session timeout"}
+        return {
+            "ret": 0,
+            "deviceInfos": [
+                {"deviceUuid": hub, "lampInfos": lamps}
+                for hub, lamps in self.hubs.items()
+            ],
+        }
+
+    def _set(self, request, uuids, **attributes):
+        if not self._authorized(request):
+            return {"ret": 100, "msg": "session timeout"}
+        lamps = [self.zigbee.get(uuid) for uuid in uuids]
+        if not lamps or None in lamps:
+            return {"ret": 1, "msg": "unknown device"}
+        for lamp in lamps:
+            lamp["attributes"].update(
+                (key, str(value)) for key, value in attributes.items()
+            )
+        return {"ret": 0}
+
+    async def handle_set_onoff(self, request, payload):
+        return self._set(request, [payload.get("deviceUuid")], onoff=payload.get("onoff"))
+
+    async def handle_set_brightness(self, request, payload):
+        return self._set(
+            request, [payload.get("deviceUuid")], brightness=payload.get("brightness")
+        )
+
+    async def handle_set_color_temperature(self, request, payload):
+        return self._set(
+            request,
+            [payload.get("deviceUuid")],
+            colorTemperature=payload.get("colorTemperature"),
+        )
+
+    async def handle_set_group(self, request, payload):
+        uuids = [item.get("deviceUuid") for item in payload.get("deviceUuidList", [])]
+        return self._set(
+            request,
+            uuids,
+            rgbColorR=payload.get("rgbColorR"),
+            rgbColorG=payload.get("rgbColorG"),
+            rgbColorB=payload.get("rgbColorB"),
+            colorMode=1,
+        )
+
+    # MQTT
+
+    def mqtt_factory(self, session, on_message):
+        """Drop-in for mqtt.create_client, wired to this cloud."""
+        client = FakeMqttClient(self, on_message)
+        self._clients.append(client)
+        return client
+
+    def handle_update(self, topic, payload):
+        """Apply a wifielement/<mac>/update message and build its status echo."""
+        self.stats["mqtt_publish"] += 1
+        try:
+            data = json.loads(payload)
+        except ValueError:
+            return None
+        return self.apply_wifi_update(data)
+
+    def apply_wifi_update(self, data):
+        """Apply a Wi-Fi bulb update, from MQTT or HTTP, and build its echo."""
+        bulb = self.wifi.get(data.get("dn"))
+        if bulb is None or "type" not in data:
+            return None
+        value = str(data.get("value"))
+        bulb["attributes"][data["type"]] = value
+        status = [
+            {"dn": bulb["deviceUuid"], "type": data["type"], "value": value,
+             "time": data.get("time")}
+        ]
+        return "wifielement/{}/status".format(bulb["deviceUuid"]), json.dumps(status)
+
+
+class FakeMessage:
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+
+
+class FakeMessageInfo:
+    def __init__(self, mid, rc=0):
+        self.mid = mid
+        self.rc = rc
+
+    def wait_for_publish(self, timeout=None):
+        pass
+
+    def is_published(self):
+        return True
+
+
+class FakeMqttClient:
+    """
+    Enough of paho's Client for the library, backed by a FakeCloud.
+    Status messages are delivered from a worker thread, like paho's
+    network loop.
+    """
+
+    def __init__(self, cloud, on_message):
+        self._cloud = cloud
+        self.on_message = on_message
+        self.on_publish = None
+        self._mid = 0
+        self._connected = False
+        self._subscriptions = set()
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def connect(self, host, port=443, keepalive=60):
+        self._connected = True
+        return 0
+
+    def reconnect(self):
+        self._connected = True
+        return 0
+
+    def disconnect(self):
+        self._connected = False
+        return 0
+
+    def is_connected(self):
+        return self._connected and not self._cloud.mqtt_down
+
+    def ws_set_options(self, path="/mqtt", headers=None):
+        pass
+
+    def loop_start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+            self._thread.start()
+
+    def loop_stop(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def subscribe(self, topic, qos=0):
+        self._subscriptions.add(topic)
+        return 0, 1
+
+    def unsubscribe(self, topic):
+        self._subscriptions.discard(topic)
+        return 0, 1
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        if isinstance(payload, bytes):
+            payload = payload.decode()
+        self._mid += 1
+        if not self.is_connected():
+            # MQTT_ERR_NO_CONN; the message never reaches the broker.
+            return FakeMessageInfo(self._mid, 4)
+        self._queue.put((topic, payload, self._mid))
+        return FakeMessageInfo(self._mid)
+
+    def _loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            topic, payload, mid = item
+            status = self._cloud.handle_update(topic, payload)
+            if self.on_publish is not None:
+                # The broker has it: PUBACK.
+                self.on_publish(self, None, mid)
+            if status is None:
+                continue
+            delay = self._cloud.latency + self._cloud._random.uniform(
+                0, self._cloud.jitter
+            )
+            if delay:
+                time.sleep(delay)
+            topic, payload = status
+            if topic in self._subscriptions:
+                self.on_message(self, None, FakeMessage(topic, payload.encode()))
+
+
+async def serve(args):
+    cloud = FakeCloud(
+        zigbee=args.zigbee,
+        wifi=args.wifi,
+        hubs=args.hubs,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+        seed=args.seed,
+    )
+    base_url = await cloud.start(args.host, args.port)
+    print("Fake Sengled cloud listening on {}".format(base_url), flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await cloud.stop()
+        print(json.dumps(dict(cloud.stats)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--zigbee", type=int, default=10)
+    parser.add_argument("--wifi", type=int, default=0)
+    parser.add_argument("--hubs", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
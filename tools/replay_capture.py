@@ -0,0 +1,136 @@
+#!/usr/bin/python3
+"""
+Replay a recorded Sengled capture against the library, offline.
+
+Logs in and discovers devices from the capture, then re-issues the
+recorded control requests, device list fetches and MQTT publishes on their
+recorded schedule while the recorded status messages come back in. Prints
+wall time, CPU time, the library's metrics and replay counters as JSON.
+
+    python tools/replay_capture.py sengled_capture.jsonl --speed 10
+    python tools/replay_capture.py sengled_capture.jsonl --speed 0 --profile out.prof
+
+Record a capture by setting capture_file in the integration's configuration.
+"""
+import argparse
+import asyncio
+import cProfile
+import json
+import os
+import sys
+import time
+from urllib.parse import urlsplit
+
+COMPONENT_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "custom_components", "sengledapi"
+)
+sys.path.insert(0, COMPONENT_DIR)
+
+from sengledapi.capture import Replayer  # noqa: E402
+from sengledapi.sengledapi import SESSION, SengledApi  # noqa: E402
+
+# Fetched by the coordinator rather than re-issued as-is.
+DEVICE_LISTS = ("/zigbee/device/getDeviceDetails.json", "/life2/device/list.json")
+# Issued by login and discovery before the timeline starts.
+SETUP = (
+    "/user/app/customer/v2/AuthenCross.json",
+    "/user/app/customer/isSessionTimeout.json",
+    "/life2/server/getServerInfo.json",
+)
+
+
+def timeline(records):
+    """Recorded requests and publishes to re-issue, minus the setup traffic."""
+    seen = set()
+    events = []
+    for record in records:
+        if record["kind"] == "mqtt_out":
+            events.append(record)
+            continue
+        if record["kind"] != "http":
+            continue
+        path = urlsplit(record["url"]).path
+        if path in SETUP:
+            continue
+        if path in DEVICE_LISTS and path not in seen:
+            # The first fetch of each list is discovery's.
+            seen.add(path)
+            continue
+        events.append(record)
+    return events
+
+
+async def replay(replayer, api):
+    await api.async_start()
+    bulbs = await api.discover_devices()
+    for record in timeline(replayer.records):
+        wait = replayer.due_in(record["t"])
+        if wait > 0:
+            await asyncio.sleep(wait)
+        if record["kind"] == "mqtt_out":
+            api.publish_mqtt(record["topic"], json.dumps(record["payload"]))
+        elif urlsplit(record["url"]).path in DEVICE_LISTS:
+            await api._coordinator.async_refresh(force=True)
+            await asyncio.gather(*(bulb.async_update() for bulb in bulbs))
+        else:
+            api.async_schedule_request(
+                record["url"], record["request"], SESSION.jsession_id
+            )
+    if replayer.messages:
+        # Let the last recorded status messages arrive.
+        await asyncio.sleep(max(0, replayer.due_in(replayer.messages[-1]["t"])))
+    await api.async_shutdown()
+    if SESSION.mqtt_client is not None:
+        SESSION.mqtt_client.loop_stop()
+    return len(bulbs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("capture")
+    parser.add_argument(
+        "--speed", type=float, default=1.0, help="1 recorded, 10 ten times, 0 no waits"
+    )
+    parser.add_argument("--profile", help="write cProfile stats to this file")
+    args = parser.parse_args()
+
+    replayer = Replayer(args.capture, args.speed)
+    wifi = any(record["kind"].startswith("mqtt") for record in replayer.records)
+    api = SengledApi(
+        "replay",
+        "replay",
+        "us",
+        wifi,
+        # Responses are matched on path; a fixed base URL also skips probing.
+        base_url="https://replay.invalid",
+        transport=replayer,
+        mqtt_factory=replayer.mqtt_factory,
+    )
+
+    profiler = cProfile.Profile() if args.profile else None
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    if profiler:
+        profiler.enable()
+    devices = asyncio.run(replay(replayer, api))
+    if profiler:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+
+    print(
+        json.dumps(
+            {
+                "speed": args.speed,
+                "devices": devices,
+                "wall_ms": round((time.perf_counter() - wall) * 1000, 3),
+                "cpu_ms": round((time.process_time() - cpu) * 1000, 3),
+                "replay": dict(replayer.stats),
+                "metrics": api.metrics.as_dict(),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+#!/usr/bin/python3
+"""
+Soak test for the Sengled API library against tools/fake_cloud.py.
+
+Runs poll cycles and command bursts back to back, each standing in for
+one poll interval, and samples Python memory (tracemalloc), open file
+descriptors, threads, asyncio tasks and MQTT subscriptions as it goes.
+Exits non-zero if any of them keeps growing after the warm-up, which is
+long enough for the bounded latency and trace buffers to fill. Runs too
+short to leave a few samples after the warm-up are refused.
+
+The library's monotonic clock is advanced by one poll interval per cycle,
+so cache TTLs, fetch backoff, command timeouts and offline queue expiry
+run on simulated time rather than on the few milliseconds a cycle takes.
+
+    python tools/soak.py --hours 12 --devices 50 > soak.json
+
+--churn replaces a device every few cycles to exercise rediscovery.
+--outage takes the cloud down every few cycles, long enough for queued
+commands to expire.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+COMPONENT_DIR = os.path.join(TOOLS_DIR, "..", "custom_components", "sengledapi")
+sys.path[:0] = [TOOLS_DIR, COMPONENT_DIR]
+
+from const import DISCOVERY_INTERVAL  # noqa: E402
+from fake_cloud import FakeCloud, wifi_bulb, zigbee_lamp  # noqa: E402
+from sengledapi.metrics import LATENCY_SAMPLES  # noqa: E402
+from sengledapi.sengledapi import (OFFLINE_COMMAND_MAX_AGE, SESSION,  # noqa: E402
+                                   SengledApi)
+
+# Simulated seconds per cycle, SCAN_INTERVAL of the light platform.
+POLL_INTERVAL = 10
+# Cycles the cloud stays down in an outage; long enough for queued commands
+# to go stale.
+OUTAGE_CYCLES = OFFLINE_COMMAND_MAX_AGE // POLL_INTERVAL + 5
+# Cycles between rediscoveries, as with DISCOVERY_INTERVAL.
+DISCOVERY_CYCLES = round(DISCOVERY_INTERVAL.total_seconds() / POLL_INTERVAL)
+# Samples needed to compare the first quarter of a run with the last.
+MIN_SAMPLES = 4
+
+
+class FakeClock:
+    """
+    Stands in for the time module in the library, with a monotonic clock
+    that the soak moves ahead of real time.
+    """
+
+    def __init__(self):
+        self.offset = 0.0
+
+    def monotonic(self):
+        return time.monotonic() + self.offset
+
+    def advance(self, seconds):
+        self.offset += seconds
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+    def install(self):
+        for name, module in list(sys.modules.items()):
+            if name.startswith("sengledapi") and getattr(module, "time", None) is time:
+                module.time = self
+
+    def uninstall(self):
+        for name, module in list(sys.modules.items()):
+            if name.startswith("sengledapi") and getattr(module, "time", None) is self:
+                module.time = time
+
+
+def open_fds():
+    for path in ("/proc/self/fd", "/dev/fd"):
+        if os.path.isdir(path):
+            return len(os.listdir(path))
+    return None
+
+
+def sample(api, clock, cycle):
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    return {
+        "cycle": cycle,
+        "simulated_hours": round(clock.offset / 3600, 3),
+        "memory_kib": round(current / 1024, 1),
+        "fds": open_fds(),
+        "threads": threading.active_count(),
+        "tasks": len(asyncio.all_tasks()),
+        "pending_requests": api.pending_tasks,
+        "subscriptions": len(SESSION.subscribe),
+    }
+
+
+def growth(samples, key):
+    """Median of the last quarter of samples minus the median of the first."""
+    values = [sample[key] for sample in samples if sample[key] is not None]
+    if len(values) < MIN_SAMPLES:
+        return 0
+    quarter = len(values) // 4
+    return statistics.median(values[-quarter:]) - statistics.median(values[:quarter])
+
+
+def churn(cloud, rng, next_index):
+    """Swap one device for a new one, keeping the fleet size."""
+    if cloud.wifi and rng.random() < 0.5:
+        cloud.wifi.pop(rng.choice(list(cloud.wifi)))
+        bulb = wifi_bulb(next_index)
+        cloud.wifi[bulb["deviceUuid"]] = bulb
+        return
+    hub, lamps = rng.choice([item for item in cloud.hubs.items() if item[1]])
+    lamp = lamps.pop(rng.randrange(len(lamps)))
+    del cloud.zigbee[lamp["deviceUuid"]]
+    lamp = zigbee_lamp(next_index)
+    cloud.zigbee[lamp["deviceUuid"]] = lamp
+    lamps.append(lamp)
+
+
+async def cycle(api, bulbs, rng, commands):
+    # As the light platform polls: the first stale update fetches.
+    await asyncio.gather(*(bulb.async_update() for bulb in bulbs))
+    available = [bulb for bulb in bulbs if bulb._available]
+    for bulb in rng.sample(available, min(commands, len(available))):
+        await bulb.async_set_brightness(rng.randrange(1, 256))
+    if api._tasks:
+        await asyncio.wait(set(api._tasks))
+
+
+async def soak(args):
+    rng = random.Random(args.seed)
+    wifi = int(args.devices * args.wifi_share)
+    cloud = FakeCloud(
+        zigbee=args.devices - wifi,
+        wifi=wifi,
+        hubs=max(1, args.devices // 50),
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    base_url = await cloud.start()
+    api = SengledApi(
+        "soak", "soak", "us", bool(wifi),
+        base_url=base_url, mqtt_factory=cloud.mqtt_factory,
+    )
+    await api.async_start()
+    bulbs = await api.discover_devices()
+
+    cycles = int(args.hours * 3600 / POLL_INTERVAL)
+    samples = []
+    next_index = args.devices
+    clock = FakeClock()
+    clock.install()
+    tracemalloc.start()
+    try:
+        for number in range(1, cycles + 1):
+            clock.advance(POLL_INTERVAL)
+            commands = args.commands
+            if args.outage:
+                down = number % args.outage
+                cloud.error_rate = 1.0 if down < OUTAGE_CYCLES else args.error_rate
+                # Only the first cycle of an outage queues commands, so they
+                # expire instead of being superseded by fresher ones.
+                if down and not api.online:
+                    commands = 0
+            if args.churn and number % args.churn == 0:
+                churn(cloud, rng, next_index)
+                next_index += 1
+            if number % DISCOVERY_CYCLES == 0:
+                added, _, dropped = await api.async_rediscover()
+                bulbs = [bulb for bulb in bulbs if bulb._device_mac not in dropped]
+                bulbs.extend(added)
+            await cycle(api, bulbs, rng, commands)
+            if number > args.warmup and number % args.sample_every == 0:
+                samples.append(sample(api, clock, number))
+    finally:
+        tracemalloc.stop()
+        clock.uninstall()
+        await api.async_shutdown()
+        if SESSION.mqtt_client is not None:
+            SESSION.mqtt_client.loop_stop()
+        await cloud.stop()
+
+    limits = {
+        "memory_kib": args.max_memory_growth,
+        "fds": args.max_count_growth,
+        "threads": args.max_count_growth,
+        "tasks": args.max_count_growth,
+        "subscriptions": args.max_count_growth,
+    }
+    failures = {
+        key: delta
+        for key, limit in limits.items()
+        if (delta := growth(samples, key)) > limit
+    }
+    if len(samples) < MIN_SAMPLES:
+        # Too short a run to say anything about growth.
+        failures["samples"] = len(samples)
+    return {
+        "cycles": cycles,
+        "simulated_hours": round(clock.offset / 3600, 3),
+        "devices": args.devices,
+        "http_requests": sum(
+            count for name, count in cloud.stats.items() if name.endswith(".json")
+        ),
+        "growth": {key: growth(samples, key) for key in limits},
+        "limits": limits,
+        "failures": failures,
+        "samples": samples,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--hours", type=float, default=12, help="simulated hours")
+    parser.add_argument("--devices", type=int, default=20)
+    parser.add_argument("--wifi-share", type=float, default=0.25)
+    parser.add_argument("--commands", type=int, default=3, help="commands per cycle")
+    parser.add_argument("--error-rate", type=float, default=0.01)
+    parser.add_argument(
+        "--churn", type=int, default=0, help="replace a device every N cycles"
+    )
+    parser.add_argument(
+        "--outage",
+        type=int,
+        default=0,
+        help="take the cloud down for {} cycles every N cycles".format(OUTAGE_CYCLES),
+    )
+    parser.add_argument(
+        "--warmup",
+        type=int,
+        # Device lists are fetched once per cycle; let their samples fill up.
+        default=LATENCY_SAMPLES + 20,
+        help="cycles not sampled",
+    )
+    parser.add_argument("--sample-every", type=int, default=10)
+    parser.add_argument(
+        "--max-memory-growth", type=float, default=512, help="KiB allowed"
+    )
+    parser.add_argument(
+        "--max-count-growth",
+        type=int,
+        default=2,
+        help="extra fds, threads, tasks or subscriptions allowed",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    cycles = int(args.hours * 3600 / POLL_INTERVAL)
+    if cycles - args.warmup < MIN_SAMPLES * args.sample_every:
+        parser.error(
+            "{} cycles leave fewer than {} samples after a warm-up of {}; "
+            "raise --hours or lower --warmup".format(cycles, MIN_SAMPLES, args.warmup)
+        )
+    # Injected errors make the library warn on every cycle.
+    logging.basicConfig(level=logging.ERROR)
+
+    started = time.perf_counter()
+    result = asyncio.run(soak(args))
+    result["wall_seconds"] = round(time.perf_counter() - started, 1)
+    print(json.dumps(result, indent=2))
+    if result["failures"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()